@@ -0,0 +1,53 @@
+"""
+Face recognition core as an importable package.
+
+    from backend import extract_face_embedding, Gallery
+
+Importing the package is free: each name below loads its module (and
+OpenCV/NumPy with it) on first access, and nothing touches the network,
+the database or the file system. Streamlit and pandas are only needed by
+app.py, which is not imported from here.
+
+The modules in this folder import each other by their flat names (they are
+also run as scripts from here), so the folder is put on sys.path.
+"""
+
+import importlib
+import os
+import sys
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.append(_HERE)
+
+_EXPORTS = {
+    'extract_face_embedding': 'recognition',
+    'extract_face_embeddings': 'recognition',
+    'embed_face': 'recognition',
+    'embed_upload': 'recognition',
+    'detect_face': 'recognition',
+    'register_user': 'recognition',
+    'FaceRejected': 'quality',
+    'Gallery': 'gallery',
+    'get_detector': 'detector',
+    'get_descriptor': 'descriptors',
+    'match_threshold': 'descriptors',
+    'decode_image': 'ingest',
+    'init_db': 'db',
+    'get_pool': 'db',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'backend' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,415 @@
+"""
+Headless HTTP recognition API for the React frontend and kiosks.
+
+Serves the contract used by frontend/src: multipart POSTs with an 'image'
+field (plus 'name' for registration), answered with JSON carrying a
+'message'.
+
+    POST /login        JSON username, password -> {"success"}
+    POST /attendance   image              -> {"message", "recognized", "recorded", "user_id", "name", "similarity"}
+    POST /register     name, image(s)     -> {"message", "user_id", "templates"}   (admin)
+    POST /users/{id}/templates  image(s)  -> {"message", "user_id", "templates"}   (admin)
+    GET  /health                          -> {"status", "users", "pending", "upload_cache"}
+    GET  /metrics                         -> stage timings and counters, Prometheus text format
+
+The gallery is loaded once at startup and patched in place on
+registration. Several 'image' fields enroll a user from several photos
+(see templates.py); with FACE_CAPTURE_TEMPLATES set, confident attendance
+photos are added as templates too. Decoding, detection and embedding run
+on a bounded thread pool (OpenCV and NumPy release the GIL), so the event
+loop only parses requests; matches from concurrent requests are coalesced
+by MatchBatcher (see scheduler.py). Re-sent photos are answered from an
+upload cache without detection (see upload_cache.py). Responses carry no
+face boxes; the ones kept internally are in the reduced decode's
+coordinates (see ingest.py). Photos whose faces fail the quality gate (see
+quality.py) get 422 with the gate's message and a 'reason' such as
+"blurry", so the client can ask for a retake. Once max_pending requests
+are queued or running, new ones get 503 with Retry-After instead of piling
+up. Uploads over FACE_API_MAX_UPLOAD_BYTES get 413, whether or not they
+announce a Content-Length. Enrollment endpoints (admin) need the admin's
+credentials (see auth.py) as HTTP Basic auth and answer 401 without them.
+
+With --processes N (FACE_WORKER_PROCESSES), attendance photos are
+decoded, detected, embedded and searched in N worker processes sharing
+the gallery through shared memory (see workers.py); keep --workers at
+least N so every process has a request to work on.
+
+With FACE_PROFILE=1, adding ?profile=1 to a POST profiles that one request
+(see metrics.py); the response's X-Profile header names the file written.
+
+Usage:
+    python api.py [--host 0.0.0.0] [--port 5000] [--workers 4] [--max-pending 64] [--processes 4]
+    uvicorn api:app --port 5000
+"""
+
+import argparse
+import asyncio
+import base64
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from auth import check_admin
+from batch_attendance import record_attendance
+from cooldown import AttendanceCooldown
+from db import DB_PATH, init_db
+from detector import get_detector
+from gallery import Gallery, MATCH_THRESHOLD
+from ingest import decode_color
+from metrics import CONTENT_TYPE, METRICS, PROFILE_ENABLED, profile
+from quality import FaceRejected
+from recognition import embed_upload, register_user
+from scheduler import MAX_BATCH, MAX_WAIT_MS, MatchBatcher
+from templates import add_templates, capture_template
+from upload_cache import UploadCache
+from workers import WORKER_PROCESSES, RecognitionPool
+
+WORKERS = int(os.environ.get('FACE_API_WORKERS', str(os.cpu_count() or 1)))
+MAX_PENDING = int(os.environ.get('FACE_API_MAX_PENDING', '64'))
+MAX_UPLOAD_BYTES = int(os.environ.get('FACE_API_MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+CORS_ORIGINS = os.environ.get('FACE_API_CORS_ORIGINS', '*').split(',')
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionService:
+    """Thread-safe recognition and registration on decoded uploads"""
+
+    def __init__(self, db_path=DB_PATH, detector=None, threshold=MATCH_THRESHOLD, cooldown=None,
+                 batch_max=MAX_BATCH, batch_wait_ms=MAX_WAIT_MS, upload_cache=None, processes=0):
+        self.db_path = db_path
+        self.detector = detector or get_detector()
+        self.threshold = threshold
+        init_db(db_path)
+        os.makedirs('user_images', exist_ok=True)
+        self.gallery = Gallery.from_db(db_path)
+        self.cooldown = cooldown or AttendanceCooldown(db_path)
+        self.upload_cache = upload_cache if upload_cache is not None else UploadCache()
+        # Concurrent requests share one gallery search per batch
+        self.batcher = MatchBatcher(self.gallery, batch_max, batch_wait_ms, threshold) if batch_max > 1 else None
+        # The workers rebuild the same detector from its config
+        self.pool = RecognitionPool(self.gallery, processes, self.detector, threshold) if processes > 0 else None
+
+    def match(self, embedding):
+        if self.batcher is not None:
+            return self.batcher.match(embedding)
+        return self.gallery.match(embedding, self.threshold)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.pool is not None:
+            self.pool.close()
+
+    def _embed(self, data):
+        """(decoded, embedding); repeated uploads come from the upload cache"""
+        try:
+            _, embedding = embed_upload(data, self.detector, cache=self.upload_cache)
+        except ValueError:
+            return False, None
+        return True, embedding
+
+    def _recognize(self, data):
+        """(decoded, embedding, match); done by a worker process when the pool is on"""
+        if self.pool is None:
+            decoded, embedding = self._embed(data)
+            return decoded, embedding, self.match(embedding) if embedding is not None else None
+
+        try:
+            _, embedding, match = self.pool.recognize(data, cache=self.upload_cache)
+        except ValueError:
+            return False, None, None
+        return True, embedding, match
+
+    def mark_attendance(self, data):
+        """(status, body) for one attendance photo"""
+        try:
+            decoded, embedding, match = self._recognize(data)
+        except FaceRejected as e:
+            return 422, {"message": str(e), "reason": e.reason}
+        if not decoded:
+            return 422, {"message": "Could not decode image"}
+        if embedding is None:
+            return 422, {"message": "No face found"}
+
+        if match is None:
+            return 200, {"message": "Face not recognized", "recognized": False, "recorded": False}
+        user_id, name, similarity = match
+        recorded = bool(record_attendance(self.db_path, [user_id], cooldown=self.cooldown))
+        if recorded:
+            capture_template(self.db_path, self.gallery, user_id, embedding, similarity)
+        message = f"Attendance marked for {name}" if recorded else f"{name} was already marked present recently"
+        return 200, {"message": message, "recognized": True, "recorded": recorded,
+                     "user_id": user_id, "name": name, "similarity": round(float(similarity), 4)}
+
+    def _embed_all(self, images):
+        """(error, photo, embeddings) for several uploads; photos without a
+        face, or whose faces fail the quality gate, are skipped"""
+        photo, embeddings, rejected = None, [], None
+        for data in images:
+            try:
+                decoded, embedding = self._embed(data)
+            except FaceRejected as e:
+                rejected = e
+                continue
+            if not decoded:
+                return (422, {"message": "Could not decode image"}), None, None
+            if embedding is not None:
+                if photo is None:
+                    photo = data
+                embeddings.append(embedding)
+        if not embeddings:
+            if rejected is not None:
+                return (422, {"message": str(rejected), "reason": rejected.reason}), None, None
+            return (422, {"message": "No face detected"}), None, None
+        return None, photo, np.stack(embeddings)
+
+    def register(self, name, *images):
+        """(status, body) for one or more registration photos of the same person"""
+        error, photo, embeddings = self._embed_all(images)
+        if error:
+            return error
+        user_id = register_user(self.db_path, name, decode_color(photo), embeddings, self.gallery)
+        return 201, {"message": "User registered", "user_id": user_id, "templates": len(embeddings)}
+
+    def add_templates(self, user_id, *images):
+        """(status, body) for extra enrollment photos of a registered user"""
+        if user_id not in self.gallery:
+            return 404, {"message": "Unknown user"}
+        error, _, embeddings = self._embed_all(images)
+        if error:
+            return error
+        mean, templates = add_templates(self.db_path, user_id, embeddings, projection=self.gallery.projection)
+        self.gallery.update_templates(user_id, mean, templates)
+        return 201, {"message": "Templates added", "user_id": user_id, "templates": len(templates)}
+
+
+def bounded(handler):
+    """Reject requests with 503 once max_pending are queued or running"""
+
+    async def wrapper(request):
+        state = request.app.state
+        if state.pending >= state.max_pending:
+            return JSONResponse({"message": "Server busy, try again"}, status_code=503, headers={"Retry-After": "1"})
+        state.pending += 1
+        try:
+            return await handler(request)
+        finally:
+            state.pending -= 1
+    return wrapper
+
+
+def admin_only(handler):
+    """Reject requests without the admin's HTTP Basic credentials with 401"""
+
+    async def wrapper(request):
+        scheme, _, encoded = request.headers.get('authorization', '').partition(' ')
+        try:
+            username, _, password = base64.b64decode(encoded, validate=True).decode('utf-8').partition(':')
+        except ValueError:
+            username = password = ''
+        if scheme.lower() != 'basic' or not check_admin(username, password):
+            return JSONResponse({"message": "Admin login required"}, status_code=401,
+                                headers={"WWW-Authenticate": 'Basic realm="admin"'})
+        return await handler(request)
+    return wrapper
+
+
+async def _read_body(request):
+    """Request body, or None as soon as it passes MAX_UPLOAD_BYTES"""
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+async def _read_upload(request):
+    """(form, list of image bytes, error response)"""
+    too_large = JSONResponse({"message": "Image too large"}, status_code=413)
+    length = request.headers.get('content-length')
+    if length is not None:
+        try:
+            length = int(length)
+        except ValueError:
+            return None, None, JSONResponse({"message": "Invalid Content-Length header"}, status_code=400)
+        if length > MAX_UPLOAD_BYTES:
+            return None, None, too_large
+    # Chunked bodies announce no length, so the limit is enforced while reading
+    body = await _read_body(request)
+    if body is None:
+        return None, None, too_large
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    form = await Request(request.scope, receive).form()
+    uploads = [upload for upload in form.getlist('image') if not isinstance(upload, str)]
+    if not uploads:
+        return form, None, JSONResponse({"message": "Missing 'image' file field"}, status_code=400)
+    return form, [await upload.read() for upload in uploads], None
+
+
+def _profiled(label, fn, *args):
+    """Run fn under the profiler, in the worker thread that does the work"""
+    with profile(label) as captured:
+        status, body = fn(*args)
+    return status, body, {"X-Profile": captured['path']}
+
+
+async def _run(request, fn, *args):
+    state = request.app.state
+    loop = asyncio.get_running_loop()
+    if PROFILE_ENABLED and request.query_params.get('profile'):
+        label = request.url.path.strip('/').replace('/', '-')
+        status, body, headers = await loop.run_in_executor(state.executor, _profiled, label, fn, *args)
+        return JSONResponse(body, status_code=status, headers=headers)
+    status, body = await loop.run_in_executor(state.executor, fn, *args)
+    return JSONResponse(body, status_code=status)
+
+
+async def login(request):
+    # The frontend shows its pages once this succeeds, with the app's admin check
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return JSONResponse({"success": False, "message": "Expected a JSON object"}, status_code=400)
+    success = check_admin(body.get('username', ''), body.get('password', ''))
+    return JSONResponse({"success": success} if success else {"success": False, "message": "Invalid credentials"})
+
+
+@bounded
+async def attendance(request):
+    _, images, error = await _read_upload(request)
+    if error:
+        return error
+    return await _run(request, request.app.state.service.mark_attendance, images[0])
+
+
+@admin_only
+@bounded
+async def register(request):
+    form, images, error = await _read_upload(request)
+    if error:
+        return error
+    name = (form.get('name') or '').strip()
+    if not name:
+        return JSONResponse({"message": "Missing 'name' field"}, status_code=400)
+    return await _run(request, request.app.state.service.register, name, *images)
+
+
+@admin_only
+@bounded
+async def user_templates(request):
+    _, images, error = await _read_upload(request)
+    if error:
+        return error
+    return await _run(request, request.app.state.service.add_templates, request.path_params['user_id'], *images)
+
+
+async def server_error(request, exc):
+    # Details such as paths or SQL stay in the log (the server logs the
+    # traceback too); the frontend always parses the body as JSON
+    logger.error("%s %s failed: %r", request.method, request.url.path, exc)
+    return JSONResponse({"message": "Server error"}, status_code=500)
+
+
+async def health(request):
+    state = request.app.state
+    body = {"status": "ok", "users": len(state.service.gallery), "pending": state.pending,
+            "upload_cache": state.service.upload_cache.stats()}
+    if state.service.batcher is not None:
+        body["batching"] = state.service.batcher.metrics()
+    return JSONResponse(body)
+
+
+async def metrics(request):
+    state = request.app.state
+    service = state.service
+    cache = service.upload_cache.stats()
+    extra = [
+        ('gallery_users', 'gauge', "Users in the in-memory gallery", len(service.gallery)),
+        ('api_pending_requests', 'gauge', "Requests queued or running", state.pending),
+        ('upload_cache_entries', 'gauge', "Uploads held in the upload cache", cache['size']),
+    ]
+    if service.batcher is not None:
+        batching = service.batcher.metrics()
+        extra += [('match_queue_depth', 'gauge', "Embeddings waiting for a match batch", batching['queue_depth']),
+                  ('match_batches_total', 'counter', "Match batches run", batching['batches'])]
+    return Response(METRICS.render(extra), media_type=CONTENT_TYPE)
+
+
+def create_app(db_path=DB_PATH, workers=WORKERS, max_pending=MAX_PENDING, detector=None,
+               batch_max=MAX_BATCH, batch_wait_ms=MAX_WAIT_MS, processes=WORKER_PROCESSES):
+    """ASGI app; the gallery and worker pool are created at startup, not import"""
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recognize')
+        app.state.pending = 0
+        app.state.max_pending = max_pending
+        app.state.service = await asyncio.get_running_loop().run_in_executor(
+            app.state.executor,
+            lambda: RecognitionService(db_path, detector, batch_max=batch_max, batch_wait_ms=batch_wait_ms,
+                                       processes=processes))
+        try:
+            yield
+        finally:
+            app.state.executor.shutdown(wait=True)
+            app.state.service.close()
+
+    return Starlette(
+        routes=[
+            Route('/login', login, methods=['POST']),
+            Route('/attendance', attendance, methods=['POST']),
+            Route('/register', register, methods=['POST']),
+            Route('/users/{user_id:int}/templates', user_templates, methods=['POST']),
+            Route('/health', health, methods=['GET']),
+            Route('/metrics', metrics, methods=['GET']),
+        ],
+        middleware=[Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=['GET', 'POST'],
+                              allow_headers=['Authorization'])],
+        exception_handlers={Exception: server_error},
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the recognition HTTP API")
+    parser.add_argument('--host', default='0.0.0.0', help="Interface to bind")
+    parser.add_argument('--port', type=int, default=5000, help="Port (the React frontend uses 5000)")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Recognition threads")
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help="Queued plus running requests before answering 503")
+    parser.add_argument('--batch-max', type=int, default=MAX_BATCH, help="Largest match batch (1 disables batching)")
+    parser.add_argument('--batch-wait-ms', type=float, default=MAX_WAIT_MS, help="Longest wait for a batch to fill")
+    parser.add_argument('--processes', type=int, default=WORKER_PROCESSES,
+                        help="Recognition worker processes sharing the gallery (0: recognize in the threads)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(args.db, args.workers, args.max_pending, batch_max=args.batch_max,
+                           batch_wait_ms=args.batch_wait_ms, processes=args.processes),
+                host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,132 +1,159 @@
-import streamlit as st
-import sqlite3
-import cv2
-import numpy as np
-from datetime import datetime
-import pandas as pd
-import os
-import urllib.request
-
-# Download Haar cascade if not present
-if not os.path.exists('haarcascade_frontalface_default.xml'):
-    try:
-        urllib.request.urlretrieve('https://raw.githubusercontent.com/opencv/opencv/master/data/haarcascades/haarcascade_frontalface_default.xml', 'haarcascade_frontalface_default.xml')
-    except:
-        pass  # Continue if download fails
-
-# Database setup
-def init_db():
-    conn = sqlite3.connect('attendance.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    image_path TEXT NOT NULL,
-                    embedding TEXT NOT NULL
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS attendance (
-                    id INTEGER PRIMARY KEY,
-                    user_id INTEGER,
-                    timestamp TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )''')
-    conn.commit()
-    conn.close()
-
-# Create images directory
-if not os.path.exists('user_images'):
-    os.makedirs('user_images')
-
-init_db()
-
-# Helper functions
-def save_user_image(image, user_id):
-    image_path = f"user_images/user_{user_id}.jpg"
-    cv2.imwrite(image_path, image)
-    return image_path
-
-def extract_face_embedding(image):
-    """Extract face embedding using OpenCV and basic image processing"""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+"""
+Streamlit attendance app.
 
-    # Use Haar cascade for face detection
-    face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+Usage:
+    streamlit run app.py
 
-    if len(faces) == 0:
-        return None
+Importing this module has no side effects: the database and image folder
+are created on the first page run, the face cascade is the local copy (see
+detector.py), and pandas is only imported by the Records page. Code that
+only needs recognition should import recognition.py (or the backend
+package) rather than this module.
+"""
 
-    # Take the first face found
-    x, y, w, h = faces[0]
-    face = gray[y:y+h, x:x+w]
-
-    # Resize to standard size
-    face_resized = cv2.resize(face, (100, 100))
-
-    # Flatten to create a simple embedding
-    embedding = face_resized.flatten().astype(np.float32)
-    embedding = embedding / np.linalg.norm(embedding)  # Normalize
-
-    return embedding
-
-# Streamlit app
-st.title("Face Recognition Attendance System")
+import streamlit as st
+import io
+import math
+import os
+import tempfile
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+import records
+
+from auth import check_admin
+from batch_attendance import collect_attendance, is_video, iter_video_frames, record_attendance
+from cooldown import AttendanceCooldown
+from db import init_db
+from detector import get_detector
+from gallery import Gallery
+from ingest import decode_color, decode_image
+from metrics import METRICS_PORT, PROFILE_ENABLED, profile, serve
+from quality import FaceRejected
+from records import RecordFilter, data_stamp, parquet_available, write_csv, write_parquet
+from recognition import embed_upload, extract_face_embedding, register_user, save_user_image
+from templates import capture_template
+from upload_cache import UploadCache
+from workers import WORKER_PROCESSES, RecognitionPool
 
-# Sidebar navigation
-page = st.sidebar.selectbox("Choose a page", ["Admin Login", "Register", "Attendance", "Records"])
+# Helper functions
+@st.cache_resource
+def init_storage():
+    """Create the database and image folder once per process"""
+    init_db('attendance.db')
+    os.makedirs('user_images', exist_ok=True)
+
+@st.cache_resource
+def start_metrics_server():
+    """Serve /metrics on FACE_METRICS_PORT (localhost only) for the life of the process"""
+    return serve(METRICS_PORT) if METRICS_PORT else None
+
+@st.cache_resource
+def get_gallery():
+    """Shared in-memory gallery, loaded once and patched on registration"""
+    return Gallery.from_db('attendance.db')
+
+@st.cache_resource
+def get_face_detector():
+    """Haar cascade parsed once and shared across reruns and sessions"""
+    return get_detector()
+
+@st.cache_resource
+def get_upload_cache():
+    """Face box and embedding per upload hash, so reruns and double-submits skip detection"""
+    return UploadCache()
+
+@st.cache_resource
+def get_recognition_pool():
+    """Worker processes sharing the gallery, when FACE_WORKER_PROCESSES is set"""
+    return RecognitionPool(get_gallery(), WORKER_PROCESSES) if WORKER_PROCESSES > 0 else None
+
+@st.cache_resource
+def get_cooldown():
+    """Last-seen cache shared by every session, so repeat marks skip the database"""
+    return AttendanceCooldown('attendance.db')
+
+@st.cache_data(max_entries=256)
+def run_report(report, stamp, *args):
+    """Cached records query; `stamp` changes with every insert, which invalidates it"""
+    return getattr(records, report)('attendance.db', *args)
+
+def paged_table(report, count_report, flt, stamp, columns, key):
+    """Render one page of a report with page size and page number controls"""
+    import pandas as pd
+
+    total = run_report(count_report, stamp, flt)
+    size_col, page_col = st.columns(2)
+    page_size = size_col.selectbox("Rows per page", [50, 100, 500], key=f"{key}_size")
+    pages = max(1, math.ceil(total / page_size))
+    page = page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    offset = (page - 1) * page_size
+    rows = run_report(report, stamp, flt, page_size, offset)
+    if rows:
+        st.dataframe(pd.DataFrame(rows, columns=columns), hide_index=True)
+        st.caption(f"Showing {offset + 1}-{offset + len(rows)} of {total}")
+    else:
+        st.info("No records found")
 
-if page == "Admin Login":
+def export_records(flt, fmt):
+    """Write the filtered records to a temporary file chunk by chunk"""
+    out = tempfile.TemporaryFile()
+    if fmt == "Parquet":
+        write_parquet('attendance.db', flt, out)
+    else:
+        text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+        write_csv('attendance.db', flt, text)
+        text.flush()
+        out = text.detach()
+    out.seek(0)
+    return out
+
+def login_page():
     st.header("Admin Login")
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
 
     if st.button("Login"):
-        if username == 'admin' and password == 'admin123':
+        if check_admin(username, password):
             st.success("Logged in successfully")
             st.session_state.logged_in = True
         else:
             st.error("Invalid Credentials")
 
-elif page == "Register":
+
+def register_page():
     if st.session_state.get('logged_in', False):
         st.header("Register New User")
         name = st.text_input("Enter Name")
-        uploaded_file = st.camera_input("Take a photo") or st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"])
+        camera_file = st.camera_input("Take a photo")
+        # Several photos of the same person are each kept as a template
+        uploaded_files = [camera_file] if camera_file else st.file_uploader(
+            "Upload Images", type=["jpg", "png", "jpeg"], accept_multiple_files=True)
 
         if st.button("Register"):
-            if name and uploaded_file:
-                # Convert uploaded file to numpy array
-                file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-                image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-
-                # Check if face is detected and extract embedding
+            if name and uploaded_files:
+                # Check if face is detected and extract embeddings (cached per upload)
                 try:
-                    embedding = extract_face_embedding(image)
-                    if embedding is not None:
+                    faces, rejected = [], None
+                    for uploaded_file in uploaded_files:
+                        try:
+                            _, embedding = embed_upload(uploaded_file.getbuffer(), get_face_detector(),
+                                                        st.session_state, get_upload_cache())
+                        except FaceRejected as e:
+                            rejected = e
+                            continue
+                        if embedding is not None:
+                            faces.append((uploaded_file, embedding))
+                    if faces:
                         # Save user to database
-                        conn = sqlite3.connect('attendance.db')
-                        c = conn.cursor()
-
-                        # Save image first
-                        image_path = save_user_image(image, 0)  # Temporary ID
-                        embedding_str = ','.join(map(str, embedding.tolist()))
-
-                        c.execute("INSERT INTO users (name, image_path, embedding) VALUES (?, ?, ?)",
-                                (name, image_path, embedding_str))
-                        user_id = c.lastrowid
-
-                        # Update image path with correct user ID
-                        correct_image_path = save_user_image(image, user_id)
-                        c.execute("UPDATE users SET image_path = ? WHERE id = ?", (correct_image_path, user_id))
-
-                        # Remove temporary image
-                        if os.path.exists(image_path):
-                            os.remove(image_path)
-
-                        conn.commit()
-                        conn.close()
+                        register_user('attendance.db', name, decode_color(faces[0][0].getbuffer()),
+                                      [embedding for _, embedding in faces], get_gallery())
 
                         st.success("User registered successfully")
+                        if len(faces) < len(uploaded_files):
+                            st.info(f"No usable face in {len(uploaded_files) - len(faces)} of the photos")
+                    elif rejected is not None:
+                        st.error(f"{rejected}. Please retake the photo")
                     else:
                         st.error("No face detected")
                 except Exception as e:
@@ -136,87 +163,166 @@ elif page == "Register":
     else:
         st.error("Please login as admin first")
 
-elif page == "Attendance":
+
+def attendance_page():
     if st.session_state.get('logged_in', False):
         st.header("Mark Attendance")
-        uploaded_file = st.camera_input("Take a photo") or st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"])
-
-        if st.button("Mark Attendance"):
-            if uploaded_file:
-                # Convert uploaded file to numpy array
-                file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-                image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        mode = st.radio("Mode", ["Single person", "Group photo or video"], horizontal=True)
+
+        if mode == "Single person":
+            uploaded_file = st.camera_input("Take a photo") or st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"])
+
+            if st.button("Mark Attendance"):
+                if uploaded_file:
+                    # Check if face is detected and recognize user; a resubmitted photo is a cache hit
+                    try:
+                        pool = get_recognition_pool()
+                        if pool is not None:
+                            # Detection, embedding and search run in a worker process
+                            _, current_embedding, recognized_user = pool.recognize(uploaded_file.getbuffer(),
+                                                                                   cache=get_upload_cache())
+                        else:
+                            _, current_embedding = embed_upload(uploaded_file.getbuffer(), get_face_detector(),
+                                                                st.session_state, get_upload_cache())
+                        if current_embedding is not None:
+                            gallery = get_gallery()
+                            if len(gallery) == 0:
+                                st.error("No registered users found")
+
+                            if pool is None:
+                                # Single matrix-vector product against every registered user
+                                recognized_user = gallery.match(current_embedding)
+
+                            if recognized_user:
+                                user_id, name, similarity = recognized_user
+                                if record_attendance('attendance.db', [user_id], cooldown=get_cooldown()):
+                                    capture_template('attendance.db', gallery, user_id, current_embedding, similarity)
+                                    st.success(f"Attendance marked for {name}")
+                                else:
+                                    st.info(f"{name} was already marked present recently")
+                            else:
+                                st.error("Face not recognized")
+                        else:
+                            st.error("No face found")
+                    except FaceRejected as e:
+                        st.warning(f"{e}. Please retake the photo")
+                    except Exception as e:
+                        st.error(f"Face detection error: {str(e)}")
+                else:
+                    st.error("Please provide an image")
 
-                # Check if face is detected and recognize user
-                try:
-                    current_embedding = extract_face_embedding(image)
-                    if current_embedding is not None:
-                        # Get all registered users
-                        conn = sqlite3.connect('attendance.db')
-                        c = conn.cursor()
-                        c.execute("SELECT id, name, embedding FROM users")
-                        users = c.fetchall()
-                        conn.close()
-
-                        if not users:
-                            st.error("No registered users found")
-
-                        # Try to match against each user using cosine similarity
-                        recognized_user = None
-                        best_similarity = 0.0
-
-                        for user_id, name, embedding_str in users:
-                            try:
-                                stored_embedding = np.array([float(x) for x in embedding_str.split(',')])
-                                similarity = np.dot(current_embedding, stored_embedding) / (
-                                    np.linalg.norm(current_embedding) * np.linalg.norm(stored_embedding)
-                                )
-
-                                if similarity > 0.8 and similarity > best_similarity:  # Threshold for recognition
-                                    recognized_user = (user_id, name)
-                                    best_similarity = similarity
-                            except Exception:
-                                continue
-
-                        if recognized_user:
-                            user_id, name = recognized_user
-                            now = datetime.now()
-                            timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
-
-                            conn = sqlite3.connect('attendance.db')
-                            c = conn.cursor()
-                            c.execute("INSERT INTO attendance (user_id, timestamp) VALUES (?, ?)", (user_id, timestamp))
-                            conn.commit()
-                            conn.close()
-
-                            st.success(f"Attendance marked for {name}")
+        else:
+            uploaded_file = st.file_uploader("Upload a group photo or recorded video",
+                                             type=["jpg", "png", "jpeg", "mp4", "avi", "mov", "mkv"])
+            every = st.number_input("Process every Nth video frame", min_value=1, max_value=120, value=5)
+
+            if st.button("Mark Attendance"):
+                if uploaded_file:
+                    gallery = get_gallery()
+                    try:
+                        with st.spinner("Recognizing faces..."):
+                            if is_video(uploaded_file.name):
+                                # OpenCV reads video from a path, so spool the upload to disk
+                                suffix = os.path.splitext(uploaded_file.name)[1]
+                                with tempfile.NamedTemporaryFile(suffix=suffix) as video:
+                                    video.write(uploaded_file.getbuffer())
+                                    video.flush()
+                                    frames = (frame for _, frame in iter_video_frames(video.name, every))
+                                    present, faces_seen, unrecognized = collect_attendance(frames, gallery, get_face_detector())
+                            else:
+                                # Full-resolution grayscale: faces in group photos are small
+                                image = decode_image(uploaded_file.getbuffer(), max_side=0)
+                                present, faces_seen, unrecognized = collect_attendance([image], gallery, get_face_detector())
+
+                        if present:
+                            recorded = record_attendance('attendance.db', sorted(present), cooldown=get_cooldown())
+                            if recorded:
+                                names = ", ".join(sorted(present[user_id][0] for user_id in recorded))
+                                st.success(f"Attendance marked for {len(recorded)} people: {names}")
+                            skipped = len(present) - len(recorded)
+                            if skipped:
+                                st.info(f"{skipped} recognized people were already marked present recently")
+                        elif faces_seen:
+                            st.error("No faces recognized")
                         else:
-                            st.error("Face not recognized")
-                    else:
-                        st.error("No face found")
-                except Exception as e:
-                    st.error(f"Face detection error: {str(e)}")
-            else:
-                st.error("Please provide an image")
+                            st.error("No face found")
+                        if unrecognized:
+                            st.info(f"{unrecognized} detected faces were not recognized")
+                    except Exception as e:
+                        st.error(f"Face detection error: {str(e)}")
+                else:
+                    st.error("Please provide a photo or video")
     else:
         st.error("Please login as admin first")
 
-elif page == "Records":
+
+def records_page():
     if st.session_state.get('logged_in', False):
+        import pandas as pd
+
         st.header("Attendance Records")
-        conn = sqlite3.connect('attendance.db')
-        c = conn.cursor()
-        c.execute("SELECT users.name, attendance.timestamp FROM attendance JOIN users ON users.id = attendance.user_id")
-        data = c.fetchall()
-        conn.close()
-
-        if data:
-            df = pd.DataFrame(data, columns=["Name", "Timestamp"])
-            st.dataframe(df)
+        stamp = data_stamp('attendance.db')
+
+        date_col, user_col, site_col = st.columns(3)
+        today = date.today()
+        dates = date_col.date_input("Dates", (today - timedelta(days=30), today))
+        start = dates[0] if dates else None
+        end = dates[1] if len(dates) > 1 else start
+        user = user_col.selectbox("User", [None] + run_report('list_users', stamp),
+                                  format_func=lambda u: "All users" if u is None else f"{u[1]} (id {u[0]})")
+        site = site_col.selectbox("Site", [None] + run_report('list_sites', stamp),
+                                  format_func=lambda s: "All sites" if s is None else s)
+        flt = RecordFilter(start.isoformat() if start else None, end.isoformat() if end else None,
+                           user[0] if user else None, site)
+
+        view = st.radio("View", ["Records", "Daily counts", "First in / last out", "Attendance %"], horizontal=True)
+        if view == "Records":
+            paged_table('fetch_records', 'count_records', flt, stamp, ["Name", "Timestamp", "Site"], 'records')
+        elif view == "Daily counts":
+            daily = run_report('daily_counts', stamp, flt)
+            if daily:
+                df = pd.DataFrame(daily, columns=["Day", "Marks", "People"])
+                st.bar_chart(df, x="Day", y="People")
+                st.dataframe(df, hide_index=True)
+            else:
+                st.info("No records found")
+        elif view == "First in / last out":
+            paged_table('first_last', 'count_first_last', flt, stamp,
+                        ["Day", "Name", "First in", "Last out", "Marks"], 'first_last')
         else:
-            st.info("No records found")
+            paged_table('attendance_rates', 'count_users', flt, stamp,
+                        ["Name", "Days present", "Working days", "Attendance %"], 'rates')
+
+        # Parquet needs the optional pyarrow package
+        fmt = st.radio("Export format", ["CSV", "Parquet"] if parquet_available() else ["CSV"], horizontal=True)
+        st.download_button("Download records", data=lambda: export_records(flt, fmt),
+                           file_name=f"attendance.{fmt.lower()}",
+                           mime="text/csv" if fmt == "CSV" else "application/vnd.apache.parquet")
     else:
         st.error("Please login as admin first")
 
-st.markdown("---")
-st.markdown("Made with ❤️ from Sohel")
+
+PAGES = {"Admin Login": login_page, "Register": register_page, "Attendance": attendance_page, "Records": records_page}
+
+def main():
+    init_storage()
+    start_metrics_server()
+
+    # Streamlit app
+    st.title("Face Recognition Attendance System")
+
+    # Sidebar navigation
+    page = st.sidebar.selectbox("Choose a page", list(PAGES))
+    # With FACE_PROFILE=1, opening the page with ?profile=1 profiles each run of it
+    profiling = PROFILE_ENABLED and st.query_params.get('profile')
+    with profile(page.lower().replace(' ', '-')) if profiling else nullcontext() as captured:
+        PAGES[page]()
+    if captured:
+        st.caption(f"Profile written to {captured['path']}")
+
+    st.markdown("---")
+    st.markdown("Made with ❤️ from Sohel")
+
+# Streamlit runs the script as __main__; importing it only defines the pages
+if __name__ == "__main__":
+    main()
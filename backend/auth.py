@@ -0,0 +1,17 @@
+"""
+Admin login shared by the Streamlit app and the HTTP API.
+
+The credentials are the defaults listed in the README; change them here.
+"""
+
+import hmac
+
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'admin123'
+
+
+def check_admin(username, password):
+    """True if username and password are the admin's (compared in constant time)"""
+    username_ok = hmac.compare_digest(str(username).encode(), ADMIN_USERNAME.encode())
+    password_ok = hmac.compare_digest(str(password).encode(), ADMIN_PASSWORD.encode())
+    return username_ok and password_ok
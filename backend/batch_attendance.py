@@ -0,0 +1,160 @@
+"""
+Bulk attendance from group photos and recorded video.
+
+Every face in a photo (or in the sampled frames of a video) is embedded,
+matched against the gallery in one vectorized call, and the recognized users
+are recorded in a single transaction. Video frames are streamed one at a time
+with frame skipping, so memory stays flat regardless of the file's length.
+
+Usage:
+    python batch_attendance.py classroom.jpg lecture.mp4 [--every 5] [--db attendance.db]
+"""
+
+import argparse
+import os
+import sqlite3
+from datetime import datetime
+
+import cv2
+
+from cooldown import TIMESTAMP_FORMAT, AttendanceCooldown
+from db import DB_PATH, SITE, get_pool
+from gallery import Gallery, MATCH_THRESHOLD
+from metrics import METRICS
+from recognition import extract_face_embeddings
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v'}
+
+
+def is_video(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def iter_video_frames(source, every=5):
+    """Yield (frame_number, frame) for every `every`-th frame of a video.
+
+    Skipped frames are only grabbed, not decoded.
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video: {source}")
+    try:
+        frame_number = 0
+        while capture.grab():
+            if frame_number % every == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield frame_number, frame
+            frame_number += 1
+    finally:
+        capture.release()
+
+
+def recognize_faces(image, gallery, detector=None, threshold=MATCH_THRESHOLD):
+    """Detect every face in an image and match them all in one call.
+
+    Returns a list of (box, match) where match is (user_id, name, similarity)
+    or None for unrecognized faces.
+    """
+    boxes, embeddings = extract_face_embeddings(image, detector)
+    return list(zip(boxes, gallery.match_many(embeddings, threshold)))
+
+
+def collect_attendance(frames, gallery, detector=None, threshold=MATCH_THRESHOLD):
+    """Best match per recognized user over a stream of images.
+
+    Returns ({user_id: (name, similarity)}, faces_seen, unrecognized).
+    """
+    present = {}
+    faces_seen = unrecognized = 0
+    for image in frames:
+        for _, match in recognize_faces(image, gallery, detector, threshold):
+            faces_seen += 1
+            if match is None:
+                unrecognized += 1
+                continue
+            user_id, name, similarity = match
+            if user_id not in present or similarity > present[user_id][1]:
+                present[user_id] = (name, similarity)
+    return present, faces_seen, unrecognized
+
+
+def record_attendance(db_path, user_ids, timestamp=None, cooldown=None, site=SITE):
+    """Insert one attendance row per user in a single transaction.
+
+    With an AttendanceCooldown, users marked within its window are skipped.
+    Returns the user ids that were recorded.
+    """
+    now = datetime.strptime(timestamp, TIMESTAMP_FORMAT) if timestamp else datetime.now()
+    timestamp = now.strftime(TIMESTAMP_FORMAT)
+    recognized = list(user_ids)
+    user_ids = cooldown.claim(recognized, now) if cooldown is not None else recognized
+    METRICS.count('attendance_suppressed', len(recognized) - len(user_ids))
+    if not user_ids:
+        return []
+
+    try:
+        with METRICS.stage('record'):
+            get_pool(db_path).executemany("INSERT INTO attendance (user_id, timestamp, site) VALUES (?, ?, ?)",
+                                          [(user_id, timestamp, site) for user_id in user_ids])
+    except sqlite3.Error:
+        if cooldown is not None:
+            cooldown.release(user_ids)
+        raise
+    METRICS.count('attendance_recorded', len(user_ids))
+    return user_ids
+
+
+def process_file(path, gallery, db_path=DB_PATH, every=5, detector=None, threshold=MATCH_THRESHOLD, cooldown=None):
+    """Mark attendance for everyone recognized in a group photo or video.
+
+    Returns ({user_id: (name, similarity)}, faces_seen, unrecognized,
+    recorded_user_ids).
+    """
+    if is_video(path):
+        frames = (frame for _, frame in iter_video_frames(path, every))
+    else:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise IOError(f"Could not read image: {path}")
+        frames = [image]
+
+    present, faces_seen, unrecognized = collect_attendance(frames, gallery, detector, threshold)
+    recorded = record_attendance(db_path, sorted(present), cooldown=cooldown) if present else []
+    return present, faces_seen, unrecognized, recorded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark attendance from group photos and recorded video")
+    parser.add_argument('files', nargs='+', help="Group photos and/or video files")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database")
+    parser.add_argument('--every', type=int, default=5, help="Process every Nth video frame")
+    parser.add_argument('--threshold', type=float, default=MATCH_THRESHOLD, help="Cosine similarity threshold")
+    parser.add_argument('--cooldown', default=None,
+                        help="Skip users marked within this window, e.g. 5m, day, off (default: FACE_ATTENDANCE_COOLDOWN)")
+    args = parser.parse_args()
+
+    gallery = Gallery.from_db(args.db)
+    if len(gallery) == 0:
+        print("❌ No registered users found")
+        return 1
+    cooldown = AttendanceCooldown(args.db, args.cooldown)
+
+    for path in args.files:
+        try:
+            present, faces_seen, unrecognized, recorded = process_file(path, gallery, args.db, args.every,
+                                                                       threshold=args.threshold, cooldown=cooldown)
+        except IOError as e:
+            print(f"❌ {e}")
+            continue
+        print(f"{path}: {faces_seen} faces, {len(present)} recognized, {unrecognized} unrecognized")
+        recorded = set(recorded)
+        for user_id, (name, similarity) in sorted(present.items(), key=lambda item: item[1][0]):
+            note = "" if user_id in recorded else ", already marked"
+            print(f"  ✓ {name} (id {user_id}, similarity {similarity:.3f}{note})")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
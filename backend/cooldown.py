@@ -0,0 +1,117 @@
+"""
+Duplicate suppression for attendance inserts.
+
+A user is marked at most once per cooldown window. The window is read from
+FACE_ATTENDANCE_COOLDOWN:
+
+    5m, 90s, 2h   at most one mark per duration (default 5m)
+    day           at most one mark per calendar day
+    session       at most one mark per running process
+    0 / off       every recognition is recorded
+
+Recent marks are kept in an in-memory last-seen cache, so a person standing
+in front of the kiosk is rejected without touching the database. Cache
+misses fall back to one indexed MAX(timestamp) lookup on
+attendance(user_id, timestamp), which also catches marks written by other
+processes or before a restart; the marks found are cached too, so a user
+blocked by one is not looked up again for the rest of the window. The
+lookup runs outside the cache's lock, which is only held to check and
+update the cache.
+"""
+
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from db import get_pool
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_WINDOW = '5m'
+UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def parse_window(value):
+    """'5m' -> timedelta, 'day'/'session' -> str, '0'/'off' -> None"""
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'off', 'none'):
+        return None
+    if value in ('day', 'session'):
+        return value
+    found = re.fullmatch(r'(\d+)\s*([smhd]?)', value)
+    if not found:
+        raise ValueError(f"Invalid attendance cooldown: {value}")
+    amount, unit = int(found.group(1)), found.group(2) or 'm'
+    if amount == 0:
+        return None
+    return timedelta(**{UNITS[unit]: amount})
+
+
+class AttendanceCooldown:
+    """Per-user cooldown between attendance marks"""
+
+    def __init__(self, db_path='attendance.db', window=None):
+        self.db_path = db_path
+        if window is None:
+            window = os.environ.get('FACE_ATTENDANCE_COOLDOWN', DEFAULT_WINDOW)
+        self.window = parse_window(window) if isinstance(window, str) else window
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def _blocks(self, last, now):
+        if last is None:
+            return False
+        if self.window == 'session':
+            return True
+        if self.window == 'day':
+            return last.date() == now.date()
+        return now - last < self.window
+
+    def _last_from_db(self, user_ids):
+        """{user_id: latest mark} for the given users, in one query"""
+        if not user_ids:
+            return {}
+        placeholders = ", ".join("?" * len(user_ids))
+        rows = get_pool(self.db_path).query(
+            f"SELECT user_id, MAX(timestamp) FROM attendance WHERE user_id IN ({placeholders}) GROUP BY user_id",
+            list(user_ids))
+        last = {}
+        for user_id, timestamp in rows:
+            try:
+                last[user_id] = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+            except (TypeError, ValueError):
+                continue
+        return last
+
+    def claim(self, user_ids, now=None):
+        """The subset of user_ids that may be marked at `now`, in order.
+
+        Allowed users are remembered as marked straight away, so concurrent
+        callers cannot both record the same person; call release() if the
+        insert then fails.
+        """
+        if self.window is None:
+            return list(user_ids)
+        now = now or datetime.now()
+        with self._lock:
+            misses = [u for u in dict.fromkeys(user_ids) if not self._blocks(self._last_seen.get(u), now)]
+        # Looked up without the lock, so a slow read doesn't hold up claims for other users; marks
+        # claimed meanwhile are in _last_seen and checked below
+        stored = {} if self.window == 'session' else self._last_from_db(misses)
+        allowed = []
+        with self._lock:
+            for user_id, last in stored.items():
+                if user_id not in self._last_seen or last > self._last_seen[user_id]:
+                    self._last_seen[user_id] = last
+            for user_id in user_ids:
+                if self._blocks(self._last_seen.get(user_id), now):
+                    continue
+                self._last_seen[user_id] = now
+                allowed.append(user_id)
+        return allowed
+
+    def release(self, user_ids):
+        """Forget claims whose attendance rows were not written"""
+        with self._lock:
+            for user_id in user_ids:
+                self._last_seen.pop(user_id, None)
@@ -0,0 +1,296 @@
+"""
+SQLite data access for users and attendance records.
+
+Every connection is opened through a per-database ConnectionPool, which
+configures it once (WAL journal, relaxed fsync, busy timeout, larger page
+cache) and hands it out to one thread at a time. WAL lets the Records page
+and the recognition paths read while another session writes, instead of
+failing with "database is locked".
+
+The schema is versioned with PRAGMA user_version: MIGRATIONS is applied in
+order, each step in its own write transaction, the first time a database is
+opened. Databases created before versioning are brought up to date in place.
+
+Usage:
+    with get_pool(db_path).transaction() as conn:
+        conn.executemany("INSERT INTO attendance (user_id, timestamp) VALUES (?, ?)", rows)
+    rows = get_pool(db_path).query("SELECT id, name FROM users")
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = 'attendance.db'
+# Recorded with every attendance mark and registration, so multi-site reports
+# can be filtered and each site searches its own users first
+SITE = os.environ.get('FACE_SITE') or None
+POOL_SIZE = int(os.environ.get('FACE_DB_POOL_SIZE', '4'))
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    # Durable across application crashes; only an OS crash can lose the last commits
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 134217728",
+)
+
+
+def _create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        image_path TEXT NOT NULL,
+                        embedding TEXT NOT NULL
+                    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS attendance (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER,
+                        timestamp TEXT,
+                        FOREIGN KEY (user_id) REFERENCES users (id)
+                    )''')
+
+
+def _add_projection_columns(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    if 'projected_embedding' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN projected_embedding BLOB")
+    if 'projection_version' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN projection_version INTEGER")
+
+
+def _index_attendance(conn):
+    # Per-user lookups use the (user_id, timestamp) index's prefix, so a
+    # separate attendance(user_id) index would only slow inserts down
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_user_timestamp ON attendance (user_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_timestamp ON attendance (timestamp)")
+
+
+def _add_attendance_site(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(attendance)")}
+    if 'site' not in columns:
+        conn.execute("ALTER TABLE attendance ADD COLUMN site TEXT")
+
+
+def _create_user_embeddings(conn):
+    # One row per enrollment photo or captured template; users.embedding keeps
+    # their centroid. Existing users start with their one embedding as a template.
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_embeddings (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        embedding BLOB NOT NULL,
+                        source TEXT NOT NULL DEFAULT 'enroll',
+                        created_at TEXT NOT NULL,
+                        FOREIGN KEY (user_id) REFERENCES users (id)
+                    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_embeddings_user ON user_embeddings (user_id, created_at)")
+    conn.execute("INSERT INTO user_embeddings (user_id, embedding, source, created_at) "
+                 "SELECT id, embedding, 'enroll', datetime('now', 'localtime') FROM users")
+
+
+def _create_user_changes(conn):
+    # Change log of gallery rows, read by the gallery file (see gallery_file.py)
+    # to catch up with users changed by any process or script
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_changes (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL
+                    )''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS user_changes_insert AFTER INSERT ON users
+                    BEGIN INSERT INTO user_changes (user_id) VALUES (NEW.id); END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS user_changes_update
+                    AFTER UPDATE OF embedding, projected_embedding, projection_version ON users
+                    BEGIN INSERT INTO user_changes (user_id) VALUES (NEW.id); END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS user_changes_delete AFTER DELETE ON users
+                    BEGIN INSERT INTO user_changes (user_id) VALUES (OLD.id); END''')
+
+
+def _add_sites(conn):
+    # users.site is where a user enrolled; with the sites in attendance it
+    # decides which site's gallery shard they belong to (see gallery.py).
+    # Random uids identify users and attendance rows across site databases
+    # (see site_sync.py); triggers give every new row one.
+    for table, column in [('users', 'site'), ('users', 'uid'), ('attendance', 'uid')]:
+        if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+    for table in ('users', 'attendance'):
+        conn.execute(f"UPDATE {table} SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table} (uid)")
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_uid AFTER INSERT ON {table} WHEN NEW.uid IS NULL
+                        BEGIN UPDATE {table} SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id; END''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_site_user ON attendance (site, user_id)")
+    # How far this database has pulled from each other site's database
+    conn.execute('''CREATE TABLE IF NOT EXISTS sync_peers (
+                        peer TEXT PRIMARY KEY,
+                        user_change INTEGER NOT NULL DEFAULT 0,
+                        attendance_id INTEGER NOT NULL DEFAULT 0,
+                        synced_at TEXT
+                    )''')
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_identity (uid TEXT NOT NULL)")
+    if conn.execute("SELECT COUNT(*) FROM sync_identity").fetchone()[0] == 0:
+        conn.execute("INSERT INTO sync_identity (uid) VALUES (lower(hex(randomblob(16))))")
+
+
+# Append only: a database at schema version N has had MIGRATIONS[:N] applied
+MIGRATIONS = [
+    _create_tables,
+    _add_projection_columns,
+    _index_attendance,
+    _add_attendance_site,
+    _create_user_embeddings,
+    _create_user_changes,
+    _add_sites,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """Apply pending migrations to an autocommit connection; returns the schema version"""
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock in case another process migrated first
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.execute("COMMIT")
+                return version
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def connect(db_path=DB_PATH):
+    """A new autocommit connection with the pool's pragmas applied"""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Up to `size` configured connections to one database, shared across threads"""
+
+    def __init__(self, db_path=DB_PATH, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+        conn = connect(db_path)
+        migrate(conn)
+        self._opened = 1
+        self._idle.put(conn)
+        self.inode = os.stat(db_path).st_ino
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return connect(self.db_path)
+        return self._idle.get()
+
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for reads or explicitly managed transactions"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection inside a write transaction, committed on success"""
+        with self.connection() as conn:
+            # Take the write lock up front so the busy timeout applies here,
+            # not as a deadlock-prone lock upgrade halfway through
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        """All rows of a read query"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def execute(self, sql, params=()):
+        """Run one write statement in its own transaction; returns lastrowid"""
+        with self.transaction() as conn:
+            return conn.execute(sql, params).lastrowid
+
+    def executemany(self, sql, rows):
+        """Run a write statement for every row in a single transaction"""
+        with self.transaction() as conn:
+            conn.executemany(sql, rows)
+
+    def close(self):
+        """Close idle connections; borrowed ones are closed when returned"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=DB_PATH):
+    """Shared pool for a database file, created (and migrated) on first use.
+
+    A pool whose file was deleted or replaced is closed and reopened, so a
+    recreated database never sees connections to the old one.
+    """
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            try:
+                if os.stat(db_path).st_ino == pool.inode:
+                    return pool
+            except FileNotFoundError:
+                pass
+            pool.close()
+        pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+def close_pool(db_path=DB_PATH):
+    with _pools_lock:
+        pool = _pools.pop(os.path.abspath(db_path), None)
+    if pool is not None:
+        pool.close()
+
+
+# Database setup
+def init_db(db_path=DB_PATH):
+    """Create or migrate the database schema"""
+    get_pool(db_path)
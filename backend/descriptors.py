@@ -0,0 +1,359 @@
+"""
+Pluggable face descriptors.
+
+A descriptor turns a face box in a grayscale image into a fixed-length,
+L2-normalized float32 vector that the gallery compares by cosine
+similarity. Each deployment picks one with FACE_DESCRIPTOR:
+
+    pixels  the 100x100 face flattened (10,000 values), the original embedding
+    lbp     uniform LBP histograms over a 7x7 grid of cells (2,891 values);
+            insensitive to lighting changes, no model file needed
+    dnn     an OpenCV DNN model loaded from a local file, e.g. a 128-d
+            OpenFace (.t7) or SFace (.onnx) network
+
+Any descriptor can level the eyes first (FACE_ALIGN=1): the eyes are found
+with OpenCV's eye cascade in the upper half of the face box and the crop is
+rotated about their midpoint, which stabilizes tilted heads.
+
+Each descriptor has its own default match threshold; FACE_MATCH_THRESHOLD
+overrides it. Stored embeddings only compare with the descriptor that made
+them, so after switching recompute them from the stored photos:
+
+    python descriptors.py reembed attendance.db
+
+Compare descriptors on a labeled dataset with
+benchmarks/eval_descriptors.py.
+
+Configuration:
+    FACE_DESCRIPTOR        pixels (default), lbp or dnn
+    FACE_MATCH_THRESHOLD   cosine threshold (default per descriptor)
+    FACE_ALIGN             1 to align on the eyes (default off)
+    FACE_EYE_CASCADE_PATH  eye cascade XML (default OpenCV's haarcascade_eye.xml)
+    FACE_DNN_MODEL         model file (.onnx, .t7, .pb, .caffemodel, ...)
+    FACE_DNN_CONFIG        network description for formats that need one (.prototxt, .pbtxt)
+    FACE_DNN_INPUT_SIZE    square input side in pixels (default 96)
+    FACE_DNN_SCALE         pixel scale factor (default 1/255)
+    FACE_DNN_MEAN          value subtracted from every pixel before scaling (default 0)
+"""
+
+import argparse
+import math
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from detector import borrow_cascade, load_cascade, load_resource
+
+EYE_CASCADE_FILENAME = 'haarcascade_eye.xml'
+
+# Neighbours of an LBP pixel, clockwise from the top left
+LBP_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+
+
+def _uniform_lut():
+    """Map each 8-bit LBP code to one of 58 uniform patterns, or 58 for the rest"""
+    lut = np.full(256, 58, dtype=np.int64)
+    label = 0
+    for code in range(256):
+        rotated = ((code << 1) | (code >> 7)) & 0xFF
+        if bin(code ^ rotated).count('1') <= 2:
+            lut[code] = label
+            label += 1
+    return lut
+
+
+LBP_UNIFORM = _uniform_lut()
+LBP_BINS = 59
+
+
+def default_eye_cascade_path():
+    """Prefer an eye cascade in the working directory, then OpenCV's bundled copy"""
+    if os.path.exists(EYE_CASCADE_FILENAME):
+        return EYE_CASCADE_FILENAME
+    return os.path.join(cv2.data.haarcascades, EYE_CASCADE_FILENAME)
+
+
+@dataclass(frozen=True)
+class DescriptorConfig:
+    kind: str = 'pixels'
+    align: bool = False
+    eye_cascade_path: str = None
+    dnn_model: str = None
+    dnn_config: str = None
+    dnn_input_size: int = 96
+    dnn_scale: float = 1 / 255
+    dnn_mean: float = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            kind=os.environ.get('FACE_DESCRIPTOR', 'pixels').lower(),
+            align=os.environ.get('FACE_ALIGN', '0').lower() in ('1', 'true', 'yes', 'on'),
+            eye_cascade_path=os.environ.get('FACE_EYE_CASCADE_PATH') or None,
+            dnn_model=os.environ.get('FACE_DNN_MODEL') or None,
+            dnn_config=os.environ.get('FACE_DNN_CONFIG') or None,
+            dnn_input_size=int(os.environ.get('FACE_DNN_INPUT_SIZE', 96)),
+            dnn_scale=float(os.environ.get('FACE_DNN_SCALE', 1 / 255)),
+            dnn_mean=float(os.environ.get('FACE_DNN_MEAN', 0.0)),
+        )
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class EyeAligner:
+    """Rotates face crops so the eyes are level"""
+
+    # Tilts beyond this are more likely a wrong eye pair than a real head roll
+    MAX_ANGLE = 30.0
+
+    def __init__(self, cascade_path=None):
+        self.cascade_path = cascade_path or default_eye_cascade_path()
+        load_cascade(self.cascade_path, 'eye')
+
+    def find_eyes(self, gray, box):
+        """(left, right) eye centres relative to the box, or None"""
+        x, y, w, h = (int(v) for v in box)
+        upper = gray[y:y + h // 2, x:x + w]
+        if upper.size == 0:
+            return None
+        with borrow_cascade(self.cascade_path) as classifier:
+            eyes = classifier.detectMultiScale(upper, scaleFactor=1.1, minNeighbors=3,
+                                               minSize=(max(w // 10, 1), max(w // 10, 1)))
+        if len(eyes) < 2:
+            return None
+
+        # The two largest detections, ordered left to right
+        eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+        (lx, ly, lw, lh), (rx, ry, rw, rh) = sorted(eyes, key=lambda e: e[0])
+        left = (lx + lw / 2, ly + lh / 2)
+        right = (rx + rw / 2, ry + rh / 2)
+        if right[0] - left[0] < w * 0.2:
+            return None
+        return left, right
+
+    def crop(self, gray, box, eyes=None):
+        """The face box cut out of gray, rotated to level the eyes when found"""
+        x, y, w, h = (int(v) for v in box)
+        eyes = eyes if eyes is not None else self.find_eyes(gray, box)
+        if eyes is None:
+            return gray[y:y + h, x:x + w]
+
+        (lx, ly), (rx, ry) = eyes
+        angle = math.degrees(math.atan2(ry - ly, rx - lx))
+        if abs(angle) < 1.0 or abs(angle) > self.MAX_ANGLE:
+            return gray[y:y + h, x:x + w]
+
+        # Rotate about the eye midpoint and translate so the output is the box itself
+        matrix = cv2.getRotationMatrix2D((x + (lx + rx) / 2, y + (ly + ry) / 2), angle, 1.0)
+        matrix[:, 2] -= (x, y)
+        return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+class Descriptor:
+    """Base class: crop (and optionally align) the face, describe it, normalize"""
+
+    kind = None
+    threshold = 0.8
+    dim = 0
+
+    def __init__(self, config):
+        self.config = config
+        self.aligner = EyeAligner(config.eye_cascade_path) if config.align else None
+
+    def crop(self, gray, box):
+        if self.aligner is not None:
+            return self.aligner.crop(gray, box)
+        x, y, w, h = (int(v) for v in box)
+        return gray[y:y + h, x:x + w]
+
+    def describe(self, gray, box):
+        """Embedding for one x, y, w, h face box in a grayscale image"""
+        return _normalize(self._describe(self.crop(gray, box)))
+
+    def describe_many(self, gray, boxes):
+        """(N, dim) embeddings for several boxes in the same image"""
+        if len(boxes) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack([self.describe(gray, box) for box in boxes])
+
+    def _describe(self, face):
+        raise NotImplementedError
+
+
+class PixelDescriptor(Descriptor):
+    """Resized face pixels, flattened"""
+
+    kind = 'pixels'
+    threshold = 0.8
+    size = (100, 100)
+    dim = size[0] * size[1]
+
+    def _describe(self, face):
+        return cv2.resize(face, self.size).astype(np.float32)
+
+
+class LBPDescriptor(Descriptor):
+    """Spatial histogram of uniform local binary patterns.
+
+    LBP codes only compare each pixel with its neighbours, so they do not
+    change with brightness or contrast. The face is split into a grid of
+    cells and each cell's code histogram is kept, which preserves where the
+    patterns are. Histograms are square-rooted so cosine similarity becomes
+    the Bhattacharyya coefficient.
+    """
+
+    kind = 'lbp'
+    threshold = 0.85
+    grid = 7
+    cell = 14
+    # One extra pixel on each side is consumed by the 3x3 neighbourhood
+    size = (grid * cell + 2, grid * cell + 2)
+    dim = grid * grid * LBP_BINS
+
+    def _describe(self, face):
+        face = cv2.resize(face, self.size, interpolation=cv2.INTER_AREA)
+        center = face[1:-1, 1:-1]
+        rows, cols = center.shape
+        codes = np.zeros(center.shape, dtype=np.uint8)
+        for bit, (dy, dx) in enumerate(LBP_OFFSETS):
+            neighbour = face[1 + dy:1 + dy + rows, 1 + dx:1 + dx + cols]
+            codes |= (neighbour >= center).astype(np.uint8) << bit
+
+        # Offset every cell's labels into its own block of bins, then count once
+        labels = LBP_UNIFORM[codes].reshape(self.grid, self.cell, self.grid, self.cell)
+        cells = np.arange(self.grid * self.grid).reshape(self.grid, 1, self.grid, 1) * LBP_BINS
+        histogram = np.bincount((labels + cells).ravel(), minlength=self.dim)
+        return np.sqrt(histogram.astype(np.float32))
+
+
+class DNNDescriptor(Descriptor):
+    """Output of an OpenCV DNN face-embedding network read from a local file"""
+
+    kind = 'dnn'
+    threshold = 0.5
+
+    def __init__(self, config):
+        super().__init__(config)
+        if not config.dnn_model:
+            raise ValueError("FACE_DESCRIPTOR=dnn needs FACE_DNN_MODEL set to a local model file")
+        if not os.path.exists(config.dnn_model):
+            raise IOError(f"Could not find DNN model: {config.dnn_model}")
+        self.net = cv2.dnn.readNet(config.dnn_model, config.dnn_config or '')
+        # cv2.dnn.Net keeps per-inference state and is not safe to share between threads
+        self._lock = threading.Lock()
+        size = config.dnn_input_size
+        self.dim = self._forward([np.zeros((size, size), dtype=np.uint8)]).shape[1]
+
+    def _forward(self, faces):
+        size = self.config.dnn_input_size
+        images = [cv2.cvtColor(cv2.resize(face, (size, size)), cv2.COLOR_GRAY2BGR) for face in faces]
+        blob = cv2.dnn.blobFromImages(images, self.config.dnn_scale, (size, size),
+                                      (self.config.dnn_mean,) * 3, swapRB=False, crop=False)
+        with self._lock:
+            self.net.setInput(blob)
+            output = self.net.forward()
+        return output.reshape(len(faces), -1).astype(np.float32)
+
+    def _describe(self, face):
+        return self._forward([face])[0]
+
+    def describe_many(self, gray, boxes):
+        """One network pass for every box"""
+        if len(boxes) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        output = self._forward([self.crop(gray, box) for box in boxes])
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return output / norms
+
+
+DESCRIPTORS = {cls.kind: cls for cls in (PixelDescriptor, LBPDescriptor, DNNDescriptor)}
+
+
+def _descriptor_class(kind):
+    if kind not in DESCRIPTORS:
+        raise ValueError(f"Unknown face descriptor: {kind} (choose from {', '.join(DESCRIPTORS)})")
+    return DESCRIPTORS[kind]
+
+
+def get_descriptor(config=None):
+    """Shared descriptor for a given configuration"""
+    config = config or DescriptorConfig.from_env()
+    cls = _descriptor_class(config.kind)
+    return load_resource(('descriptor', config), lambda: cls(config))
+
+
+def match_threshold(config=None):
+    """FACE_MATCH_THRESHOLD, else the configured descriptor's default; loads no model"""
+    value = os.environ.get('FACE_MATCH_THRESHOLD')
+    if value:
+        return float(value)
+    return _descriptor_class((config or DescriptorConfig.from_env()).kind).threshold
+
+
+def reembed(db_path, descriptor=None, detector=None):
+    """Recompute every user's embedding from their stored photo.
+
+    Projected embeddings, the projection model and persisted search indexes
+    belong to the old descriptor and are dropped. Each updated user's
+    templates are replaced by the one from their stored photo. Returns
+    (updated, failed user ids); failed rows (missing photo, no face) keep
+    their old embedding and fall out of the gallery as a minority dimension.
+    """
+    from cooldown import TIMESTAMP_FORMAT
+    from db import get_pool
+    from detector import get_detector
+    from embedding_codec import encode_embedding
+    from projection import remove_projection
+    from quality import QualityConfig, select_face
+
+    descriptor = descriptor or get_descriptor()
+    detector = detector or get_detector()
+    pool = get_pool(db_path)
+
+    updates, failed = [], []
+    for user_id, image_path in pool.query("SELECT id, image_path FROM users ORDER BY id"):
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE) if image_path and os.path.exists(image_path) else None
+        faces = detector.detect(gray) if gray is not None else []
+        if len(faces) == 0:
+            failed.append(user_id)
+            continue
+        # The face enrollment picks; stored photos are not gated again
+        box, _ = select_face(gray, faces, QualityConfig(enabled=False))
+        updates.append((encode_embedding(descriptor.describe(gray, box)), user_id))
+
+    created_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+    with pool.transaction() as conn:
+        conn.executemany("UPDATE users SET embedding = ?, projected_embedding = NULL, projection_version = NULL "
+                         "WHERE id = ?", updates)
+        conn.executemany("DELETE FROM user_embeddings WHERE user_id = ?", [(user_id,) for _, user_id in updates])
+        conn.executemany("INSERT INTO user_embeddings (user_id, embedding, source, created_at) VALUES (?, ?, 'enroll', ?)",
+                         [(user_id, value, created_at) for value, user_id in updates])
+    remove_projection(db_path)
+    return [user_id for _, user_id in updates], failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute stored embeddings with the configured descriptor")
+    parser.add_argument('command', choices=['reembed'])
+    parser.add_argument('db_path', nargs='?', default='attendance.db', help="SQLite database")
+    args = parser.parse_args()
+
+    descriptor = get_descriptor()
+    updated, failed = reembed(args.db_path, descriptor)
+    print(f"Re-embedded {len(updated)} users with the {descriptor.kind} descriptor ({descriptor.dim} values)")
+    if failed:
+        print(f"No face found in the stored photo of users {', '.join(map(str, failed))}; re-register them")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
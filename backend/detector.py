@@ -0,0 +1,194 @@
+"""
+Face detector registry.
+
+Cascade (and later model) files are loaded once per process instead of on
+each frame. A CascadeClassifier cannot be used by two threads at once, so
+each detection borrows one from a process-wide pool (borrow_cascade) and
+returns it afterwards: concurrent detections get copies of their own
+instead of queueing on one lock, and a new thread, such as each Streamlit
+rerun, reuses a parsed copy rather than parsing the XML again.
+Detector parameters can be tuned through environment variables without
+editing code:
+
+    FACE_CASCADE_PATH          path to the Haar cascade XML
+    FACE_DETECT_SCALE_FACTOR   detectMultiScale scaleFactor (default 1.1)
+    FACE_DETECT_MIN_NEIGHBORS  detectMultiScale minNeighbors (default 4)
+    FACE_DETECT_MIN_SIZE       smallest face in pixels, "60" or "60x60" (default off)
+    FACE_DETECT_MAX_SIDE       detect on a copy downscaled to this longest side (default off)
+    FACE_DETECT_ROI_MARGIN     search around the last-seen face first, expanding its
+                               box by this fraction on each side (default off)
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+CASCADE_FILENAME = 'haarcascade_frontalface_default.xml'
+
+_resources = {}
+_resources_lock = threading.RLock()
+
+
+def default_cascade_path():
+    """Prefer a cascade in the working directory, then the copy next to this module, then OpenCV's.
+
+    All three are local files; nothing is ever downloaded.
+    """
+    if os.path.exists(CASCADE_FILENAME):
+        return CASCADE_FILENAME
+    bundled = os.path.join(os.path.dirname(os.path.abspath(__file__)), CASCADE_FILENAME)
+    if os.path.exists(bundled):
+        return bundled
+    return os.path.join(cv2.data.haarcascades, CASCADE_FILENAME)
+
+
+def _parse_size(value):
+    if not value:
+        return (0, 0)
+    parts = value.lower().split('x')
+    if len(parts) == 1:
+        return (int(parts[0]), int(parts[0]))
+    return (int(parts[0]), int(parts[1]))
+
+
+@dataclass(frozen=True)
+class DetectorConfig:
+    cascade_path: str = None
+    scale_factor: float = 1.1
+    min_neighbors: int = 4
+    min_size: tuple = (0, 0)
+    max_side: int = 0
+    roi_margin: float = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            cascade_path=os.environ.get('FACE_CASCADE_PATH') or default_cascade_path(),
+            scale_factor=float(os.environ.get('FACE_DETECT_SCALE_FACTOR', 1.1)),
+            min_neighbors=int(os.environ.get('FACE_DETECT_MIN_NEIGHBORS', 4)),
+            min_size=_parse_size(os.environ.get('FACE_DETECT_MIN_SIZE')),
+            max_side=int(os.environ.get('FACE_DETECT_MAX_SIDE', 0)),
+            roi_margin=float(os.environ.get('FACE_DETECT_ROI_MARGIN', 0.0)),
+        )
+
+
+def load_resource(key, loader):
+    """Return the cached resource for key, creating it with loader() on first use"""
+    with _resources_lock:
+        if key not in _resources:
+            _resources[key] = loader()
+        return _resources[key]
+
+
+def _cascade_pool(path):
+    return load_resource(('cascade_pool', os.path.abspath(path)), queue.SimpleQueue)
+
+
+def load_cascade(path, kind='face'):
+    """Check a Haar cascade loads, once per process; the copy parsed is the
+    first one borrow_cascade() hands out"""
+    def loader():
+        classifier = cv2.CascadeClassifier(path)
+        if classifier.empty():
+            raise IOError(f"Could not load {kind} cascade: {path}")
+        _cascade_pool(path).put(classifier)
+        return classifier
+
+    return load_resource(('cascade', os.path.abspath(path)), loader)
+
+
+@contextmanager
+def borrow_cascade(path):
+    """A cascade checked by load_cascade() that no other thread is using;
+    returned to the process-wide pool when the block ends"""
+    pool = _cascade_pool(path)
+    try:
+        classifier = pool.get_nowait()
+    except queue.Empty:
+        classifier = cv2.CascadeClassifier(path)
+    try:
+        yield classifier
+    finally:
+        pool.put(classifier)
+
+
+class FaceDetector:
+    """Haar cascade face detector with tunable detectMultiScale parameters"""
+
+    def __init__(self, config=None):
+        self.config = config or DetectorConfig.from_env()
+        self.cascade_path = self.config.cascade_path or default_cascade_path()
+        # Fails early on a bad path
+        load_cascade(self.cascade_path)
+
+    def detect(self, gray, last_box=None):
+        """Return an (N, 4) array of x, y, w, h face boxes in a grayscale image.
+
+        With roi_margin set and a last_box hint, the area around the previous
+        face is searched first and the full frame only on a miss.
+        """
+        if self.config.roi_margin > 0 and last_box is not None:
+            faces = self._detect_roi(gray, last_box)
+            if len(faces):
+                return faces
+        return self._detect_scaled(gray)
+
+    def _detect_roi(self, gray, last_box):
+        height, width = gray.shape[:2]
+        x, y, w, h = (int(v) for v in last_box)
+        pad_x = int(w * self.config.roi_margin)
+        pad_y = int(h * self.config.roi_margin)
+        x0, y0 = max(x - pad_x, 0), max(y - pad_y, 0)
+        x1, y1 = min(x + w + pad_x, width), min(y + h + pad_y, height)
+        if x1 <= x0 or y1 <= y0:
+            return np.empty((0, 4), dtype=np.int32)
+
+        # The face should be about as big as last time, which prunes most of the pyramid
+        min_size = (max(self.config.min_size[0], w // 2), max(self.config.min_size[1], h // 2))
+        faces = self._detect_scaled(gray[y0:y1, x0:x1], min_size)
+        if len(faces):
+            faces = faces + np.array([x0, y0, 0, 0], dtype=np.int32)
+        return faces
+
+    def _detect_scaled(self, gray, min_size=None):
+        """Detect on a copy downscaled to max_side and map boxes back to gray"""
+        min_size = min_size or self.config.min_size
+        height, width = gray.shape[:2]
+        longest = max(height, width)
+        if self.config.max_side <= 0 or longest <= self.config.max_side:
+            return self._detect(gray, min_size)
+
+        scale = self.config.max_side / longest
+        small = cv2.resize(gray, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                           interpolation=cv2.INTER_AREA)
+        faces = self._detect(small, tuple(int(v * scale) for v in min_size))
+        if len(faces) == 0:
+            return faces
+
+        faces = np.round(faces / scale).astype(np.int32)
+        faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+        faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
+        return faces
+
+    def _detect(self, gray, min_size):
+        with borrow_cascade(self.cascade_path) as classifier:
+            faces = classifier.detectMultiScale(
+                gray,
+                scaleFactor=self.config.scale_factor,
+                minNeighbors=self.config.min_neighbors,
+                minSize=min_size,
+            )
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.asarray(faces, dtype=np.int32)
+
+
+def get_detector(config=None):
+    """Shared FaceDetector for a given configuration"""
+    config = config or DetectorConfig.from_env()
+    return load_resource(('detector', config), lambda: FaceDetector(config))
@@ -0,0 +1,127 @@
+"""
+Binary storage format for face embeddings.
+
+Embeddings are stored in users.embedding as a small versioned header followed
+by the raw little-endian vector:
+
+    b'FE' | version (uint8) | dtype code (uint8) | [int8 scale (float32)] | data
+
+Legacy rows hold comma-separated text; decode_embedding() accepts both so the
+app keeps working while a database is migrated.
+
+Usage:
+    python embedding_codec.py attendance.db [--dtype float32|float16|int8]
+"""
+
+import argparse
+import struct
+
+import numpy as np
+
+from db import get_pool
+
+MAGIC = b'FE'
+VERSION = 1
+HEADER = struct.Struct('<2sBB')
+SCALE = struct.Struct('<f')
+
+DTYPE_CODES = {'float32': 0, 'float16': 1, 'int8': 2}
+CODE_DTYPES = {code: name for name, code in DTYPE_CODES.items()}
+NUMPY_DTYPES = {'float32': np.dtype('<f4'), 'float16': np.dtype('<f2'), 'int8': np.dtype('i1')}
+
+DEFAULT_DTYPE = 'float32'
+
+
+def encode_embedding(embedding, dtype=DEFAULT_DTYPE):
+    """Serialize an embedding to the versioned binary format"""
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype])
+
+    if dtype == 'int8':
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.round(vector / scale), -127, 127).astype(NUMPY_DTYPES['int8'])
+        return header + SCALE.pack(scale) + quantized.tobytes()
+
+    return header + vector.astype(NUMPY_DTYPES[dtype]).tobytes()
+
+
+def is_binary(value):
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:2]) == MAGIC
+
+
+def decode_embedding(value):
+    """Decode a stored embedding, binary or legacy comma-separated text.
+
+    float32 rows are returned as a read-only view over the BLOB without
+    copying; float16 and int8 rows are widened to float32.
+    """
+    if isinstance(value, str):
+        return np.array(value.split(','), dtype=np.float32)
+
+    if not is_binary(value):
+        raise ValueError("Unrecognized embedding encoding")
+
+    _, version, code = HEADER.unpack_from(value)
+    if version != VERSION:
+        raise ValueError(f"Unsupported embedding format version: {version}")
+    if code not in CODE_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype code: {code}")
+
+    dtype = CODE_DTYPES[code]
+    if dtype == 'int8':
+        (scale,) = SCALE.unpack_from(value, HEADER.size)
+        quantized = np.frombuffer(value, dtype=NUMPY_DTYPES['int8'], offset=HEADER.size + SCALE.size)
+        return quantized.astype(np.float32) * np.float32(scale)
+
+    vector = np.frombuffer(value, dtype=NUMPY_DTYPES[dtype], offset=HEADER.size)
+    if dtype == 'float32':
+        return vector
+    return vector.astype(np.float32)
+
+
+def migrate_embeddings(db_path='attendance.db', dtype=DEFAULT_DTYPE):
+    """Convert every users.embedding and user_embeddings row to the binary format in place.
+
+    Rows already in the requested encoding are left alone, as are users whose
+    raw embedding was emptied for a projection; rows that cannot be parsed are
+    reported and skipped. Returns (converted, skipped).
+    """
+    updates = []
+    skipped = []
+    target_code = DTYPE_CODES[dtype]
+    templates = []
+    with get_pool(db_path).transaction() as conn:
+        for table, rows, failures in (('users', updates, skipped), ('user_embeddings', templates, [])):
+            for row_id, value in conn.execute(f"SELECT id, embedding FROM {table}").fetchall():
+                if not value or is_binary(value) and HEADER.unpack_from(value)[2] == target_code:
+                    continue
+                try:
+                    vector = decode_embedding(value)
+                except ValueError:
+                    failures.append(row_id)
+                    continue
+                rows.append((encode_embedding(vector, dtype), row_id))
+            conn.executemany(f"UPDATE {table} SET embedding = ? WHERE id = ?", rows)
+    return len(updates), skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored face embeddings to the binary format")
+    parser.add_argument('db_path', nargs='?', default='attendance.db', help="SQLite database to migrate")
+    parser.add_argument('--dtype', choices=sorted(DTYPE_CODES), default=DEFAULT_DTYPE,
+                        help="Storage precision for the converted embeddings")
+    args = parser.parse_args()
+
+    converted, skipped = migrate_embeddings(args.db_path, args.dtype)
+    print(f"Converted {converted} embeddings to {args.dtype}")
+    if skipped:
+        print(f"Skipped {len(skipped)} unparseable rows: {', '.join(map(str, skipped))}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,278 @@
+"""
+Bulk enrollment of users from a folder of photos or a CSV manifest.
+
+Usage:
+    python enroll.py photos/ [--db attendance.db] [--workers 4] [--batch-size 200]
+    python enroll.py manifest.csv [...]
+
+In folder mode every image becomes one user named after the file
+("jane_doe.jpg" -> "jane doe"), and every subfolder one user enrolled from
+all the images in it ("jane_doe/1.jpg", "jane_doe/2.jpg"), each a separate
+template (see templates.py). A manifest is a CSV with name and path columns;
+a path may also be a folder. Relative paths are resolved against the
+manifest's folder.
+
+Decoding, detection and embedding run in a process pool, with the same
+reduced grayscale decode and quality gate as registration in the app and the
+API (recognition.embed_upload), so templates and live queries are built at
+the same scale. Photos are written by a thread pool and users are inserted
+in batched transactions. Each
+committed batch is appended to a checkpoint file, so an interrupted run picks
+up where it stopped when started again. Photos that fail are listed with the
+reason in a failure log and retried on the next run.
+"""
+
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from db import DB_PATH, SITE, get_pool, init_db
+from ingest import decode_color
+from projection import embedding_columns, load_projection
+from quality import FaceRejected
+from recognition import embed_upload
+from templates import centroid, insert_templates
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+JPEG_EXTENSIONS = {'.jpg', '.jpeg'}
+
+
+def list_images(folder):
+    return [os.path.join(folder, filename) for filename in sorted(os.listdir(folder))
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS]
+
+
+def list_jobs(source):
+    """(name, path) pairs from a folder of images or a CSV manifest; path may be a folder of one user's photos"""
+    if os.path.isdir(source):
+        jobs = []
+        for filename in sorted(os.listdir(source)):
+            path = os.path.abspath(os.path.join(source, filename))
+            stem, ext = os.path.splitext(filename)
+            if os.path.isdir(path):
+                jobs.append((filename.replace('_', ' ').strip(), path))
+            elif ext.lower() in IMAGE_EXTENSIONS:
+                jobs.append((stem.replace('_', ' ').strip(), path))
+        return jobs
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='') as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or not {'name', 'path'} <= set(reader.fieldnames):
+            raise ValueError("Manifest needs 'name' and 'path' columns")
+        return [(row['name'].strip(), os.path.abspath(os.path.join(base, row['path'].strip()))) for row in reader]
+
+
+def _init_worker():
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def _embed_photo(path):
+    """(embedding, jpeg_bytes, error) for one photo"""
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError as e:
+        return None, None, f"unreadable file: {e}"
+
+    try:
+        _, embedding = embed_upload(data)
+    except ValueError:
+        return None, None, "not a decodable image"
+    except FaceRejected as e:
+        return None, None, f"rejected: {e}"
+    except Exception as e:
+        return None, None, f"face detection error: {e}"
+    if embedding is None:
+        return None, None, "no face detected"
+
+    # Keep JPEG uploads byte-for-byte; re-encode anything else like the app does
+    if os.path.splitext(path)[1].lower() in JPEG_EXTENSIONS:
+        jpeg_bytes = data.tobytes()
+    else:
+        jpeg_bytes = cv2.imencode('.jpg', decode_color(data))[1].tobytes()
+    return embedding, jpeg_bytes, None
+
+
+def process_photo(job):
+    """Decode, detect and embed one photo, or every photo in a user's folder.
+
+    Returns (name, path, embedding, jpeg_bytes, error); embedding and
+    jpeg_bytes are None when error is set. For a folder, embedding is a
+    (T, D) stack of the photos with a face and jpeg_bytes the first of them.
+    """
+    name, path = job
+    if not name:
+        return name, path, None, None, "missing name"
+
+    if not os.path.isdir(path):
+        embedding, jpeg_bytes, error = _embed_photo(path)
+        return name, path, embedding, jpeg_bytes, error
+
+    embeddings, jpeg_bytes, error = [], None, "no images in folder"
+    for photo in list_images(path):
+        embedding, photo_bytes, error = _embed_photo(photo)
+        if embedding is not None:
+            embeddings.append(embedding)
+            jpeg_bytes = jpeg_bytes or photo_bytes
+    if not embeddings:
+        return name, path, None, None, error
+    return name, path, np.stack(embeddings), jpeg_bytes, None
+
+
+def _bounded_map(pool, fn, items, window):
+    """Like pool.map, but with at most window results in flight"""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def insert_batch(db_path, batch, images_dir, writer, projection):
+    """Insert one batch of users in a single transaction and write their photos.
+
+    Ids are allocated under the write lock so photo names are known before
+    the commit; the rows only become visible once every photo is on disk,
+    and the photos are deleted again if the transaction rolls back.
+    """
+    writes = []
+    try:
+        with get_pool(db_path).transaction() as conn:
+            next_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] + 1
+
+            rows = []
+            templates = []
+            for offset, (name, _, embedding, jpeg_bytes, _) in enumerate(batch):
+                user_id = next_id + offset
+                image_path = os.path.join(images_dir, f"user_{user_id}.jpg")
+                mean = centroid(embedding)
+                rows.append((user_id, name, image_path, *embedding_columns(projection, mean), SITE))
+                templates.append((user_id, embedding))
+                writes.append((image_path, writer.submit(_write_file, image_path, jpeg_bytes)))
+
+            conn.executemany("INSERT INTO users (id, name, image_path, embedding, projected_embedding, "
+                             "projection_version, site) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            for user_id, embedding in templates:
+                insert_templates(conn, user_id, embedding)
+            for _, write in writes:
+                write.result()
+    except BaseException:
+        # No user owns these ids, so the photos would be orphans
+        wait([write for _, write in writes])
+        for image_path, _ in writes:
+            if os.path.exists(image_path):
+                os.remove(image_path)
+        raise
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def enroll(source, db_path=DB_PATH, images_dir='user_images', workers=None, batch_size=200,
+           checkpoint_path=None, failures_path=None, log=print):
+    """Enroll every photo in source. Returns (enrolled, failed, skipped) counts."""
+    checkpoint_path = checkpoint_path or f"{os.path.splitext(db_path)[0]}.enroll-checkpoint"
+    failures_path = failures_path or f"{os.path.splitext(db_path)[0]}.enroll-failures.csv"
+
+    init_db(db_path)
+    os.makedirs(images_dir, exist_ok=True)
+    projection = load_projection(db_path)
+
+    jobs = list_jobs(source)
+    done = load_checkpoint(checkpoint_path)
+    todo = [job for job in jobs if job[1] not in done]
+    skipped = len(jobs) - len(todo)
+    if skipped:
+        log(f"Resuming: {skipped} photos already enrolled")
+
+    enrolled = failed = processed = 0
+    start = time.perf_counter()
+    batch = []
+
+    with open(checkpoint_path, 'a') as checkpoint, open(failures_path, 'w', newline='') as failures_file, \
+            ThreadPoolExecutor(max_workers=8) as writer:
+        failures = csv.writer(failures_file)
+        failures.writerow(['path', 'name', 'reason'])
+
+        def flush():
+            nonlocal enrolled
+            if batch:
+                insert_batch(db_path, batch, images_dir, writer, projection)
+                checkpoint.writelines(f"{item[1]}\n" for item in batch)
+                checkpoint.flush()
+                enrolled += len(batch)
+                batch.clear()
+            failures_file.flush()
+            elapsed = time.perf_counter() - start
+            log(f"[{processed}/{len(todo)}] {enrolled} enrolled, {failed} failed, "
+                f"{processed / elapsed if elapsed else 0:.1f} photos/s")
+
+        if workers == 0:
+            results = map(process_photo, todo)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            results = _bounded_map(pool, process_photo, todo, window=batch_size * 2)
+
+        try:
+            for result in results:
+                processed += 1
+                name, path, _, _, error = result
+                if error:
+                    failed += 1
+                    failures.writerow([path, name, error])
+                else:
+                    batch.append(result)
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    return enrolled, failed, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll users in bulk from a photo folder or CSV manifest")
+    parser.add_argument('source', help="Folder of photos or CSV manifest with name,path columns")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database")
+    parser.add_argument('--images-dir', default='user_images', help="Where user photos are stored")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count, 0: inline)")
+    parser.add_argument('--batch-size', type=int, default=200, help="Users per database transaction")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: next to the database)")
+    parser.add_argument('--failures', help="Failure log CSV (default: next to the database)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ {args.source} does not exist")
+        return 1
+
+    enrolled, failed, skipped = enroll(args.source, args.db, args.images_dir, args.workers, args.batch_size,
+                                       args.checkpoint, args.failures)
+    print(f"Done: {enrolled} enrolled, {failed} failed, {skipped} skipped from a previous run")
+    if failed:
+        print(f"See {args.failures or os.path.splitext(args.db)[0] + '.enroll-failures.csv'} for failures")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
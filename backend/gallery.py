@@ -0,0 +1,480 @@
+"""
+In-memory gallery of enrolled face embeddings.
+
+Keeps every registered user's embedding in one contiguous float32 matrix so
+recognition is a single matrix-vector product instead of a per-user loop.
+Lookups go through a pluggable search index (see search_index.py). When a
+projection model is active (see projection.py) the gallery holds projected
+embeddings and projects raw query/registration embeddings itself.
+
+Users enrolled from several photos (see templates.py) are searched by their
+centroid, then the top FACE_TEMPLATE_CANDIDATES users per query (default 5)
+are re-scored against their individual templates in one stacked product,
+and the best template similarity decides the match.
+
+from_db maps the gallery file kept next to the database (see
+gallery_file.py) instead of decoding every users row, and keeps that file
+up to date as users are added.
+
+At a multi-site deployment (FACE_SITE set), the users enrolled at the site
+or marked present there form its shard. Queries are matched against the
+shard first and only those without a match there search the whole gallery;
+users found that way join the shard. A local user above the threshold
+therefore wins even if someone from another site would score higher.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from db import SITE, get_pool
+from descriptors import match_threshold
+from gallery_file import ENABLED as GALLERY_FILE_ENABLED, gallery_dim, open_gallery_file, read_gallery_rows
+from metrics import METRICS
+from projection import load_projection
+from search_index import SAVE_DELAY as INDEX_SAVE_DELAY, BruteForceIndex, create_index, index_path, open_index
+from templates import load_templates
+
+MATCH_THRESHOLD = match_threshold()
+TEMPLATE_CANDIDATES = int(os.environ.get('FACE_TEMPLATE_CANDIDATES', '5'))
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _replay_changes(index, db_path, kind, seq):
+    """Drop the users changed since a persisted index was saved, so the
+    gallery re-adds them with their current embedding; an index of unknown
+    or later position (another database) is replaced by an empty one."""
+    if index.seq is None or index.seq > seq:
+        index = create_index(kind)
+    elif index.seq < seq:
+        changed = get_pool(db_path).query("SELECT DISTINCT user_id FROM user_changes WHERE seq > ? AND seq <= ?",
+                                          (index.seq, seq))
+        index.remove([row[0] for row in changed])
+    index.seq = seq
+    return index
+
+
+class Gallery:
+    """L2-normalized embedding matrix with parallel id/name arrays.
+
+    templates maps user ids to (T, D) matrices of their individual templates,
+    in the same space as matrix; only users with two or more are kept. A
+    float32 matrix whose rows are already unit length (normalized=True) is
+    used as is, e.g. memory-mapped from the gallery file.
+    """
+
+    def __init__(self, ids=None, names=None, matrix=None, index=None, projection=None, templates=None,
+                 candidates=TEMPLATE_CANDIDATES, normalized=False):
+        self._lock = threading.Lock()
+        self.projection = projection
+        self.candidates = candidates
+        if matrix is None:
+            self.ids = np.empty(0, dtype=np.int64)
+            self.names = np.empty(0, dtype=object)
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+        else:
+            self.ids = np.asarray(ids, dtype=np.int64)
+            self.names = np.asarray(names, dtype=object)
+            matrix = np.asarray(matrix, dtype=np.float32)
+            self.matrix = np.ascontiguousarray(matrix if normalized else _normalize_rows(matrix))
+        self._names_by_id = dict(zip(self.ids.tolist(), self.names))
+        # Bumped on every change, so copies of the matrix (see workers.py) know when to refresh
+        self.version = 0
+        self.templates = {}
+        for user_id, vectors in (templates or {}).items():
+            vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+            if int(user_id) in self._names_by_id and len(vectors) > 1 and vectors.shape[1] == self.dim:
+                self.templates[int(user_id)] = np.ascontiguousarray(_normalize_rows(vectors))
+
+        self.index = index if index is not None else BruteForceIndex()
+        self.index_path = None
+        self._index_changed = self._sync_index()
+        self._save_timer = None
+        self._save_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.db_path = None
+        self.file = None
+        self.site = None
+        self.shard = None
+        self.shard_ids = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_db(cls, db_path='attendance.db', index_kind=None, use_file=GALLERY_FILE_ENABLED, site=SITE, dim=None):
+        """Load every user row, skipping embeddings that don't decode or aren't
+        of dimension dim (default: the projection's output size, else the
+        active descriptor's, so rows of another descriptor are left out).
+
+        With use_file, rows come memory-mapped from the gallery file, which is
+        first brought up to date with the users table; if it can't be opened,
+        they are read from the table. An IVF index persisted next to db_path
+        is reused and brought up to date incrementally rather than rebuilt,
+        re-indexing the users changed since it was saved.
+        With a projection model, rows projected by an older model version
+        are re-projected from their raw embedding. With a site, its users
+        form the shard searched first.
+        """
+        projection = load_projection(db_path)
+        dim = dim or gallery_dim(projection)
+        index = create_index(index_kind)
+        seq = None
+        if not isinstance(index, BruteForceIndex):
+            # Read before the rows, so changes made meanwhile are replayed on the next load
+            seq = get_pool(db_path).query("SELECT COALESCE(MAX(seq), 0) FROM user_changes")[0][0]
+        gallery_file = None
+        if use_file:
+            try:
+                gallery_file, ids, matrix = open_gallery_file(db_path, projection, dim=dim)
+            except (OSError, ValueError):
+                gallery_file = None
+        if gallery_file is not None:
+            names_by_id = dict(get_pool(db_path).query("SELECT id, name FROM users"))
+            names = [names_by_id.get(user_id, '') for user_id in ids.tolist()]
+        else:
+            parsed = read_gallery_rows(db_path, projection, dim=dim)
+            ids = [p[0] for p in parsed]
+            names = [p[1] for p in parsed]
+            matrix = np.stack([p[2] for p in parsed]) if parsed else None
+
+        saved_seq = None
+        if seq is not None:
+            index = open_index(db_path, index_kind)
+            saved_seq = index.seq
+            index = _replay_changes(index, db_path, index_kind, seq)
+        if len(ids):
+            # Templates are stored raw; keep those of the gallery's descriptor and project them
+            raw_dim = projection.input_dim if projection is not None else dim
+            templates = {}
+            for user_id, vectors in load_templates(db_path).items():
+                vectors = [v for v in vectors if len(v) == raw_dim]
+                if len(vectors) > 1:
+                    stacked = np.stack(vectors)
+                    templates[user_id] = projection.transform(stacked) if projection is not None else stacked
+            gallery = cls(ids, names, matrix, index=index, projection=projection, templates=templates,
+                          normalized=gallery_file is not None)
+        else:
+            gallery = cls(index=index, projection=projection)
+
+        gallery.db_path = db_path
+        gallery.file = gallery_file
+        if site is not None:
+            local = get_pool(db_path).query("SELECT id FROM users WHERE site = ? "
+                                            "UNION SELECT user_id FROM attendance WHERE site = ?", (site, site))
+            gallery.set_shard(site, [row[0] for row in local])
+        # The brute-force index only shares the matrix, so there is nothing to persist
+        if not isinstance(gallery.index, BruteForceIndex):
+            gallery.index_path = index_path(db_path, gallery.index.kind)
+        if gallery._index_changed or saved_seq != seq:
+            gallery.save_index()
+        return gallery
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, user_id):
+        return int(user_id) in self._names_by_id
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    @property
+    def search_k(self):
+        """Candidates to fetch per query: template re-scoring needs more than the best centroid"""
+        return max(min(self.candidates, len(self.ids)) if self.templates else 1, 1)
+
+    def snapshot(self):
+        """Consistent (version, ids, matrix) of the current gallery"""
+        with self._lock:
+            return self.version, self.ids, self.matrix
+
+    def _sync_index(self, added=None, removed=None):
+        """Bring the index in line with the gallery arrays; returns True if
+        the index changed.
+
+        The brute-force index simply shares the gallery matrix. Other indexes
+        are patched with the added/removed ids when given, otherwise diffed
+        against the gallery (or rebuilt if empty or of another dimension).
+        """
+        if isinstance(self.index, BruteForceIndex):
+            changed = not np.array_equal(self.index.ids, self.ids)
+            self.index.build(self.ids, self.matrix)
+            return changed
+
+        if added is not None or removed is not None:
+            if removed is not None:
+                self.index.remove(removed)
+            if added is not None:
+                rows = np.isin(self.ids, added)
+                self.index.add(self.ids[rows], self.matrix[rows])
+            return True
+
+        indexed = self.index.ids
+        if len(indexed) == 0 or self.index.dim != self.dim:
+            self.index.build(self.ids, self.matrix)
+            return len(self.ids) > 0
+        stale = np.setdiff1d(indexed, self.ids)
+        missing = ~np.isin(self.ids, indexed)
+        if stale.size:
+            self.index.remove(stale)
+        if missing.any():
+            self.index.add(self.ids[missing], self.matrix[missing])
+        return bool(stale.size or missing.any())
+
+    def save_index(self):
+        """Write the persisted index now from a copy taken under the lock;
+        normally run in the background INDEX_SAVE_DELAY after a change"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        if not self.index_path:
+            return
+        with self._lock:
+            index = self.index.copy()
+        with self._write_lock:
+            # Replaced atomically, so a loading process never reads half a file
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, 'wb') as f:
+                index.save(f)
+            os.replace(temp_path, self.index_path)
+
+    def _save_index_later(self):
+        """Save the index once changes have settled for INDEX_SAVE_DELAY"""
+        if not self.index_path:
+            return
+        with self._save_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(INDEX_SAVE_DELAY, self._save_in_background)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _save_in_background(self):
+        try:
+            self.save_index()
+        except OSError:
+            # Changes not saved are re-indexed from user_changes on the next load
+            pass
+
+    def set_shard(self, site, user_ids):
+        """Search user_ids, the users of site, before the rest of the gallery"""
+        with self._lock:
+            self.site = site
+            self.shard = BruteForceIndex()
+            self.shard_ids = np.unique(np.asarray(user_ids, dtype=np.int64))
+            self._build_shard()
+
+    def _build_shard(self):
+        # The shard is small, so a copy of its rows is simply rebuilt on change
+        rows = np.isin(self.ids, self.shard_ids)
+        self.shard.build(self.ids[rows], np.ascontiguousarray(self.matrix[rows]))
+
+    def _join_shard(self, user_ids):
+        with self._lock:
+            joined = np.setdiff1d(np.asarray(user_ids, dtype=np.int64), self.shard_ids)
+            if joined.size:
+                self.shard_ids = np.union1d(self.shard_ids, joined)
+                self._build_shard()
+
+    def _sync_file(self):
+        """Append the users changed since the gallery file's last sync (e.g.
+        the one just registered) so the next process loads them mapped"""
+        if self.file is None:
+            return
+        try:
+            with self.file.locked():
+                self.file.sync(self.db_path, self.projection)
+        except (OSError, ValueError):
+            # The file is only a cache of the users table; the next load rebuilds it
+            self.file = None
+
+    def _prepare(self, embedding):
+        """Project a raw embedding if a projection model is active"""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        if self.projection is not None:
+            if vector.shape[0] != self.projection.input_dim:
+                return None
+            vector = self.projection.transform(vector)
+        return vector
+
+    def add(self, user_id, name, embedding, templates=None):
+        """Append (or replace) a single user without reloading the gallery.
+
+        embedding is the user's (centroid) embedding; templates optionally
+        their individual raw template embeddings.
+        """
+        vector = self._prepare(embedding)
+        if vector is None:
+            raise ValueError("Embedding does not fit the active projection model")
+        vector = _normalize_rows(vector.reshape(1, -1))
+        if templates is not None and len(templates) > 1:
+            templates = np.asarray(templates, dtype=np.float32)
+            if self.projection is not None:
+                templates = self.projection.transform(templates)
+            templates = np.ascontiguousarray(_normalize_rows(templates))
+        else:
+            templates = None
+        with self._lock:
+            keep = self.ids != user_id
+            new_user = keep.all()
+            if len(self.ids) and self.matrix.shape[1] != vector.shape[1]:
+                raise ValueError(f"Embedding dimension {vector.shape[1]} does not match gallery dimension {self.matrix.shape[1]}")
+            matrix = self.matrix[keep] if len(self.ids) else np.empty((0, vector.shape[1]), dtype=np.float32)
+            self.matrix = np.ascontiguousarray(np.vstack([matrix, vector]))
+            self.ids = np.append(self.ids[keep], np.int64(user_id))
+            self.names = np.append(self.names[keep], np.array([name], dtype=object))
+            self._names_by_id[int(user_id)] = name
+            if templates is not None:
+                self.templates[int(user_id)] = templates
+            else:
+                self.templates.pop(int(user_id), None)
+            self.version += 1
+            self._sync_index(added=[user_id])
+            if self.shard is not None:
+                # New users were registered here; known ones keep their shard membership
+                if new_user:
+                    self.shard_ids = np.union1d(self.shard_ids, [user_id])
+                self._build_shard()
+        self._save_index_later()
+        self._sync_file()
+
+    def update_templates(self, user_id, embedding, templates):
+        """Replace an enrolled user's centroid and templates, keeping their name"""
+        self.add(user_id, self._names_by_id[int(user_id)], embedding, templates)
+
+    def remove(self, user_id):
+        """Drop a user from the gallery; returns True if they were present"""
+        with self._lock:
+            keep = self.ids != user_id
+            if keep.all():
+                return False
+            self.matrix = np.ascontiguousarray(self.matrix[keep])
+            self.ids = self.ids[keep]
+            self.names = self.names[keep]
+            self._names_by_id.pop(int(user_id), None)
+            self.templates.pop(int(user_id), None)
+            self.version += 1
+            self._sync_index(removed=[user_id])
+            if self.shard is not None:
+                self.shard_ids = self.shard_ids[self.shard_ids != user_id]
+                self._build_shard()
+        self._save_index_later()
+        self._sync_file()
+        return True
+
+    def match(self, embedding, threshold=MATCH_THRESHOLD):
+        """Return (user_id, name, similarity) of the closest user above the
+        threshold, or None if nobody matches"""
+        return self.match_many(np.asarray(embedding).reshape(1, -1), threshold)[0]
+
+    def match_many(self, embeddings, threshold=MATCH_THRESHOLD):
+        """match() for an (N, D) stack of embeddings with a single index search.
+
+        Without multi-template users the search returns the best centroid
+        directly. Otherwise it returns the top candidates, whose scores are
+        replaced by their best template similarity before picking the winner.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32)
+        results = [None] * len(queries)
+        if len(queries) == 0:
+            return results
+        if self.projection is not None:
+            if queries.shape[1] != self.projection.input_dim:
+                return results
+            queries = self.projection.transform(queries)
+
+        with METRICS.stage('match'):
+            results = self._match_many(queries, results, threshold)
+        matched = sum(result is not None for result in results)
+        METRICS.count('matches', matched)
+        METRICS.count('rejects', len(results) - matched)
+        return results
+
+    def _match_many(self, queries, results, threshold):
+        norms = np.linalg.norm(queries, axis=1)
+        valid = norms > 0
+        with self._lock:
+            if len(self.ids) == 0 or queries.shape[1] != self.dim or not valid.any():
+                return results
+            queries = queries[valid] / norms[valid, None]
+            sharded = self.shard is not None and len(self.shard) > 0
+            if not sharded:
+                ids, scores = self.index.search(queries, k=self.search_k)
+        if sharded:
+            found = self._shard_first(queries, threshold, lambda missed: self._search(queries[missed]))
+        else:
+            found = self.resolve(queries, ids, scores, threshold)
+
+        for row, result in zip(np.flatnonzero(valid), found):
+            results[row] = result
+        return results
+
+    def _search(self, queries):
+        with self._lock:
+            return self.index.search(queries, k=self.search_k)
+
+    def _shard_first(self, queries, threshold, search_all):
+        """Results for normalized queries matched against the shard first;
+        search_all(missed) gives the whole gallery's (ids, scores) for the
+        query rows the shard has no match for"""
+        with self._lock:
+            ids, scores = self.shard.search(queries, k=self.search_k)
+        found = self.resolve(queries, ids, scores, threshold)
+        missed = [i for i, result in enumerate(found) if result is None]
+        METRICS.count('shard_hits', len(found) - len(missed))
+        METRICS.count('shard_misses', len(missed))
+        if missed:
+            ids, scores = search_all(missed)
+            for i, result in zip(missed, self.resolve(queries[missed], ids, scores, threshold)):
+                found[i] = result
+            # Someone from another site showed up here; search them locally from now on
+            self._join_shard([result[0] for result in found if result is not None])
+        return found
+
+    def resolve_local_first(self, queries, ids, scores, threshold=MATCH_THRESHOLD):
+        """resolve() for candidates from a search of the whole gallery (e.g.
+        by a worker process) that keeps the shard-first rule: with a shard,
+        queries are matched against it here and those candidates are only
+        used for the queries it has no match for."""
+        with self._lock:
+            sharded = self.shard is not None and len(self.shard) > 0
+        if not sharded:
+            return self.resolve(queries, ids, scores, threshold)
+        return self._shard_first(queries, threshold, lambda missed: (ids[missed], scores[missed]))
+
+    def resolve(self, queries, ids, scores, threshold=MATCH_THRESHOLD):
+        """Results for normalized queries in gallery space from their top
+        candidates (ids, scores), e.g. found by a search in another process.
+
+        Candidates with templates are re-scored against them first; ids no
+        longer in the gallery are ignored.
+        """
+        with self._lock:
+            if ids.shape[1] > 1:
+                scores = self._rescore(queries, ids, scores)
+                best = np.argmax(scores, axis=1)[:, None]
+                ids = np.take_along_axis(ids, best, axis=1)
+                scores = np.take_along_axis(scores, best, axis=1)
+            return [(int(user_id), self._names_by_id[int(user_id)], float(similarity))
+                    if user_id >= 0 and similarity > threshold and int(user_id) in self._names_by_id else None
+                    for user_id, similarity in zip(ids[:, 0], scores[:, 0])]
+
+    def _rescore(self, queries, ids, scores):
+        """Scores of candidate users with templates, replaced by their best template similarity"""
+        owners = np.array([user_id for user_id in np.unique(ids) if user_id in self.templates], dtype=np.int64)
+        if owners.size == 0:
+            return scores
+        blocks = [self.templates[int(user_id)] for user_id in owners]
+        starts = np.cumsum([0] + [len(block) for block in blocks[:-1]])
+        # One product over every candidate template, then a max per owner
+        per_owner = np.maximum.reduceat(queries @ np.vstack(blocks).T, starts, axis=1)
+
+        rows, cols = np.nonzero(np.isin(ids, owners))
+        scores = scores.copy()
+        scores[rows, cols] = per_owner[rows, np.searchsorted(owners, ids[rows, cols])]
+        return scores
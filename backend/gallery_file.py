@@ -0,0 +1,384 @@
+"""
+Memory-mapped gallery file kept next to the database.
+
+Without it, Gallery.from_db reads every users row and decodes its embedding
+before the first match, which takes longer as the gallery grows and is
+repeated by every process. The gallery file (attendance.gallery next to
+attendance.db) holds the same rows ready to search: normalized and, with a
+projection model, projected. It is opened with np.memmap, so loading takes
+about as long for 100 users as for 100,000 and every process shares one
+copy in the OS page cache.
+
+Layout, little endian:
+    header  64 bytes: magic, format version, dtype, dimension, rows,
+            capacity, tombstones, last applied change, projection version
+            and the database file's inode
+    ids     int64[capacity], -1 for a tombstone
+    matrix  float32 or float16 [capacity, dimension]
+
+The file follows the users table through its change log (user_changes,
+filled by triggers on every insert, embedding update and delete, whichever
+process or script made it). sync() applies the changes made since the
+file's last one: the changed users' old rows become tombstones and their
+current rows are appended, doubling the capacity when it runs out. Gallery
+syncs after every registration, so the next process starts with it already
+appended. Tombstones are compacted away once they exceed
+FACE_GALLERY_COMPACT_RATIO of the rows, and before a gallery is loaded so
+the matrix maps without copying. A file of another projection version, dtype,
+dimension or database, or one too far behind, is rebuilt from the table.
+
+Only rows of the gallery's dimension are kept: the projection's output
+size, else the active descriptor's (see gallery_dim); rows left by another
+descriptor, such as old test rows, are skipped.
+
+Writers serialize on an flock of attendance.gallery.lock (POSIX only).
+Rewrites go to a temporary file that replaces the old one, so a process that
+mapped the old file keeps a consistent copy.
+
+Usage:
+    python gallery_file.py info|sync|compact|rebuild [attendance.db]
+
+Configuration:
+    FACE_GALLERY_FILE            0 loads galleries from the users table only (default on)
+    FACE_GALLERY_DTYPE           float32 (default, mapped as is) or float16 (half the size, converted when loaded)
+    FACE_GALLERY_COMPACT_RATIO   share of tombstoned rows that triggers compaction (default 0.25)
+"""
+
+import argparse
+import os
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+from db import get_pool
+from descriptors import get_descriptor
+from embedding_codec import decode_embedding
+from projection import load_projection
+from templates import template_centroids
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ENABLED = os.environ.get('FACE_GALLERY_FILE', '1').lower() not in ('0', 'false', 'no', 'off')
+DTYPE = os.environ.get('FACE_GALLERY_DTYPE', 'float32')
+COMPACT_RATIO = float(os.environ.get('FACE_GALLERY_COMPACT_RATIO', '0.25'))
+
+MAGIC = b'FGAL'
+FORMAT_VERSION = 1
+# magic, format, dtype, dim, rows, capacity, tombstones, change seq, projection version, db inode
+HEADER = struct.Struct('<4sHHIqqqqqq')
+HEADER_SIZE = 64
+DTYPES = {'float32': 0, 'float16': 1}
+MIN_CAPACITY = 64
+# Catching up on more changed users than this (or half the rows) rebuilds instead
+REBUILD_CHANGES = 10000
+# SQLite's default limit on ? parameters is 999
+CHUNK = 500
+
+
+def gallery_file_path(db_path):
+    """Gallery file stored next to the database, e.g. attendance.gallery"""
+    return f"{os.path.splitext(db_path)[0]}.gallery"
+
+
+def gallery_dim(projection):
+    """Dimension of gallery rows: the projection's output, else the active descriptor's"""
+    if projection is not None:
+        return projection.dims
+    return get_descriptor().dim
+
+
+def read_gallery_rows(db_path, projection, user_ids=None, dim=None):
+    """(id, name, vector) of users whose embedding decodes, in gallery space.
+
+    Rows projected by another model version are re-projected from their raw
+    embedding, or from their templates' centroid once the raw one has been
+    emptied (see projection.py). user_ids limits the read to those users and dim skips
+    vectors of any other dimension.
+    """
+    if projection is None:
+        sql = "SELECT id, name, embedding, NULL, NULL FROM users"
+    else:
+        sql = "SELECT id, name, embedding, projected_embedding, projection_version FROM users"
+    pool = get_pool(db_path)
+    if user_ids is None:
+        rows = pool.query(sql)
+    else:
+        user_ids = [int(user_id) for user_id in user_ids]
+        rows = []
+        for start in range(0, len(user_ids), CHUNK):
+            chunk = user_ids[start:start + CHUNK]
+            rows += pool.query(f"{sql} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+
+    parsed = []
+    stale = {}
+    for user_id, name, value, projected, version in rows:
+        if projection is not None and not value and (projected is None or version != projection.version):
+            stale[user_id] = name
+            continue
+        try:
+            if projection is None:
+                vector = decode_embedding(value)
+            elif projected is not None and version == projection.version:
+                vector = decode_embedding(projected)
+            else:
+                raw = decode_embedding(value)
+                if len(raw) != projection.input_dim:
+                    continue
+                vector = projection.transform(raw)
+        except ValueError:
+            continue
+        if dim is None or len(vector) == dim:
+            parsed.append((user_id, name, vector))
+    if stale:
+        for user_id, mean in template_centroids(db_path, stale, projection.input_dim).items():
+            vector = projection.transform(mean)
+            if dim is None or len(vector) == dim:
+                parsed.append((user_id, stale[user_id], vector))
+    return parsed
+
+
+def _normalized(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class GalleryFile:
+    """The gallery file of one database: header, id array and embedding matrix.
+
+    dim is the dimension of the rows it keeps; None takes gallery_dim() of
+    the projection synced with.
+    """
+
+    def __init__(self, path, dtype=DTYPE, dim=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown gallery file dtype {dtype!r}, expected one of {', '.join(DTYPES)}")
+        self.path = path
+        self.dtype = dtype
+        self.dim = dim
+
+    @contextmanager
+    def locked(self):
+        """Hold the writers' lock for the block"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_header(self):
+        """Header fields as a dict, or None if the file is missing or not a gallery file"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, version, dtype, dim, rows, capacity, tombstones, seq, projection, inode = HEADER.unpack(data)
+        if magic != MAGIC or version != FORMAT_VERSION or dtype not in DTYPES.values():
+            return None
+        return {'dtype': next(name for name, code in DTYPES.items() if code == dtype), 'dim': dim, 'rows': rows,
+                'capacity': capacity, 'tombstones': tombstones, 'seq': seq, 'projection_version': projection,
+                'db_inode': inode}
+
+    def _write_header(self, f, header):
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, DTYPES[header['dtype']], header['dim'], header['rows'],
+                            header['capacity'], header['tombstones'], header['seq'], header['projection_version'],
+                            header['db_inode']))
+
+    def _map(self, header, mode, path=None):
+        """(ids, matrix) memmaps over the whole capacity"""
+        path = path or self.path
+        ids = np.memmap(path, dtype=np.int64, mode=mode, offset=HEADER_SIZE, shape=(header['capacity'],))
+        if not header['dim']:
+            return ids, np.empty((header['capacity'], 0), dtype=header['dtype'])
+        matrix = np.memmap(path, dtype=header['dtype'], mode=mode, offset=HEADER_SIZE + 8 * header['capacity'],
+                           shape=(header['capacity'], header['dim']))
+        return ids, matrix
+
+    def arrays(self):
+        """Read-only (ids, matrix) of the written rows, tombstones included"""
+        header = self.read_header()
+        if header is None or not header['rows']:
+            return np.empty(0, dtype=np.int64), np.empty((0, header['dim'] if header else 0), dtype=np.float32)
+        ids, matrix = self._map(header, 'r')
+        return ids[:header['rows']], matrix[:header['rows']]
+
+    def write(self, ids, matrix, seq, projection_version, db_inode):
+        """Replace the file with these rows of ids and normalized vectors"""
+        ids = np.asarray(ids, dtype=np.int64)
+        dim = matrix.shape[1] if len(ids) else 0
+        header = {'dtype': self.dtype, 'dim': dim, 'rows': len(ids), 'capacity': max(MIN_CAPACITY, 2 * len(ids)),
+                  'tombstones': 0, 'seq': seq, 'projection_version': projection_version, 'db_inode': db_inode}
+
+        tmp = f"{self.path}.tmp{os.getpid()}"
+        try:
+            with open(tmp, 'wb') as f:
+                # The unused capacity stays a hole in the file
+                f.truncate(HEADER_SIZE + header['capacity'] * (8 + np.dtype(self.dtype).itemsize * dim))
+                self._write_header(f, header)
+            if len(ids):
+                out_ids, out_matrix = self._map(header, 'r+', tmp)
+                out_ids[:len(ids)] = ids
+                out_matrix[:len(ids)] = matrix
+                out_ids.flush()
+                out_matrix.flush()
+                del out_ids, out_matrix
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return header
+
+    def append(self, ids, matrix, seq):
+        """Add rows in place, or rewrite the file with twice the capacity when full"""
+        header = self.read_header()
+        ids = np.asarray(ids, dtype=np.int64)
+        if header['rows'] + len(ids) > header['capacity'] or (len(ids) and not header['dim']):
+            old_ids, old_matrix = self.arrays()
+            live = old_ids >= 0
+            return self.write(np.concatenate([old_ids[live], ids]),
+                              np.vstack([old_matrix[live], matrix]) if live.any() else matrix,
+                              seq, header['projection_version'], header['db_inode'])
+
+        rows = header['rows']
+        if len(ids):
+            out_ids, out_matrix = self._map(header, 'r+')
+            # Rows first, then the header that makes them visible
+            out_ids[rows:rows + len(ids)] = ids
+            out_matrix[rows:rows + len(ids)] = matrix
+            out_ids.flush()
+            out_matrix.flush()
+            del out_ids, out_matrix
+        header.update(rows=rows + len(ids), seq=seq)
+        with open(self.path, 'r+b') as f:
+            self._write_header(f, header)
+        return header
+
+    def tombstone(self, user_ids):
+        """Mark the rows of user_ids deleted; returns how many were"""
+        header = self.read_header()
+        if not header['rows']:
+            return 0
+        # Only ids change: processes that mapped the file keep their copy of the
+        # ids and still read the old vectors, like any gallery loaded earlier
+        ids = self._map(header, 'r+')[0]
+        dead = np.flatnonzero(np.isin(ids[:header['rows']], np.asarray(user_ids, dtype=np.int64)))
+        if dead.size:
+            ids[dead] = -1
+            ids.flush()
+            header['tombstones'] += int(dead.size)
+            with open(self.path, 'r+b') as f:
+                self._write_header(f, header)
+        del ids
+        return int(dead.size)
+
+    def compact(self):
+        """Rewrite the file without its tombstones"""
+        header = self.read_header()
+        ids, matrix = self.arrays()
+        live = ids >= 0
+        return self.write(ids[live], np.asarray(matrix[live]), header['seq'], header['projection_version'],
+                          header['db_inode'])
+
+    def rebuild(self, db_path, projection, seq=None):
+        """Write the file afresh from the users table"""
+        pool = get_pool(db_path)
+        if seq is None:
+            seq = pool.query("SELECT COALESCE(MAX(seq), 0) FROM user_changes")[0][0]
+        parsed = read_gallery_rows(db_path, projection, dim=self.dim or gallery_dim(projection))
+        ids = [p[0] for p in parsed]
+        matrix = _normalized([p[2] for p in parsed]) if parsed else np.empty((0, 0), dtype=np.float32)
+        return self.write(ids, matrix, seq, projection.version if projection is not None else -1, pool.inode)
+
+    def sync(self, db_path, projection, compact=False):
+        """Apply the users table's changes since the last sync; returns what was done.
+
+        Call with the lock held. compact=True compacts any tombstones, not
+        only more than COMPACT_RATIO of the rows.
+        """
+        pool = get_pool(db_path)
+        # Read before the rows: changes made meanwhile are applied again next time
+        latest = pool.query("SELECT COALESCE(MAX(seq), 0) FROM user_changes")[0][0]
+        header = self.read_header()
+        version = projection.version if projection is not None else -1
+        dim = self.dim or gallery_dim(projection)
+        if (header is None or header['dtype'] != self.dtype or header['projection_version'] != version
+                or header['dim'] not in (0, dim) or header['db_inode'] != pool.inode or header['seq'] > latest):
+            self.rebuild(db_path, projection, latest)
+            return 'rebuilt'
+
+        action = 'current'
+        if header['seq'] < latest:
+            changed = [row[0] for row in pool.query("SELECT DISTINCT user_id FROM user_changes WHERE seq > ?",
+                                                    (header['seq'],))]
+            if len(changed) > min(REBUILD_CHANGES, max(MIN_CAPACITY, header['rows'] // 2)):
+                self.rebuild(db_path, projection, latest)
+                return 'rebuilt'
+            parsed = read_gallery_rows(db_path, projection, changed, dim)
+            self.tombstone(changed)
+            matrix = _normalized([p[2] for p in parsed]) if parsed else np.empty((0, dim), dtype=np.float32)
+            header = self.append([p[0] for p in parsed], matrix, latest)
+            action = 'updated'
+
+        if header['tombstones'] and (compact or header['tombstones'] > COMPACT_RATIO * header['rows']):
+            self.compact()
+            action = 'compacted'
+        return action
+
+
+def open_gallery_file(db_path, projection, dtype=DTYPE, dim=None):
+    """The database's gallery file, synced and compacted, with a copy of its ids
+    and its matrix mapped read-only (converted if float16)"""
+    gallery_file = GalleryFile(gallery_file_path(db_path), dtype, dim)
+    with gallery_file.locked():
+        gallery_file.sync(db_path, projection, compact=True)
+        ids, matrix = gallery_file.arrays()
+        ids = np.array(ids)
+    if matrix.dtype != np.float32:
+        matrix = matrix.astype(np.float32)
+    return gallery_file, ids, matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or maintain the memory-mapped gallery file")
+    parser.add_argument('command', choices=['info', 'sync', 'compact', 'rebuild'])
+    parser.add_argument('db_path', nargs='?', default='attendance.db', help="SQLite database")
+    parser.add_argument('--dtype', choices=list(DTYPES), default=DTYPE, help="Matrix dtype when (re)writing")
+    args = parser.parse_args()
+
+    gallery_file = GalleryFile(gallery_file_path(args.db_path), args.dtype)
+    if args.command != 'info':
+        projection = load_projection(args.db_path)
+        with gallery_file.locked():
+            if args.command == 'sync':
+                print(f"Gallery file {gallery_file.sync(args.db_path, projection)}")
+            elif args.command == 'compact':
+                gallery_file.sync(args.db_path, projection, compact=True)
+            else:
+                gallery_file.rebuild(args.db_path, projection)
+
+    header = gallery_file.read_header()
+    if header is None:
+        print(f"❌ No gallery file at {gallery_file.path}")
+        return 1
+    print(f"{gallery_file.path}: {header['rows'] - header['tombstones']} users "
+          f"({header['rows']} rows, {header['tombstones']} tombstones, capacity {header['capacity']}), "
+          f"{header['dim']} x {header['dtype']}, change {header['seq']}, "
+          f"{os.path.getsize(gallery_file.path) / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,125 @@
+"""
+Decode-once image ingestion for uploads.
+
+An upload used to be copied twice (read() and bytearray) before being
+decoded to a full-resolution BGR image, which cvtColor then copied again to
+grayscale. decode_image() instead wraps the upload's buffer without copying
+and decodes it once, straight to grayscale at a reduced scale: JPEGs use
+libjpeg's DCT scaling through IMREAD_REDUCED_GRAYSCALE_{2,4,8}, so a 4K
+photo is never expanded to full size. The reduction is picked from the
+image header so the long side stays at least max_side pixels.
+
+Face boxes found on .gray (by embed_upload, the worker pool and the upload
+cache) are in the reduced image's coordinates, not the upload's; they are
+only used internally as ROI hints for the next frame of the same size. The
+full-resolution colour image, needed only for the stored user photo, comes
+from decode_color().
+
+Configuration: FACE_INGEST_MAX_SIDE (default 640, 0 decodes at full size).
+"""
+
+import os
+import struct
+
+import cv2
+import numpy as np
+
+INGEST_MAX_SIDE = int(os.environ.get('FACE_INGEST_MAX_SIDE', '640'))
+
+REDUCED_GRAYSCALE = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# Start-of-frame markers carry the image size; C4, C8 and CC are other segments
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def image_size(buffer):
+    """(width, height) from a JPEG or PNG header, or None for other formats"""
+    buffer = memoryview(buffer).cast('B')
+    if buffer[:8] == PNG_SIGNATURE and len(buffer) >= 24:
+        return struct.unpack('>II', buffer[16:24])
+    if buffer[:2] != b'\xff\xd8':
+        return None
+
+    offset = 2
+    while offset + 4 <= len(buffer):
+        if buffer[offset] != 0xFF:
+            return None
+        marker = buffer[offset + 1]
+        if marker == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        length = struct.unpack('>H', buffer[offset + 2:offset + 4])[0]
+        if marker in JPEG_SOF:
+            if offset + 9 > len(buffer):
+                return None
+            height, width = struct.unpack('>HH', buffer[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def reduction_for(size, max_side=INGEST_MAX_SIDE):
+    """Largest of 8, 4, 2 that keeps the long side at least max_side, else 1"""
+    if not max_side or size is None:
+        return 1
+    for factor in (8, 4, 2):
+        if max(size) // factor >= max_side:
+            return factor
+    return 1
+
+
+class DecodedImage:
+    """An upload decoded once to (possibly reduced) grayscale.
+
+    .gray is what detection and embedding run on; boxes found on it are in
+    its own coordinates.
+    """
+
+    def __init__(self, gray):
+        self.gray = gray
+
+
+def decode_image(buffer, max_side=INGEST_MAX_SIDE):
+    """DecodedImage for raw upload bytes (bytes, bytearray or memoryview), or
+    None if they don't decode. The buffer is used in place, not copied."""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if data.size == 0:
+        return None
+    scale = reduction_for(image_size(buffer), max_side)
+    gray = cv2.imdecode(data, REDUCED_GRAYSCALE[scale])
+    if gray is None:
+        return None
+
+    if scale == 1 and max_side:
+        # Formats without a parsed header: decoded at full size, so shrink now
+        factor = reduction_for(gray.shape[::-1], max_side)
+        if factor > 1:
+            gray = cv2.resize(gray, (gray.shape[1] // factor, gray.shape[0] // factor), interpolation=cv2.INTER_AREA)
+    return DecodedImage(gray)
+
+
+def decode_color(buffer):
+    """Full-resolution BGR image for raw upload bytes, or None if they don't decode"""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if data.size == 0:
+        return None
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def to_gray(image):
+    """Grayscale pixels of a DecodedImage, BGR image or grayscale image"""
+    if isinstance(image, DecodedImage):
+        return image.gray
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -0,0 +1,230 @@
+"""
+Hot-path timers, counters and on-demand profiling for the recognition path.
+
+Each stage of registration and attendance (decode, detect, embed, match,
+record, register, and track in stream.py) is timed with perf_counter into a per-stage histogram
+with fixed buckets, plus a rolling window of the latest observations for
+recent quantiles. Counters cover faces detected, uploads without a face,
+faces failing the quality gate, matches, rejects, upload cache hits and misses, and attendance written or
+suppressed by the cooldown. Recording one observation takes a lock and a
+bisect, about a microsecond.
+
+METRICS is shared by everything in the process. render() returns it in
+Prometheus text format: the API serves it at GET /metrics, and serve()
+exposes it on its own port for the Streamlit app.
+
+profile() captures a cProfile (or pyinstrument) profile of one block, so a
+single slow request can be profiled on demand without restarting.
+
+Configuration:
+    FACE_METRICS          0 turns timers and counters off (default on)
+    FACE_METRICS_WINDOW   observations kept per stage for recent quantiles (default 1024)
+    FACE_METRICS_PORT     serve /metrics from the Streamlit app on this port (default off)
+    FACE_PROFILE          1 allows on-demand profiling of single requests (default off)
+    FACE_PROFILER         cprofile (default) or pyinstrument
+    FACE_PROFILE_DIR      where profiles are written (default profiles/)
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get('FACE_METRICS', '1').lower() not in ('0', 'false', 'no', 'off')
+WINDOW = int(os.environ.get('FACE_METRICS_WINDOW', '1024'))
+METRICS_PORT = int(os.environ.get('FACE_METRICS_PORT', '0'))
+PROFILE_ENABLED = os.environ.get('FACE_PROFILE', '0').lower() in ('1', 'true', 'yes', 'on')
+PROFILER = os.environ.get('FACE_PROFILER', 'cprofile').lower()
+PROFILE_DIR = os.environ.get('FACE_PROFILE_DIR', 'profiles')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; detection on a large frame takes ~0.1 s, a gallery match well under 1 ms
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+COUNTERS = {
+    'faces_detected': "Faces found by the detector",
+    'no_face': "Photos in which no face was found",
+    'quality_rejects': "Photos whose faces all failed the quality gate",
+    'matches': "Embeddings matched to a registered user",
+    'rejects': "Embeddings below the match threshold",
+    'upload_cache_hits': "Uploads answered from the upload cache",
+    'upload_cache_misses': "Uploads that had to be decoded and detected",
+    'attendance_recorded': "Attendance rows written",
+    'attendance_suppressed': "Recognitions skipped by the attendance cooldown",
+    'registrations': "Users registered",
+}
+
+
+class StageStats:
+    """Cumulative histogram of one stage plus a rolling window of recent durations"""
+
+    def __init__(self, window=WINDOW):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in QUANTILES}
+
+
+class Metrics:
+    """Thread-safe stage timers and counters"""
+
+    def __init__(self, enabled=ENABLED, window=WINDOW, prefix='face'):
+        self.enabled = enabled
+        self.window = window
+        self.prefix = prefix
+        self._stages = {}
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as one observation of stage name"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats(self.window)
+            stats.observe(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled and n:
+            with self._lock:
+                self._counters[name] += n
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """{'stages': {name: {count, mean_ms, p50_ms, p90_ms, p99_ms}}, 'counters': {name: n}}"""
+        with self._lock:
+            stages = {}
+            for name, stats in self._stages.items():
+                quantiles = stats.quantiles()
+                stages[name] = {'count': stats.count, 'mean_ms': stats.total * 1000 / stats.count,
+                                **{f"p{int(q * 100)}_ms": value * 1000 for q, value in quantiles.items()}}
+            return {'stages': stages, 'counters': dict(self._counters)}
+
+    def render(self, extra=()):
+        """Prometheus text exposition; extra is (name, type, help, value) for gauges owned by the caller"""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            stages = sorted(self._stages.items())
+            lines += [f"# HELP {p}_stage_seconds Time spent in each recognition stage",
+                      f"# TYPE {p}_stage_seconds histogram"]
+            for name, stats in stages:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float('inf'),), stats.buckets):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {stats.total!r}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {stats.count}')
+
+            lines += [f"# HELP {p}_stage_recent_seconds Stage time quantiles over the last {self.window} calls",
+                      f"# TYPE {p}_stage_recent_seconds summary"]
+            for name, stats in stages:
+                for q, value in stats.quantiles().items():
+                    lines.append(f'{p}_stage_recent_seconds{{stage="{name}",quantile="{q}"}} {value!r}')
+                lines.append(f'{p}_stage_recent_seconds_sum{{stage="{name}"}} {sum(stats.recent)!r}')
+                lines.append(f'{p}_stage_recent_seconds_count{{stage="{name}"}} {len(stats.recent)}')
+
+            for name in sorted(set(COUNTERS) | set(self._counters)):
+                lines += [f"# HELP {p}_{name}_total {COUNTERS.get(name, name.replace('_', ' '))}",
+                          f"# TYPE {p}_{name}_total counter",
+                          f"{p}_{name}_total {self._counters.get(name, 0)}"]
+
+        for name, kind, help_text, value in extra:
+            lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} {kind}", f"{p}_{name} {value!r}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def profile(label, profiler=PROFILER, directory=PROFILE_DIR):
+    """Profile the block and write it to directory; yields a dict whose 'path' is set afterwards.
+
+    cProfile output is a pstats file (open with `python -m pstats` or
+    snakeviz); pyinstrument output is an HTML page. Only the calling thread
+    is profiled, so run this inside the worker that does the work.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{label}")
+    result = {'path': None}
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result['path'] = f"{stem}.html"
+            with open(result['path'], 'w') as f:
+                f.write(profiler.output_html())
+    else:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result['path'] = f"{stem}.prof"
+            profiler.dump_stats(result['path'])
+
+
+def serve(port=METRICS_PORT, host='127.0.0.1', metrics=METRICS):
+    """Serve metrics.render() at /metrics from a daemon thread; returns the server"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
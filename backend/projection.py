@@ -0,0 +1,226 @@
+"""
+Optional PCA/LDA projection of face embeddings ("eigenfaces"/"fisherfaces").
+
+A linear projection fitted on the enrolled gallery reduces the 10,000-value
+pixel embedding to a few hundred dimensions, which shrinks both the gallery
+matrix and every comparison. The model is stored next to the database as
+attendance.projection.npz with a version number. While a model is active,
+each user row keeps only the projected embedding and the model version it
+was produced with; its raw embedding is emptied, since it is the centroid of
+the user's raw templates in user_embeddings (see templates.py), which a
+refit re-projects from and remove restores it from.
+
+Usage:
+    python projection.py fit attendance.db [--dims 128] [--kind pca|lda] [--whiten]
+    python projection.py remove attendance.db
+"""
+
+import argparse
+import os
+from collections import Counter
+
+import numpy as np
+
+from db import get_pool
+from embedding_codec import decode_embedding, encode_embedding
+
+MIN_DIMS = 64
+MAX_DIMS = 512
+DEFAULT_DIMS = 128
+KINDS = ('pca', 'lda')
+MAX_FIT_ROWS = 20000
+
+
+def projection_path(db_path):
+    return f"{os.path.splitext(db_path)[0]}.projection.npz"
+
+
+class Projection:
+    """Linear map x -> normalize((x - mean) @ weights)"""
+
+    def __init__(self, kind, mean, weights, version=1):
+        self.kind = kind
+        self.mean = np.ascontiguousarray(mean, dtype=np.float32)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        self.version = version
+
+    @property
+    def input_dim(self):
+        return self.weights.shape[0]
+
+    @property
+    def dims(self):
+        return self.weights.shape[1]
+
+    @classmethod
+    def fit(cls, matrix, dims=DEFAULT_DIMS, kind='pca', labels=None, whiten=False, version=1):
+        """Fit a projection on an (N, D) matrix of raw embeddings.
+
+        PCA is capped at N - 1 dimensions; LDA needs a label per row, at least
+        two samples for some label, and is capped at the number of labels - 1.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown projection kind: {kind}")
+        if not MIN_DIMS <= dims <= MAX_DIMS:
+            raise ValueError(f"Projection dims must be between {MIN_DIMS} and {MAX_DIMS}")
+
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if len(matrix) < 2:
+            raise ValueError("Need at least two embeddings to fit a projection")
+
+        if kind == 'pca':
+            from sklearn.decomposition import PCA
+
+            model = PCA(n_components=min(dims, len(matrix) - 1), whiten=whiten, svd_solver='randomized', random_state=0)
+            model.fit(matrix)
+            weights = model.components_.T
+            if whiten:
+                weights = weights / np.sqrt(model.explained_variance_)
+            return cls(kind, model.mean_, weights, version)
+
+        from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+
+        if labels is None or len(set(labels)) == len(labels):
+            raise ValueError("LDA needs several embeddings for at least one user")
+        model = LinearDiscriminantAnalysis(solver='svd')
+        model.fit(matrix, labels)
+        dims = min(dims, len(set(labels)) - 1, model.scalings_.shape[1])
+        return cls(kind, model.xbar_, model.scalings_[:, :dims], version)
+
+    def transform(self, embeddings):
+        """Project (N, D) or (D,) raw embeddings to L2-normalized float32 rows"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        single = embeddings.ndim == 1
+        projected = (np.atleast_2d(embeddings) - self.mean) @ self.weights
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        projected = projected / norms
+        return projected[0] if single else projected
+
+    def save(self, path):
+        np.savez(path, kind=self.kind, mean=self.mean, weights=self.weights, version=self.version)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        return cls(str(data['kind']), data['mean'], data['weights'], int(data['version']))
+
+
+def load_projection(db_path):
+    """Active projection for a database, or None if matching uses raw embeddings"""
+    path = projection_path(db_path)
+    if not os.path.exists(path):
+        return None
+    return Projection.load(path)
+
+
+def embedding_columns(projection, embedding):
+    """(embedding, projected_embedding, projection_version) values for a users
+    row: the raw embedding without a projection model, else only the projected
+    one (the raw one is empty). Embeddings the model can't take stay raw."""
+    if projection is None or len(embedding) != projection.input_dim:
+        return encode_embedding(embedding), None, None
+    return b'', encode_embedding(projection.transform(embedding)), projection.version
+
+
+def _read_templates(pool):
+    """(user_id, embedding) of every template of the most common dimension"""
+    rows = []
+    for user_id, value in pool.query("SELECT user_id, embedding FROM user_embeddings ORDER BY user_id, id"):
+        try:
+            rows.append((user_id, decode_embedding(value)))
+        except ValueError:
+            continue
+    if not rows:
+        return rows
+    dim = Counter(len(v) for _, v in rows).most_common(1)[0][0]
+    return [r for r in rows if len(r[1]) == dim]
+
+
+def refit_projection(db_path='attendance.db', dims=DEFAULT_DIMS, kind='pca', whiten=False):
+    """Fit a new projection version on every stored embedding and re-project all rows.
+
+    Every user is re-projected from the centroid of their raw templates in
+    user_embeddings. PCA is fitted on those centroids; LDA needs several
+    samples per person, so it is fitted on the templates themselves,
+    labelled by user. Returns the new Projection. Persisted search indexes
+    are deleted because their vectors belong to the previous projection.
+    """
+    from search_index import INDEX_TYPES, index_path
+    from templates import centroid
+
+    pool = get_pool(db_path)
+    templates = _read_templates(pool)
+    if not templates:
+        raise ValueError("No embeddings to fit a projection on")
+    user_ids = sorted({user_id for user_id, _ in templates})
+    grouped = {user_id: [] for user_id in user_ids}
+    for user_id, vector in templates:
+        grouped[user_id].append(vector)
+    matrix = np.stack([centroid(grouped[user_id]) for user_id in user_ids])
+
+    previous = load_projection(db_path)
+    version = previous.version + 1 if previous else 1
+    if kind == 'lda':
+        labels = np.array([user_id for user_id, _ in templates])
+        samples = np.stack([vector for _, vector in templates])
+    else:
+        labels = np.array(user_ids)
+        samples = matrix
+
+    # Large galleries are fitted on a random sample; every row is still projected
+    fit_rows = np.arange(len(samples))
+    if len(samples) > MAX_FIT_ROWS:
+        fit_rows = np.random.default_rng(0).choice(len(samples), size=MAX_FIT_ROWS, replace=False)
+    projection = Projection.fit(samples[fit_rows], dims, kind, labels[fit_rows].tolist(), whiten, version)
+
+    projected = projection.transform(matrix)
+    pool.executemany("UPDATE users SET embedding = x'', projected_embedding = ?, projection_version = ? WHERE id = ?",
+                     [(encode_embedding(p), version, user_id) for user_id, p in zip(user_ids, projected)])
+
+    projection.save(projection_path(db_path))
+    for index_kind in INDEX_TYPES:
+        path = index_path(db_path, index_kind)
+        if os.path.exists(path):
+            os.remove(path)
+    return projection
+
+
+def remove_projection(db_path='attendance.db'):
+    """Go back to matching on raw embeddings, restoring them from the templates"""
+    from search_index import INDEX_TYPES, index_path
+    from templates import template_centroids
+
+    pool = get_pool(db_path)
+    emptied = [row[0] for row in pool.query("SELECT id FROM users WHERE length(embedding) = 0")]
+    if emptied:
+        restored = template_centroids(db_path, emptied)
+        pool.executemany("UPDATE users SET embedding = ?, projected_embedding = NULL, projection_version = NULL "
+                         "WHERE id = ?", [(encode_embedding(mean), user_id) for user_id, mean in restored.items()])
+    for path in [projection_path(db_path)] + [index_path(db_path, kind) for kind in INDEX_TYPES]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit or remove the embedding projection model")
+    parser.add_argument('command', choices=['fit', 'remove'])
+    parser.add_argument('db_path', nargs='?', default='attendance.db', help="SQLite database")
+    parser.add_argument('--dims', type=int, default=DEFAULT_DIMS, help=f"Output dimensions ({MIN_DIMS}-{MAX_DIMS})")
+    parser.add_argument('--kind', choices=KINDS, default='pca', help="Projection type")
+    parser.add_argument('--whiten', action='store_true', help="Whiten PCA components")
+    args = parser.parse_args()
+
+    if args.command == 'remove':
+        remove_projection(args.db_path)
+        print("Projection removed; matching uses raw embeddings")
+        return 0
+
+    projection = refit_projection(args.db_path, args.dims, args.kind, args.whiten)
+    print(f"Fitted {projection.kind} projection v{projection.version}: "
+          f"{projection.input_dim} -> {projection.dims} dims")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,163 @@
+"""
+Face quality gate between detection and embedding.
+
+A tiny, blurred or badly lit face still yields an embedding, but one that
+matches nobody, and the person retries with another full pipeline run. Each
+detected face is scored on a 100x100 copy of its crop, about 0.15 ms per
+face:
+
+    size        shorter side of the box in pixels
+    sharpness   variance of the Laplacian (blurred faces score low)
+    brightness  mean gray level
+    contrast    standard deviation of the gray levels
+    symmetry    correlation of the left half with the mirrored right half, a
+                cheap frontal-pose proxy: about 0.5-0.7 for a frontal face,
+                lower for a turned or off-center one
+
+select_face() picks the largest face that passes every check, instead of
+the detector's first box, and raises FaceRejected with the reason when
+faces were found but none passed. Assessment is timed as the 'quality'
+stage; rejections are counted in total and per reason (see metrics.py).
+
+The frontal cascade rarely detects strongly turned faces, so the pose check
+is off unless FACE_QUALITY_MIN_SYMMETRY is set (0.3 is a reasonable start).
+
+Configuration:
+    FACE_QUALITY                  0 turns the gate off; the largest face is still picked (default on)
+    FACE_QUALITY_MIN_SIZE         smallest face side in pixels (default 40)
+    FACE_QUALITY_MIN_SHARPNESS    Laplacian variance (default 20)
+    FACE_QUALITY_MIN_BRIGHTNESS   mean gray level (default 40)
+    FACE_QUALITY_MAX_BRIGHTNESS   mean gray level (default 220)
+    FACE_QUALITY_MIN_CONTRAST     gray level standard deviation (default 20)
+    FACE_QUALITY_MIN_SYMMETRY     left/right correlation (default 0, off)
+"""
+
+import os
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from metrics import METRICS
+
+SIDE = 100
+SYMMETRY_SIDE = 32
+
+MESSAGES = {
+    'too_small': "Face too small ({size} px, need {min_size})",
+    'blurry': "Face too blurry (sharpness {sharpness:.0f}, need {min_sharpness:.0f})",
+    'too_dark': "Face too dark (brightness {brightness:.0f}, need {min_brightness:.0f})",
+    'too_bright': "Face overexposed (brightness {brightness:.0f}, at most {max_brightness:.0f})",
+    'low_contrast': "Face too flat (contrast {contrast:.0f}, need {min_contrast:.0f})",
+    'not_frontal': "Face not looking at the camera (symmetry {symmetry:.2f}, need {min_symmetry:.2f})",
+}
+
+
+@dataclass(frozen=True)
+class QualityConfig:
+    enabled: bool = True
+    min_size: int = 40
+    min_sharpness: float = 20.0
+    min_brightness: float = 40.0
+    max_brightness: float = 220.0
+    min_contrast: float = 20.0
+    min_symmetry: float = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.environ.get('FACE_QUALITY', '1').lower() not in ('0', 'false', 'no', 'off'),
+            min_size=int(os.environ.get('FACE_QUALITY_MIN_SIZE', 40)),
+            min_sharpness=float(os.environ.get('FACE_QUALITY_MIN_SHARPNESS', 20.0)),
+            min_brightness=float(os.environ.get('FACE_QUALITY_MIN_BRIGHTNESS', 40.0)),
+            max_brightness=float(os.environ.get('FACE_QUALITY_MAX_BRIGHTNESS', 220.0)),
+            min_contrast=float(os.environ.get('FACE_QUALITY_MIN_CONTRAST', 20.0)),
+            min_symmetry=float(os.environ.get('FACE_QUALITY_MIN_SYMMETRY', 0.0)),
+        )
+
+
+DEFAULT_CONFIG = QualityConfig.from_env()
+
+
+@dataclass(frozen=True)
+class FaceQuality:
+    """Scores of one face box; reason is None if it passed"""
+    box: tuple
+    size: int
+    sharpness: float
+    brightness: float
+    contrast: float
+    symmetry: float
+    reason: str = None
+    message: str = None
+
+    @property
+    def passed(self):
+        return self.reason is None
+
+
+class FaceRejected(Exception):
+    """Faces were found but none passed the quality gate; quality is the largest one's"""
+
+    def __init__(self, quality):
+        super().__init__(quality.message)
+        self.quality = quality
+
+    @property
+    def reason(self):
+        return self.quality.reason
+
+    def __reduce__(self):
+        return FaceRejected, (self.quality,)
+
+
+def _symmetry(face):
+    small = cv2.resize(face, (SYMMETRY_SIDE, SYMMETRY_SIDE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    half = SYMMETRY_SIDE // 2
+    left = small[:, :half] - small[:, :half].mean()
+    right = small[:, :half - 1:-1] - small[:, :half - 1:-1].mean()
+    denominator = np.sqrt((left * left).sum() * (right * right).sum())
+    return float((left * right).sum() / denominator) if denominator > 0 else 0.0
+
+
+def assess(gray, box, config=DEFAULT_CONFIG):
+    """FaceQuality of one x, y, w, h box in a grayscale image"""
+    x, y, w, h = (int(v) for v in box)
+    crop = gray[max(y, 0):y + h, max(x, 0):x + w]
+    if crop.size == 0:
+        scores = dict(size=0, sharpness=0.0, brightness=0.0, contrast=0.0, symmetry=0.0)
+    else:
+        face = cv2.resize(crop, (SIDE, SIDE), interpolation=cv2.INTER_AREA)
+        mean, std = cv2.meanStdDev(face)
+        scores = dict(size=min(w, h), sharpness=float(cv2.Laplacian(face, cv2.CV_32F).var()),
+                      brightness=float(mean[0, 0]), contrast=float(std[0, 0]), symmetry=_symmetry(face))
+
+    checks = [
+        ('too_small', scores['size'] < config.min_size),
+        ('blurry', scores['sharpness'] < config.min_sharpness),
+        ('too_dark', scores['brightness'] < config.min_brightness),
+        ('too_bright', scores['brightness'] > config.max_brightness),
+        ('low_contrast', scores['contrast'] < config.min_contrast),
+        ('not_frontal', config.min_symmetry > 0 and scores['symmetry'] < config.min_symmetry),
+    ]
+    reason = next((name for name, failed in checks if failed), None)
+    message = MESSAGES[reason].format(**scores, **vars(config)) if reason else None
+    return FaceQuality((x, y, w, h), reason=reason, message=message, **scores)
+
+
+def select_face(gray, faces, config=DEFAULT_CONFIG):
+    """(box, quality) of the largest face that passes the gate; quality is None
+    with the gate off. Raises FaceRejected if none of the faces passes."""
+    faces = sorted((tuple(int(v) for v in face) for face in faces), key=lambda b: b[2] * b[3], reverse=True)
+    if not config.enabled:
+        return faces[0], None
+    largest = None
+    with METRICS.stage('quality'):
+        for box in faces:
+            quality = assess(gray, box, config)
+            if quality.passed:
+                return quality.box, quality
+            largest = largest or quality
+    METRICS.count('quality_rejects')
+    METRICS.count(f"quality_{largest.reason}")
+    raise FaceRejected(largest)
@@ -0,0 +1,145 @@
+"""
+Face recognition core shared by the Streamlit app and the command-line tools.
+"""
+
+import cv2
+import numpy as np
+
+from db import SITE, get_pool
+from descriptors import get_descriptor
+from detector import get_detector
+from ingest import decode_image, to_gray
+from metrics import METRICS
+from projection import embedding_columns
+from quality import DEFAULT_CONFIG as QUALITY_CONFIG, select_face
+from templates import centroid, insert_templates
+
+
+def save_user_image(image, user_id):
+    image_path = f"user_images/user_{user_id}.jpg"
+    cv2.imwrite(image_path, image)
+    return image_path
+
+
+def register_user(db_path, name, image, embedding, gallery, site=SITE):
+    """Insert a user, store their photo and add them to the in-memory gallery.
+
+    embedding is one embedding, or a (T, D) stack from several enrollment
+    photos; each becomes a template and the user row keeps their centroid
+    (see templates.py). The user is enrolled at site (FACE_SITE). The photo
+    is named after the new id, so it is written inside the insert
+    transaction; returns the user id.
+    """
+    embeddings = np.atleast_2d(np.asarray(embedding, dtype=np.float32))
+    mean = centroid(embeddings)
+    with METRICS.stage('register'), get_pool(db_path).transaction() as conn:
+        c = conn.execute("INSERT INTO users (name, image_path, embedding, projected_embedding, projection_version, "
+                         "site) VALUES (?, '', ?, ?, ?, ?)",
+                         (name, *embedding_columns(gallery.projection, mean), site))
+        user_id = c.lastrowid
+        insert_templates(conn, user_id, embeddings)
+        conn.execute("UPDATE users SET image_path = ? WHERE id = ?", (save_user_image(image, user_id), user_id))
+    gallery.add(user_id, name, mean, embeddings)
+    METRICS.count('registrations')
+    return user_id
+
+
+def embed_face(gray, box, descriptor=None):
+    """Embedding for one x, y, w, h face box in a grayscale image.
+
+    Uses the descriptor configured with FACE_DESCRIPTOR (see descriptors.py)
+    unless one is given.
+    """
+    with METRICS.stage('embed'):
+        return (descriptor or get_descriptor()).describe(gray, box)
+
+
+def detect_face(gray, detector=None, session=None, quality=QUALITY_CONFIG):
+    """x, y, w, h of the face to recognize in a grayscale image, or None.
+
+    The largest face that passes the quality gate is chosen (see
+    quality.py); raises quality.FaceRejected, whose message gives the
+    reason, if faces were found but none passed. If a session dict is given,
+    the chosen face box is remembered in it so ROI detection can search
+    around it on the next frame.
+    """
+    # Use the shared Haar cascade for face detection
+    last_box = session.get('last_face_box') if session is not None else None
+    with METRICS.stage('detect'):
+        faces = (detector or get_detector()).detect(gray, last_box)
+
+    if len(faces) == 0:
+        METRICS.count('no_face')
+        return None
+    METRICS.count('faces_detected', len(faces))
+
+    # Boxes are in full-resolution coordinates
+    box, _ = select_face(gray, faces, quality)
+    if session is not None:
+        session['last_face_box'] = box
+    return box
+
+
+def extract_face_embedding(image, detector=None, session=None, descriptor=None):
+    """Extract face embedding using OpenCV and basic image processing.
+
+    image is a BGR array or an ingest.DecodedImage (see ingest.py). Raises
+    quality.FaceRejected if the only faces found fail the quality gate.
+    """
+    gray = to_gray(image)
+    box = detect_face(gray, detector, session)
+    if box is None:
+        return None
+    return embed_face(gray, box, descriptor)
+
+
+def upload_context(detector=None, descriptor=None, quality=QUALITY_CONFIG):
+    """The settings an upload's (box, embedding) depends on besides its bytes,
+    used in upload_cache.UploadCache keys: the detector, descriptor and
+    quality gate configs. A detector without a config stands for itself."""
+    detector = detector or get_detector()
+    return getattr(detector, 'config', detector), (descriptor or get_descriptor()).config, quality
+
+
+def embed_upload(data, detector=None, session=None, cache=None, descriptor=None):
+    """(box, embedding) for raw upload bytes; both None if there is no face.
+
+    The box is in the coordinates of the reduced grayscale decode
+    (ingest.decode_image), not of the uploaded photo. With an
+    upload_cache.UploadCache, bytes seen before are answered from the cache
+    without decoding or detection. Raises ValueError if the bytes don't decode
+    as an image, and quality.FaceRejected if no face passes the quality gate.
+    """
+    descriptor = descriptor or get_descriptor()
+    if cache is not None:
+        key = cache.key(data, upload_context(detector, descriptor))
+        cached = cache.get(key)
+        METRICS.count('upload_cache_misses' if cached is None else 'upload_cache_hits')
+        if cached is not None:
+            if session is not None and cached[0] is not None:
+                session['last_face_box'] = cached[0]
+            return cached
+
+    with METRICS.stage('decode'):
+        image = decode_image(data)
+    if image is None:
+        raise ValueError("Could not decode image")
+    box = detect_face(image.gray, detector, session)
+    embedding = embed_face(image.gray, box, descriptor) if box is not None else None
+
+    if cache is not None:
+        cache.put(key, box, embedding)
+    return box, embedding
+
+
+def extract_face_embeddings(image, detector=None, descriptor=None):
+    """Embeddings for every face in an image.
+
+    Returns (boxes, embeddings): an (N, 4) box array and an (N, D) matrix.
+    """
+    gray = to_gray(image)
+    with METRICS.stage('detect'):
+        boxes = (detector or get_detector()).detect(gray)
+    METRICS.count('faces_detected', len(boxes))
+    with METRICS.stage('embed'):
+        return boxes, (descriptor or get_descriptor()).describe_many(gray, boxes)
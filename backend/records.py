@@ -0,0 +1,208 @@
+"""
+Attendance reporting queries for the Records page and exports.
+
+Filtering, pagination and aggregation all run in SQL against the
+attendance(timestamp) and attendance(user_id, timestamp) indexes, so a page
+render only transfers the rows it shows. Exports walk a cursor in chunks and
+write CSV or Parquet incrementally, never holding the whole history in
+memory. Parquet needs the optional pyarrow package; parquet_available()
+tells whether it is installed without importing it.
+
+Usage:
+    python records.py export out.csv [--start 2024-01-01] [--end 2024-01-31] [--user-id 3] [--site lab]
+    python records.py export out.parquet [...]
+"""
+
+import argparse
+import csv
+import importlib.util
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from db import DB_PATH, get_pool
+
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_COLUMNS = ['name', 'timestamp', 'site']
+DAY = "substr(attendance.timestamp, 1, 10)"
+
+
+@dataclass(frozen=True)
+class RecordFilter:
+    """Inclusive YYYY-MM-DD date range, user and site; None means no filter"""
+    start: str = None
+    end: str = None
+    user_id: int = None
+    site: str = None
+
+    def where(self, include_user=True):
+        """SQL condition on the attendance table and its parameters"""
+        clauses, params = [], []
+        if self.start:
+            clauses.append("attendance.timestamp >= ?")
+            params.append(f"{self.start} 00:00:00")
+        if self.end:
+            # Half-open bound so the timestamp index range scan stays exact
+            clauses.append("attendance.timestamp < ?")
+            params.append(f"{date.fromisoformat(self.end) + timedelta(days=1)} 00:00:00")
+        if self.site:
+            clauses.append("attendance.site = ?")
+            params.append(self.site)
+        if include_user and self.user_id is not None:
+            clauses.append("attendance.user_id = ?")
+            params.append(self.user_id)
+        return " AND ".join(clauses) or "1", params
+
+
+def data_stamp(db_path=DB_PATH):
+    """Changes whenever users or attendance rows are inserted; use it as a cache key"""
+    return tuple(get_pool(db_path).query(
+        "SELECT (SELECT MAX(id) FROM attendance), (SELECT MAX(id) FROM users), (SELECT COUNT(*) FROM users)")[0])
+
+
+def list_users(db_path=DB_PATH):
+    """(id, name) for every user, by name"""
+    return get_pool(db_path).query("SELECT id, name FROM users ORDER BY name, id")
+
+
+def list_sites(db_path=DB_PATH):
+    return [row[0] for row in get_pool(db_path).query(
+        "SELECT DISTINCT site FROM attendance WHERE site IS NOT NULL ORDER BY site")]
+
+
+def count_records(db_path, flt):
+    where, params = flt.where()
+    return get_pool(db_path).query(
+        f"SELECT COUNT(*) FROM attendance JOIN users ON users.id = attendance.user_id WHERE {where}", params)[0][0]
+
+
+def fetch_records(db_path, flt, limit=100, offset=0):
+    """One page of (name, timestamp, site), newest first"""
+    where, params = flt.where()
+    return get_pool(db_path).query(
+        f"SELECT users.name, attendance.timestamp, attendance.site FROM attendance "
+        f"JOIN users ON users.id = attendance.user_id WHERE {where} "
+        f"ORDER BY attendance.timestamp DESC, attendance.id DESC LIMIT ? OFFSET ?", params + [limit, offset])
+
+
+def daily_counts(db_path, flt):
+    """(day, marks, distinct people) per day"""
+    where, params = flt.where()
+    return get_pool(db_path).query(
+        f"SELECT {DAY} AS day, COUNT(*), COUNT(DISTINCT attendance.user_id) FROM attendance "
+        f"JOIN users ON users.id = attendance.user_id WHERE {where} GROUP BY day ORDER BY day", params)
+
+
+def count_first_last(db_path, flt):
+    where, params = flt.where()
+    return get_pool(db_path).query(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM attendance JOIN users ON users.id = attendance.user_id "
+        f"WHERE {where} GROUP BY {DAY}, attendance.user_id)", params)[0][0]
+
+
+def first_last(db_path, flt, limit=100, offset=0):
+    """(day, name, first in, last out, marks) per user and day, newest day first"""
+    where, params = flt.where()
+    return get_pool(db_path).query(
+        f"SELECT {DAY} AS day, users.name, MIN(attendance.timestamp), MAX(attendance.timestamp), COUNT(*) "
+        f"FROM attendance JOIN users ON users.id = attendance.user_id WHERE {where} "
+        f"GROUP BY day, attendance.user_id ORDER BY day DESC, users.name LIMIT ? OFFSET ?", params + [limit, offset])
+
+
+def count_users(db_path, flt):
+    if flt.user_id is not None:
+        return get_pool(db_path).query("SELECT COUNT(*) FROM users WHERE id = ?", (flt.user_id,))[0][0]
+    return get_pool(db_path).query("SELECT COUNT(*) FROM users")[0][0]
+
+
+def attendance_rates(db_path, flt, limit=100, offset=0):
+    """(name, days present, working days, percent) per user.
+
+    Working days are the days in the filter on which anyone was marked, so
+    users who never showed up are listed at 0%.
+    """
+    where, params = flt.where(include_user=False)
+    user_clause, user_params = ("WHERE users.id = ?", [flt.user_id]) if flt.user_id is not None else ("", [])
+    return get_pool(db_path).query(
+        f"SELECT users.name, COALESCE(present.days, 0), working.days, "
+        f"ROUND(100.0 * COALESCE(present.days, 0) / NULLIF(working.days, 0), 1) "
+        f"FROM users "
+        f"LEFT JOIN (SELECT attendance.user_id, COUNT(DISTINCT {DAY}) AS days FROM attendance WHERE {where} "
+        f"GROUP BY attendance.user_id) AS present ON present.user_id = users.id "
+        f"CROSS JOIN (SELECT COUNT(DISTINCT {DAY}) AS days FROM attendance WHERE {where}) AS working "
+        f"{user_clause} ORDER BY users.name, users.id LIMIT ? OFFSET ?",
+        params + params + user_params + [limit, offset])
+
+
+def iter_records(db_path, flt, chunk_size=EXPORT_CHUNK_ROWS):
+    """Yield lists of (name, timestamp, site) rows in timestamp order, chunk_size at a time"""
+    where, params = flt.where()
+    with get_pool(db_path).connection() as conn:
+        cursor = conn.execute(
+            f"SELECT users.name, attendance.timestamp, attendance.site FROM attendance "
+            f"JOIN users ON users.id = attendance.user_id WHERE {where} "
+            f"ORDER BY attendance.timestamp, attendance.id", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def write_csv(db_path, flt, out, chunk_size=EXPORT_CHUNK_ROWS):
+    """Stream matching records as CSV to a text file object; returns the row count"""
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS)
+    total = 0
+    for rows in iter_records(db_path, flt, chunk_size):
+        writer.writerows(rows)
+        total += len(rows)
+    return total
+
+
+def parquet_available():
+    """True if pyarrow, needed by write_parquet, is installed"""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def write_parquet(db_path, flt, out, chunk_size=EXPORT_CHUNK_ROWS):
+    """Stream matching records to a Parquet file (path or binary file object), one row group per chunk"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+    total = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for rows in iter_records(db_path, flt, chunk_size):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch([pa.array(c, pa.string()) for c in columns], schema=schema))
+            total += len(rows)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export attendance records")
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('output', help="Output file; .parquet writes Parquet, anything else CSV")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database")
+    parser.add_argument('--start', help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', help="Last day, YYYY-MM-DD")
+    parser.add_argument('--user-id', type=int, help="Only this user")
+    parser.add_argument('--site', help="Only this site")
+    args = parser.parse_args()
+
+    flt = RecordFilter(args.start, args.end, args.user_id, args.site)
+    if os.path.splitext(args.output)[1].lower() == '.parquet':
+        total = write_parquet(args.db, flt, args.output)
+    else:
+        with open(args.output, 'w', newline='') as out:
+            total = write_csv(args.db, flt, out)
+    print(f"Exported {total} records to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
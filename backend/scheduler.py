@@ -0,0 +1,133 @@
+"""
+Micro-batching scheduler for gallery matching.
+
+Concurrent requests each produce one embedding. Instead of every request
+scanning the gallery on its own (one matrix-vector product each, serialized
+on the gallery lock), MatchBatcher queues them, collects whatever arrives
+within max_wait_ms (up to max_batch), stacks the embeddings and runs a
+single Gallery.match_many call, i.e. one matrix-matrix product. Each caller
+gets its own result back through a Future.
+
+The first request of a batch waits at most max_wait_ms; under light load
+batches are small and the added latency is bounded, under heavy load they
+fill up and throughput rises.
+
+Configuration: FACE_BATCH_MAX (default 32), FACE_BATCH_WAIT_MS (default 2).
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+import numpy as np
+
+from gallery import MATCH_THRESHOLD
+
+MAX_BATCH = int(os.environ.get('FACE_BATCH_MAX', '32'))
+MAX_WAIT_MS = float(os.environ.get('FACE_BATCH_WAIT_MS', '2'))
+
+_STOP = object()
+
+
+class MatchBatcher:
+    """Coalesces concurrent match requests into one gallery search per batch"""
+
+    def __init__(self, gallery, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, threshold=MATCH_THRESHOLD):
+        self.gallery = gallery
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.threshold = threshold
+        self._queue = queue.Queue()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = np.zeros(max_batch + 1, dtype=np.int64)
+        self._thread = threading.Thread(target=self._run, name='match-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, embedding):
+        """Queue one embedding; the Future resolves to match()'s result"""
+        if self._closed:
+            raise RuntimeError("MatchBatcher is closed")
+        future = Future()
+        self._queue.put((np.asarray(embedding, dtype=np.float32).ravel(), future))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+        return future
+
+    def match(self, embedding, timeout=None):
+        """Blocking (user_id, name, similarity) or None, like Gallery.match"""
+        return self.submit(embedding).result(timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then stop
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _match(self, embeddings):
+        results = [None] * len(embeddings)
+        # One stacked search per embedding size; mixed sizes only happen with bad input
+        by_dim = defaultdict(list)
+        for row, embedding in enumerate(embeddings):
+            by_dim[len(embedding)].append(row)
+        for rows in by_dim.values():
+            matches = self.gallery.match_many(np.stack([embeddings[row] for row in rows]), self.threshold)
+            for row, match in zip(rows, matches):
+                results[row] = match
+        return results
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            futures = [future for _, future in batch]
+            try:
+                results = self._match([embedding for embedding, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self.batch_sizes[len(batch)] += 1
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def metrics(self):
+        """Queue depth and batch fill counters"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'mean_batch_fill': self.requests / (self.batches * self.max_batch) if self.batches else 0.0,
+                'batch_sizes': {size: int(count) for size, count in enumerate(self.batch_sizes) if count},
+            }
+
+    def close(self):
+        """Stop the worker after the queued requests are answered"""
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
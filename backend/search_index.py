@@ -0,0 +1,311 @@
+"""
+Nearest-neighbour search indexes for the embedding gallery.
+
+Two interchangeable backends sit behind Gallery.match():
+
+    BruteForceIndex  exact search, one matrix product over every embedding
+    IVFIndex         approximate inverted-file search in pure NumPy: a spherical
+                     k-means coarse quantizer assigns each embedding to a list
+                     and queries only scan the nprobe closest lists
+
+Vectors are expected to be L2-normalized, so the inner product is the cosine
+similarity. Indexes persist to an .npz file next to attendance.db and are
+kept in sync incrementally as users are added or removed. A persisted index
+records the last user_changes seq it reflects, so users whose embedding
+changed since (e.g. new templates) are re-indexed when it is loaded.
+
+The gallery writes the file in the background a few seconds after users
+are added or removed, from a copy of the index, so a burst of registrations
+or captured templates costs one write and matching never waits on it.
+
+Configuration:
+    FACE_INDEX             brute (default) or ivf
+    FACE_INDEX_NLIST       number of IVF lists (default sqrt of the gallery size)
+    FACE_INDEX_NPROBE      number of IVF lists scanned per query (default 8)
+    FACE_INDEX_SAVE_DELAY  seconds between a change and writing the index file (default 5)
+"""
+
+import copy
+import os
+
+import numpy as np
+
+
+SAVE_DELAY = float(os.environ.get('FACE_INDEX_SAVE_DELAY', '5'))
+
+
+def index_path(db_path, kind):
+    """Index file stored next to the database, e.g. attendance.ivf.npz"""
+    return f"{os.path.splitext(db_path)[0]}.{kind}.npz"
+
+
+def _top_k(scores, ids, k):
+    """Top-k (ids, scores) per row of a (Q, N) score matrix, best first"""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    best = np.take_along_axis(part, order, axis=1)
+    return ids[best], np.take_along_axis(part_scores, order, axis=1)
+
+
+def _empty_result(queries, k):
+    return np.full((len(queries), k), -1, dtype=np.int64), np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+
+class BruteForceIndex:
+    """Exact inner-product search over a single matrix"""
+
+    kind = 'brute'
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix is not None and len(self.ids) else 0
+
+    def build(self, ids, matrix):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def copy(self):
+        """Copy sharing the arrays, which are replaced rather than modified in place"""
+        return copy.copy(self)
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if self.matrix is None or len(self.ids) == 0:
+            self.build(ids, vectors)
+            return
+        self.remove(ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.matrix = np.ascontiguousarray(np.vstack([self.matrix, vectors]))
+
+    def remove(self, ids):
+        keep = ~np.isin(self.ids, ids)
+        if not keep.all():
+            self.ids = self.ids[keep]
+            self.matrix = np.ascontiguousarray(self.matrix[keep])
+
+    def search(self, queries, k=1):
+        """Return (ids, scores), each shaped (len(queries), k); missing slots are -1/-inf"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if len(self.ids) == 0:
+            return _empty_result(queries, k)
+        found_ids, scores = _top_k(queries @ self.matrix.T, self.ids, k)
+        if found_ids.shape[1] < k:
+            pad_ids, pad_scores = _empty_result(queries, k - found_ids.shape[1])
+            found_ids = np.hstack([found_ids, pad_ids])
+            scores = np.hstack([scores, pad_scores])
+        return found_ids, scores
+
+    def save(self, path):
+        matrix = self.matrix if self.matrix is not None else np.empty((0, 0), dtype=np.float32)
+        np.savez(path, kind=self.kind, ids=self.ids, matrix=matrix)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        index = cls()
+        index.build(data['ids'], data['matrix'])
+        return index
+
+
+class IVFIndex:
+    """Approximate inverted-file index with a spherical k-means quantizer"""
+
+    kind = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=8, train_iterations=10, retrain_factor=4, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.retrain_factor = retrain_factor
+        self.seed = seed
+        self.trained_size = 0
+        self.centroids = None
+        self.list_ids = []
+        self.list_vectors = []
+        # Last user_changes seq the persisted index reflects; None if unknown
+        self.seq = None
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.list_ids)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def dim(self):
+        return self.centroids.shape[1] if self.trained else 0
+
+    @property
+    def ids(self):
+        if not self.list_ids:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(self.list_ids)
+
+    def copy(self):
+        """Copy sharing the list arrays, which are replaced rather than modified in place"""
+        index = copy.copy(self)
+        index.list_ids = list(self.list_ids)
+        index.list_vectors = list(self.list_vectors)
+        return index
+
+    def _train(self, matrix):
+        n = len(matrix)
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(self.seed)
+
+        # Train on a sample; assignments for the full matrix happen afterwards
+        sample = matrix[rng.choice(n, size=min(n, nlist * 256), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = n
+
+    def build(self, ids, matrix):
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.centroids = None
+        self.list_ids = []
+        self.list_vectors = []
+        if len(ids) == 0:
+            return
+        self._train(matrix)
+        assignment = np.argmax(matrix @ self.centroids.T, axis=1)
+        for c in range(len(self.centroids)):
+            members = assignment == c
+            self.list_ids.append(ids[members])
+            self.list_vectors.append(np.ascontiguousarray(matrix[members]))
+
+    def add(self, ids, vectors):
+        """Assign new vectors to their nearest existing list.
+
+        The quantizer is only retrained once the index has grown by
+        retrain_factor since it was last trained, so that a gallery started
+        from a handful of users still ends up with balanced lists.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if not self.trained:
+            self.build(ids, vectors)
+            return
+        self.remove(ids)
+        if len(self) + len(ids) > self.retrain_factor * self.trained_size:
+            keep_ids, keep_vectors = self.ids, np.vstack(self.list_vectors)
+            self.build(np.concatenate([keep_ids, ids]), np.vstack([keep_vectors, vectors]))
+            return
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        for c in np.unique(assignment):
+            members = assignment == c
+            self.list_ids[c] = np.concatenate([self.list_ids[c], ids[members]])
+            self.list_vectors[c] = np.ascontiguousarray(np.vstack([self.list_vectors[c], vectors[members]]))
+
+    def remove(self, ids):
+        for c, list_ids in enumerate(self.list_ids):
+            keep = ~np.isin(list_ids, ids)
+            if not keep.all():
+                self.list_ids[c] = list_ids[keep]
+                self.list_vectors[c] = self.list_vectors[c][keep]
+
+    def search(self, queries, k=1):
+        """Return (ids, scores), each shaped (len(queries), k); missing slots are -1/-inf"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        found_ids, found_scores = _empty_result(queries, k)
+        if not self.trained:
+            return found_ids, found_scores
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        for q, query in enumerate(queries):
+            lists = [c for c in probes[q] if len(self.list_ids[c])]
+            if not lists:
+                continue
+            ids = np.concatenate([self.list_ids[c] for c in lists])
+            scores = np.concatenate([self.list_vectors[c] @ query for c in lists])
+            best_ids, best_scores = _top_k(scores[None, :], ids, k)
+            found_ids[q, :best_ids.shape[1]] = best_ids[0]
+            found_scores[q, :best_scores.shape[1]] = best_scores[0]
+        return found_ids, found_scores
+
+    def save(self, path):
+        sizes = np.array([len(ids) for ids in self.list_ids], dtype=np.int64)
+        dim = self.centroids.shape[1] if self.trained else 0
+        np.savez(
+            path,
+            kind=self.kind,
+            nlist=self.nlist or 0,
+            nprobe=self.nprobe,
+            trained_size=self.trained_size,
+            seq=-1 if self.seq is None else self.seq,
+            centroids=self.centroids if self.trained else np.empty((0, 0), dtype=np.float32),
+            sizes=sizes,
+            ids=self.ids,
+            vectors=np.vstack(self.list_vectors) if self.list_vectors else np.empty((0, dim), dtype=np.float32),
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        index = cls(nlist=int(data['nlist']) or None, nprobe=int(data['nprobe']))
+        # Files saved before seq was recorded have an unknown position
+        if 'seq' in data.files and int(data['seq']) >= 0:
+            index.seq = int(data['seq'])
+        if data['centroids'].size:
+            index.centroids = data['centroids']
+            index.trained_size = int(data['trained_size'])
+            offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+            ids, vectors = data['ids'], data['vectors']
+            index.list_ids = [ids[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+            index.list_vectors = [np.ascontiguousarray(vectors[a:b]) for a, b in zip(offsets[:-1], offsets[1:])]
+        return index
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (BruteForceIndex, IVFIndex)}
+
+
+def create_index(kind=None):
+    """New empty index of the configured kind"""
+    kind = kind or os.environ.get('FACE_INDEX', 'brute')
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown search index: {kind}")
+    if kind == 'ivf':
+        nlist = os.environ.get('FACE_INDEX_NLIST')
+        return IVFIndex(nlist=int(nlist) if nlist else None,
+                        nprobe=int(os.environ.get('FACE_INDEX_NPROBE', 8)))
+    return INDEX_TYPES[kind]()
+
+
+def open_index(db_path, kind=None):
+    """Load the persisted index next to db_path, or start a new one"""
+    index = create_index(kind)
+    path = index_path(db_path, index.kind)
+    if os.path.exists(path):
+        try:
+            loaded = type(index).load(path)
+        except (OSError, ValueError, KeyError):
+            return index
+        if isinstance(index, IVFIndex):
+            loaded.nprobe = index.nprobe
+        return loaded
+    return index
@@ -0,0 +1,178 @@
+"""
+Incremental replication of users and attendance between site databases.
+
+Each site runs on its own attendance.db (with FACE_SITE set) and a central
+hub database collects everything. pull() copies what changed in one
+database since the last pull into another:
+
+    users       the users logged in source's user_changes since the last
+                pull, with their templates, matched across databases by
+                users.uid; rows whose name and templates already match are
+                left alone, so copies do not bounce back and forth. The
+                embedding is rebuilt from the templates where the source
+                keeps only a projected one (see projection.py) and stored
+                the way the target's own projection model needs
+    attendance  source rows with a higher id than the last pull, matched by
+                attendance.uid so a row is never inserted twice
+
+How far a database has pulled from each peer is kept in its sync_peers
+table, keyed by the peer's sync_identity, so a pull only reads new rows.
+sync() pulls every site into the hub and the hub back into every site;
+after it, all of them hold every user and attendance mark.
+
+Deleted users are not replicated; delete them at every site. When two sites
+change the same user between syncs, the last one pulled wins. A new site
+must start from an empty database, not a copy of another site's, since the
+copy would share its sync identity.
+
+Usage:
+    python site_sync.py pull SOURCE_DB TARGET_DB
+    python site_sync.py sync HUB_DB SITE_DB [SITE_DB ...]
+"""
+
+import argparse
+from datetime import datetime
+
+from cooldown import TIMESTAMP_FORMAT
+from db import get_pool
+from embedding_codec import decode_embedding
+from projection import embedding_columns, load_projection
+from templates import centroid
+
+
+def sync_identity(db_path):
+    """Random id of a database, the key other databases track it by"""
+    return get_pool(db_path).query("SELECT uid FROM sync_identity")[0][0]
+
+
+def _read_changes(db_path, user_change, attendance_id):
+    # One read transaction, so every attendance row read refers to a user
+    # that is either read too or was copied by an earlier pull
+    with get_pool(db_path).connection() as conn:
+        conn.execute("BEGIN")
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM user_changes").fetchone()[0]
+        users = conn.execute("SELECT id, uid, name, embedding, site FROM users WHERE id IN "
+                             "(SELECT user_id FROM user_changes WHERE seq > ? AND seq <= ?)",
+                             (user_change, seq)).fetchall()
+        templates = {}
+        for user_id, embedding, source, created_at in conn.execute(
+                "SELECT user_id, embedding, source, created_at FROM user_embeddings WHERE user_id IN "
+                "(SELECT user_id FROM user_changes WHERE seq > ? AND seq <= ?) ORDER BY id", (user_change, seq)):
+            templates.setdefault(user_id, []).append((embedding, source, created_at))
+        attendance = conn.execute("SELECT a.id, a.uid, u.uid, a.timestamp, a.site FROM attendance a "
+                                  "JOIN users u ON u.id = a.user_id WHERE a.id > ? ORDER BY a.id",
+                                  (attendance_id,)).fetchall()
+        conn.execute("COMMIT")
+    return seq, users, templates, attendance
+
+
+def _raw_embedding(value, templates):
+    """A user's raw embedding, else the centroid of their newest templates'
+    dimension; None if neither decodes"""
+    try:
+        return decode_embedding(value)
+    except ValueError:
+        pass
+    vectors = []
+    for embedding, _, _ in templates:
+        try:
+            vectors.append(decode_embedding(embedding))
+        except ValueError:
+            continue
+    if not vectors:
+        return None
+    return centroid([v for v in vectors if len(v) == len(vectors[-1])])
+
+
+def pull(source, target):
+    """Copy users and attendance changed in source since the last pull into
+    target; returns (users, attendance rows) written to target."""
+    peer = sync_identity(source)
+    if peer == sync_identity(target):
+        raise ValueError(f"{source} and {target} are the same database or copies of one")
+    position = get_pool(target).query("SELECT user_change, attendance_id FROM sync_peers WHERE peer = ?", (peer,))
+    user_change, attendance_id = position[0] if position else (0, 0)
+    seq, users, templates, attendance = _read_changes(source, user_change, attendance_id)
+    projection = load_projection(target)
+
+    copied_users = copied_attendance = 0
+    with get_pool(target).transaction() as conn:
+        for source_id, uid, name, embedding, site in users:
+            user_templates = templates.get(source_id, [])
+            existing = conn.execute("SELECT id, name, embedding FROM users WHERE uid = ?", (uid,)).fetchone()
+            if existing is not None and existing[1] == name:
+                if user_templates:
+                    same = conn.execute("SELECT embedding, source, created_at FROM user_embeddings WHERE user_id = ? "
+                                        "ORDER BY id", (existing[0],)).fetchall() == user_templates
+                else:
+                    same = existing[2] == embedding
+                if same:
+                    continue
+            raw = _raw_embedding(embedding, user_templates)
+            if raw is None:
+                continue
+            columns = (name, *embedding_columns(projection, raw), site)
+            if existing is None:
+                user_id = conn.execute("INSERT INTO users (name, image_path, embedding, projected_embedding, "
+                                       "projection_version, site, uid) VALUES (?, '', ?, ?, ?, ?, ?)",
+                                       (*columns, uid)).lastrowid
+            else:
+                user_id = existing[0]
+                conn.execute("UPDATE users SET name = ?, embedding = ?, projected_embedding = ?, "
+                             "projection_version = ?, site = ? WHERE id = ?", (*columns, user_id))
+                conn.execute("DELETE FROM user_embeddings WHERE user_id = ?", (user_id,))
+            conn.executemany("INSERT INTO user_embeddings (user_id, embedding, source, created_at) VALUES (?, ?, ?, ?)",
+                             [(user_id, *template) for template in user_templates])
+            copied_users += 1
+
+        user_ids = {}
+        for _, uid, user_uid, timestamp, site in attendance:
+            if user_uid not in user_ids:
+                row = conn.execute("SELECT id FROM users WHERE uid = ?", (user_uid,)).fetchone()
+                user_ids[user_uid] = row and row[0]
+            # Users deleted here keep their attendance only where they still exist
+            if user_ids[user_uid] is not None:
+                copied_attendance += conn.execute("INSERT OR IGNORE INTO attendance (user_id, timestamp, site, uid) "
+                                                  "VALUES (?, ?, ?, ?)",
+                                                  (user_ids[user_uid], timestamp, site, uid)).rowcount
+
+        conn.execute("INSERT OR REPLACE INTO sync_peers (peer, user_change, attendance_id, synced_at) "
+                     "VALUES (?, ?, ?, ?)",
+                     (peer, seq, attendance[-1][0] if attendance else attendance_id,
+                      datetime.now().strftime(TIMESTAMP_FORMAT)))
+    return copied_users, copied_attendance
+
+
+def sync(hub, *sites):
+    """Pull every site into the hub, then the hub into every site; returns
+    {(source, target): (users, attendance rows)} for each pull."""
+    results = {}
+    for site in sites:
+        results[site, hub] = pull(site, hub)
+    for site in sites:
+        results[hub, site] = pull(hub, site)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replicate users and attendance between site databases")
+    commands = parser.add_subparsers(dest='command', required=True)
+    pull_parser = commands.add_parser('pull', help="Copy new changes from one database into another")
+    pull_parser.add_argument('source', help="Database to copy from")
+    pull_parser.add_argument('target', help="Database to copy into")
+    sync_parser = commands.add_parser('sync', help="Exchange changes between a hub and its sites")
+    sync_parser.add_argument('hub', help="Central database")
+    sync_parser.add_argument('sites', nargs='+', help="Site databases")
+    args = parser.parse_args()
+
+    if args.command == 'pull':
+        results = {(args.source, args.target): pull(args.source, args.target)}
+    else:
+        results = sync(args.hub, *args.sites)
+    for (source, target), (users, attendance) in results.items():
+        print(f"{source} -> {target}: {users} users, {attendance} attendance records")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,278 @@
+"""
+Continuous recognition from a webcam, RTSP stream or video file.
+
+Faces are detected on every frame (or every detect_every frames) and
+followed with a lightweight IoU tracker. The embed-and-match step only runs
+for tracks that are new, not yet confirmed, due for a periodic re-check, or
+whose last similarity was marginal; unknown faces are retried every few
+frames. An identity is debounced: it must win confirm_hits consecutive
+matches before attendance is written, once per track and identity.
+
+Stage timings (detect, track, embed, match, record) go to metrics.METRICS
+like the rest of the recognition path; with FACE_METRICS_PORT set they are
+served at /metrics as well as printed.
+
+Usage:
+    python stream.py --source 0                 # webcam index
+    python stream.py --source rtsp://host/feed  # network stream
+    python stream.py --source lecture.mp4 --display
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from batch_attendance import record_attendance
+from cooldown import AttendanceCooldown
+from db import DB_PATH
+from descriptors import get_descriptor
+from detector import get_detector
+from gallery import Gallery, MATCH_THRESHOLD
+from metrics import METRICS, METRICS_PORT, serve
+
+
+@dataclass
+class Track:
+    track_id: int
+    box: tuple
+    user_id: int = None
+    name: str = None
+    similarity: float = 0.0
+    votes: int = 0
+    confirmed: bool = False
+    recorded: bool = False
+    misses: int = 0
+    last_matched: int = -1
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise intersection-over-union of two sets of x, y, w, h boxes"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax1, ay1, ax2, ay2 = a[:, 0:1], a[:, 1:2], a[:, 0:1] + a[:, 2:3], a[:, 1:2] + a[:, 3:4]
+    bx1, by1, bx2, by2 = b[:, 0], b[:, 1], b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class IoUTracker:
+    """Greedy IoU association of detections to existing tracks"""
+
+    def __init__(self, iou_threshold=0.3, max_misses=10):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, boxes):
+        """Associate this frame's boxes with tracks; returns the live tracks"""
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        matched_tracks = set()
+        matched_boxes = set()
+
+        if self.tracks and boxes:
+            overlaps = iou_matrix([t.box for t in self.tracks], boxes)
+            for flat in np.argsort(-overlaps, axis=None):
+                t, b = np.unravel_index(flat, overlaps.shape)
+                if overlaps[t, b] < self.iou_threshold:
+                    break
+                if t in matched_tracks or b in matched_boxes:
+                    continue
+                matched_tracks.add(t)
+                matched_boxes.add(b)
+                self.tracks[t].box = boxes[b]
+                self.tracks[t].misses = 0
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                self.tracks.append(Track(self._next_id, box))
+                self._next_id += 1
+        return self.tracks
+
+
+class StreamRecognizer:
+    """Per-frame detect -> track -> (selective) embed/match -> record pipeline"""
+
+    def __init__(self, gallery, detector=None, db_path=DB_PATH, threshold=MATCH_THRESHOLD, confirm_hits=3,
+                 rematch_every=30, unknown_retry=5, margin=0.05, detect_every=1, tracker=None, cooldown=None, descriptor=None):
+        self.gallery = gallery
+        self.detector = detector or get_detector()
+        self.descriptor = descriptor or get_descriptor()
+        self.db_path = db_path
+        self.threshold = threshold
+        self.confirm_hits = confirm_hits
+        self.rematch_every = rematch_every
+        self.unknown_retry = unknown_retry
+        self.margin = margin
+        self.detect_every = detect_every
+        self.tracker = tracker or IoUTracker()
+        self.cooldown = cooldown
+        self.frames = 0
+        self.matches_run = 0
+        self.started = None
+
+    def _needs_match(self, track, frame_number):
+        if track.misses:
+            return False
+        since = frame_number - track.last_matched
+        if track.last_matched >= 0 and track.user_id is None:
+            # Unknown faces are retried, but not on every frame
+            return since >= self.unknown_retry
+        if not track.confirmed:
+            return True
+        if track.similarity < self.threshold + self.margin:
+            return True
+        return since >= self.rematch_every
+
+    def process(self, frame):
+        """Run one frame through the pipeline; returns the live tracks"""
+        if self.started is None:
+            self.started = time.perf_counter()
+        frame_number = self.frames
+        self.frames += 1
+
+        with METRICS.stage('detect'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if frame_number % self.detect_every:
+                boxes = [t.box for t in self.tracker.tracks if not t.misses]
+            else:
+                boxes = self.detector.detect(gray)
+
+        with METRICS.stage('track'):
+            tracks = self.tracker.update(boxes)
+
+        pending = [t for t in tracks if self._needs_match(t, frame_number)]
+        if pending:
+            with METRICS.stage('embed'):
+                embeddings = self.descriptor.describe_many(gray, [t.box for t in pending])
+            # Timed as 'match' by the gallery
+            results = self.gallery.match_many(embeddings, self.threshold)
+            self.matches_run += len(pending)
+
+            for track, result in zip(pending, results):
+                track.last_matched = frame_number
+                if result is None:
+                    track.user_id, track.name, track.similarity = None, None, 0.0
+                    track.votes = 0
+                    track.confirmed = False
+                    continue
+                user_id, name, similarity = result
+                if user_id != track.user_id:
+                    track.votes = 0
+                    track.recorded = False
+                track.votes += 1
+                track.user_id, track.name, track.similarity = user_id, name, similarity
+                track.confirmed = track.votes >= self.confirm_hits
+
+        confirmed = [t for t in tracks if t.confirmed and not t.recorded]
+        if confirmed:
+            # Timed as 'record' by record_attendance
+            recorded = record_attendance(self.db_path, sorted({t.user_id for t in confirmed}), cooldown=self.cooldown)
+            for track in confirmed:
+                track.recorded = True
+                if track.user_id in recorded:
+                    self.on_recorded(track)
+
+        return tracks
+
+    def on_recorded(self, track):
+        """Hook called when a track's identity is written to attendance (not
+        when the cooldown suppressed the mark)"""
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'frames': self.frames,
+            'fps': self.frames / elapsed if elapsed else 0.0,
+            'matches_run': self.matches_run,
+            'stages': METRICS.snapshot()['stages'],
+        }
+
+
+def open_source(source):
+    """VideoCapture for a webcam index ("0"), file path or stream URL"""
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video source: {source}")
+    return capture
+
+
+def format_stats(stats):
+    stages = ", ".join(f"{name} {stage['mean_ms']:.1f}ms" for name, stage in stats['stages'].items())
+    return f"{stats['frames']} frames, {stats['fps']:.1f} fps, {stats['matches_run']} matches run | {stages}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuous face recognition from a video source")
+    parser.add_argument('--source', default='0', help="Webcam index, video file or stream URL")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database")
+    parser.add_argument('--threshold', type=float, default=MATCH_THRESHOLD, help="Cosine similarity threshold")
+    parser.add_argument('--confirm-hits', type=int, default=3, help="Consecutive matches before recording")
+    parser.add_argument('--rematch-every', type=int, default=30, help="Frames between re-checks of a confirmed track")
+    parser.add_argument('--detect-every', type=int, default=1, help="Run detection every Nth frame")
+    parser.add_argument('--max-frames', type=int, default=None, help="Stop after this many frames")
+    parser.add_argument('--stats-every', type=int, default=100, help="Print timings every N frames")
+    parser.add_argument('--cooldown', default=None,
+                        help="Skip users marked within this window, e.g. 5m, day, off (default: FACE_ATTENDANCE_COOLDOWN)")
+    parser.add_argument('--display', action='store_true', help="Show the annotated video")
+    args = parser.parse_args()
+
+    gallery = Gallery.from_db(args.db)
+    if len(gallery) == 0:
+        print("❌ No registered users found")
+        return 1
+
+    recognizer = StreamRecognizer(gallery, db_path=args.db, threshold=args.threshold, confirm_hits=args.confirm_hits,
+                                  rematch_every=args.rematch_every, detect_every=args.detect_every,
+                                  cooldown=AttendanceCooldown(args.db, args.cooldown))
+    if METRICS_PORT:
+        serve(METRICS_PORT)
+    recognizer.on_recorded = lambda track: print(f"✓ Attendance marked for {track.name} (track {track.track_id})")
+
+    capture = open_source(args.source)
+    try:
+        while args.max_frames is None or recognizer.frames < args.max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            tracks = recognizer.process(frame)
+
+            if args.display:
+                for track in tracks:
+                    if track.misses:
+                        continue
+                    x, y, w, h = track.box
+                    color = (0, 200, 0) if track.confirmed else (0, 200, 255)
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+                    cv2.putText(frame, track.name or f"#{track.track_id}", (x, y - 6),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                cv2.imshow("Attendance", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+            if args.stats_every and recognizer.frames % args.stats_every == 0:
+                print(format_stats(recognizer.stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+        if args.display:
+            cv2.destroyAllWindows()
+
+    print(format_stats(recognizer.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,129 @@
+"""
+Multi-template enrollment.
+
+A user can be enrolled from several photos. Each photo's embedding is a
+template in the user_embeddings table (source 'enroll'); users.embedding
+holds their centroid, the normalized mean of the templates (only its
+projection while a projection model is active, see projection.py). Matching first
+ranks users by centroid through the gallery's search index, then re-scores
+the best candidates against their individual templates (see
+Gallery.match_many).
+
+Optionally, confident attendance captures become templates too (source
+'capture'), so the gallery follows changes in lighting, glasses or hair.
+Only captures are evicted, oldest first, once a user has more than the
+configured number; enrollment templates are kept.
+
+Configuration:
+    FACE_CAPTURE_TEMPLATES        captured templates kept per user (default 0, off)
+    FACE_CAPTURE_MIN_SIMILARITY   similarity a recognition needs to be captured
+                                  (default: the match threshold plus 0.05)
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from cooldown import TIMESTAMP_FORMAT
+from db import get_pool
+from descriptors import match_threshold
+from embedding_codec import decode_embedding, encode_embedding
+from projection import embedding_columns
+
+# SQLite's default limit on ? parameters is 999
+CHUNK = 500
+MAX_CAPTURES = int(os.environ.get('FACE_CAPTURE_TEMPLATES', '0'))
+CAPTURE_MIN_SIMILARITY = float(os.environ.get('FACE_CAPTURE_MIN_SIMILARITY') or min(match_threshold() + 0.05, 0.99))
+
+
+def centroid(embeddings):
+    """Normalized mean of the L2-normalized rows of a (T, D) matrix"""
+    matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    mean = (matrix / norms).mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm > 0 else mean
+
+
+def insert_templates(conn, user_id, embeddings, source='enroll', created_at=None):
+    """Add template rows for one user inside the caller's transaction"""
+    created_at = created_at or datetime.now().strftime(TIMESTAMP_FORMAT)
+    conn.executemany("INSERT INTO user_embeddings (user_id, embedding, source, created_at) VALUES (?, ?, ?, ?)",
+                     [(user_id, encode_embedding(e), source, created_at) for e in np.atleast_2d(embeddings)])
+
+
+def load_templates(db_path):
+    """{user_id: [embedding, ...]} for every user with at least two templates"""
+    templates = defaultdict(list)
+    rows = get_pool(db_path).query(
+        "SELECT user_id, embedding FROM user_embeddings WHERE user_id IN "
+        "(SELECT user_id FROM user_embeddings GROUP BY user_id HAVING COUNT(*) > 1) ORDER BY user_id, id")
+    for user_id, value in rows:
+        try:
+            templates[user_id].append(decode_embedding(value))
+        except ValueError:
+            continue
+    return dict(templates)
+
+
+def template_centroids(db_path, user_ids, dim=None):
+    """{user_id: centroid} of the users' raw templates of dimension dim
+    (default: that of each user's newest template)"""
+    user_ids = [int(user_id) for user_id in user_ids]
+    grouped = defaultdict(list)
+    for start in range(0, len(user_ids), CHUNK):
+        chunk = user_ids[start:start + CHUNK]
+        for user_id, value in get_pool(db_path).query(
+                f"SELECT user_id, embedding FROM user_embeddings WHERE user_id IN ({','.join('?' * len(chunk))}) "
+                "ORDER BY id", chunk):
+            try:
+                vector = decode_embedding(value)
+            except ValueError:
+                continue
+            if dim is None or len(vector) == dim:
+                grouped[user_id].append(vector)
+    return {user_id: centroid([v for v in vectors if len(v) == len(vectors[-1])])
+            for user_id, vectors in grouped.items()}
+
+
+def add_templates(db_path, user_id, embeddings, source='enroll', projection=None, max_captures=MAX_CAPTURES):
+    """Store new templates for a user and recompute their centroid.
+
+    With source='capture', the user's oldest captures beyond max_captures
+    are deleted. Templates of another dimension than the new ones (from an
+    earlier descriptor) are ignored. Returns (centroid, templates), both raw.
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    with get_pool(db_path).transaction() as conn:
+        insert_templates(conn, user_id, embeddings, source)
+        if source == 'capture':
+            conn.execute("DELETE FROM user_embeddings WHERE id IN (SELECT id FROM user_embeddings "
+                         "WHERE user_id = ? AND source = 'capture' ORDER BY created_at DESC, id DESC LIMIT -1 OFFSET ?)",
+                         (user_id, max_captures))
+
+        templates = []
+        for (value,) in conn.execute("SELECT embedding FROM user_embeddings WHERE user_id = ? ORDER BY id", (user_id,)):
+            try:
+                vector = decode_embedding(value)
+            except ValueError:
+                continue
+            if len(vector) == embeddings.shape[1]:
+                templates.append(vector)
+        templates = np.stack(templates)
+        mean = centroid(templates)
+        conn.execute("UPDATE users SET embedding = ?, projected_embedding = ?, projection_version = ? WHERE id = ?",
+                     (*embedding_columns(projection, mean), user_id))
+    return mean, templates
+
+
+def capture_template(db_path, gallery, user_id, embedding, similarity,
+                     min_similarity=CAPTURE_MIN_SIMILARITY, max_captures=MAX_CAPTURES):
+    """Keep a confident recognition as a new template; returns True if it was added"""
+    if max_captures <= 0 or similarity < min_similarity:
+        return False
+    mean, templates = add_templates(db_path, user_id, embedding, 'capture', gallery.projection, max_captures)
+    gallery.update_templates(user_id, mean, templates)
+    return True
@@ -0,0 +1,104 @@
+"""
+Detection and embedding cache for uploaded photos.
+
+Streamlit reruns the page on every interaction and kiosks re-send the same
+frame, so identical upload bytes keep coming back. UploadCache remembers the
+face box and embedding computed for each upload, keyed by a 128-bit hash of
+the raw bytes (xxh3 when the xxhash package is installed, else BLAKE2b), so
+a repeat costs one hash and a dict lookup instead of decoding, detection
+and embedding. Uploads without a face are cached too.
+
+Entries are evicted least-recently-used beyond max_entries and expire ttl
+seconds after they were computed. Hits, misses, evictions and expirations
+are counted for /health and tuning.
+
+Configuration: FACE_UPLOAD_CACHE_SIZE (default 256 entries, 0 disables),
+FACE_UPLOAD_CACHE_TTL (default 300 seconds).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from xxhash import xxh3_128_digest as _digest
+except ImportError:
+    def _digest(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+CACHE_SIZE = int(os.environ.get('FACE_UPLOAD_CACHE_SIZE', '256'))
+CACHE_TTL = float(os.environ.get('FACE_UPLOAD_CACHE_TTL', '300'))
+
+
+class UploadCache:
+    """Bounded LRU of upload hash -> (face box, embedding) with a TTL"""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(data, context=None):
+        """Hash of the raw upload bytes, plus whatever else the result depends on"""
+        digest = _digest(memoryview(data).cast('B'))
+        return digest if context is None else (digest, context)
+
+    def get(self, key):
+        """Cached (box, embedding) or None; box and embedding are None for an upload without a face"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if self._clock() >= expires:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, box, embedding):
+        if self.max_entries <= 0:
+            return
+        if embedding is not None:
+            # Shared between callers, so make sure nobody normalizes it in place
+            embedding.flags.writeable = False
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, (box, embedding))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
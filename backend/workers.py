@@ -0,0 +1,312 @@
+"""
+Multi-process recognition workers sharing one copy of the gallery.
+
+Detection and embedding hold the GIL for part of their run and a single
+OpenCV call uses about one core, so a threaded server tops out near one
+core. RecognitionPool runs decode -> detect -> embed -> search in N worker
+processes instead. The gallery's float32 matrix (already normalized and, if
+a projection model is active, projected) lives in a
+multiprocessing.shared_memory segment that every worker maps read-only, so
+memory does not grow with the number of workers.
+
+The parent owns the Gallery and publishes it to shared memory whenever its
+version changed before handing out the next task: new rows are appended in
+place, anything else rewrites the matrix, and a full segment is replaced
+by a larger one. A small control segment holds the segment name, row count,
+dimension and a generation counter used as a seqlock: it is odd while the
+parent writes, and a worker retries a search if the counter moved while it
+read. Registrations are therefore picked up by every worker on its next
+task, without restarting the pool.
+
+Workers apply the quality gate (see quality.py) and return the top
+candidates by centroid; the parent's Gallery picks the match (re-scoring
+template users) and names it, so templates, names and the threshold stay in
+one place. At a multi-site deployment the parent first matches the query
+against the site's shard (see gallery.py), which is small, and only falls
+back to the workers' candidates from the whole gallery when it has no
+match there. Worker stage timings are added to the parent's metrics.
+
+Usage:
+    pool = RecognitionPool(gallery, processes=4)
+    box, embedding, match = pool.recognize(upload_bytes, cache=upload_cache)
+
+Configuration: FACE_WORKER_PROCESSES, worker processes used by the app and
+the API (default 0, recognition runs in the request thread).
+"""
+
+import atexit
+import dataclasses
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from descriptors import get_descriptor
+from detector import DetectorConfig, FaceDetector, get_detector
+from gallery import MATCH_THRESHOLD
+from ingest import decode_image
+from metrics import METRICS
+from quality import DEFAULT_CONFIG as QUALITY_CONFIG, FaceRejected, select_face
+from recognition import upload_context
+from search_index import BruteForceIndex
+
+WORKER_PROCESSES = int(os.environ.get('FACE_WORKER_PROCESSES', '0'))
+
+# generation, rows, dim, capacity in rows, then the data segment's name
+CONTROL = struct.Struct('<qqqq64s')
+MIN_CAPACITY = 1024
+
+
+class SharedMatrix:
+    """Gallery ids and matrix in shared memory, published by one process and read by many"""
+
+    def __init__(self, control_name=None):
+        self.owner = control_name is None
+        if self.owner:
+            self.control = shared_memory.SharedMemory(create=True, size=CONTROL.size)
+            CONTROL.pack_into(self.control.buf, 0, 0, 0, 0, 0, b'')
+        else:
+            self.control = shared_memory.SharedMemory(name=control_name)
+        self.data = None
+        self.capacity = 0
+        self.version = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.control.name
+
+    def _header(self):
+        generation, rows, dim, capacity, name = CONTROL.unpack_from(self.control.buf, 0)
+        return generation, rows, dim, capacity, name.rstrip(b'\0').decode()
+
+    @property
+    def generation(self):
+        return self._header()[0]
+
+    def _views(self, rows, dim):
+        ids = np.ndarray((self.capacity,), dtype=np.int64, buffer=self.data.buf)
+        matrix = np.ndarray((self.capacity, dim), dtype=np.float32, buffer=self.data.buf, offset=self.capacity * 8)
+        return ids[:rows], matrix[:rows]
+
+    def publish(self, gallery):
+        """Copy the gallery into shared memory if it changed since the last publish"""
+        with self._lock:
+            version, ids, matrix = gallery.snapshot()
+            if version == self.version:
+                return False
+            generation, rows, dim, capacity, name = self._header()
+            new_rows, new_dim = len(ids), matrix.shape[1] if len(ids) else 0
+
+            # Seqlock: readers retry while the generation is odd or has moved
+            CONTROL.pack_into(self.control.buf, 0, generation + 1, rows, dim, capacity, name.encode())
+            if self.data is None or new_rows > self.capacity or new_dim != dim:
+                self._replace(max(MIN_CAPACITY, 2 * new_rows), max(new_dim, 1))
+                name, start = self.data.name, 0
+            else:
+                shared_ids, _ = self._views(rows, dim)
+                # Registrations append; anything else (replace, remove) rewrites every row
+                start = rows if rows <= new_rows and np.array_equal(shared_ids, ids[:rows]) else 0
+            shared_ids, shared_matrix = self._views(new_rows, max(new_dim, 1))
+            shared_ids[start:] = ids[start:]
+            if new_dim:
+                shared_matrix[start:] = matrix[start:]
+            CONTROL.pack_into(self.control.buf, 0, generation + 2, new_rows, new_dim, self.capacity, name.encode())
+            self.version = version
+            return True
+
+    def _replace(self, capacity, dim):
+        old = self.data
+        self.data = shared_memory.SharedMemory(create=True, size=capacity * (8 + 4 * dim))
+        self.capacity = capacity
+        if old is not None:
+            # Workers keep their own mapping until they re-attach
+            old.close()
+            old.unlink()
+
+    def search(self, queries, k):
+        """Top-k (ids, scores) per query against the published matrix (worker side)"""
+        index = BruteForceIndex()
+        while True:
+            generation, rows, dim, capacity, name = self._header()
+            if generation % 2:
+                time.sleep(0)
+                continue
+            try:
+                if self.data is None or self.data.name.lstrip('/') != name.lstrip('/'):
+                    self._attach(name, capacity)
+            except FileNotFoundError:
+                # Replaced again before we got to it; read the header anew
+                continue
+            if rows and queries.shape[1] == dim:
+                index.build(*self._views(rows, dim))
+                result = index.search(queries, k)
+            else:
+                result = (np.full((len(queries), k), -1, dtype=np.int64),
+                          np.full((len(queries), k), -np.inf, dtype=np.float32))
+            if self.generation == generation:
+                return result
+
+    def _attach(self, name, capacity):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if not name:
+            return
+        self.data = shared_memory.SharedMemory(name=name)
+        self.capacity = capacity
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            if self.owner:
+                self.data.unlink()
+            self.data = None
+        if self.control is not None:
+            self.control.close()
+            if self.owner:
+                self.control.unlink()
+            self.control = None
+
+
+_worker = {}
+
+
+def _init_worker(control_name, projection, detector):
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    _worker['shared'] = SharedMatrix(control_name)
+    _worker['projection'] = projection
+    _worker['detector'] = get_detector(detector) if isinstance(detector, DetectorConfig) else detector
+
+
+def _recognize(data, k):
+    """Worker task: decode, detect, embed and search one upload"""
+    timings = {}
+    start = time.perf_counter()
+    image = decode_image(data)
+    timings['decode'] = time.perf_counter() - start
+    if image is None:
+        return {'decoded': False, 'timings': timings}
+
+    start = time.perf_counter()
+    faces = _worker['detector'].detect(image.gray)
+    timings['detect'] = time.perf_counter() - start
+    if len(faces) == 0:
+        return {'decoded': True, 'box': None, 'embedding': None, 'timings': timings}
+
+    start = time.perf_counter()
+    try:
+        box, _ = select_face(image.gray, faces, QUALITY_CONFIG)
+        rejected = None
+    except FaceRejected as e:
+        rejected = e.quality
+    if QUALITY_CONFIG.enabled:
+        timings['quality'] = time.perf_counter() - start
+    if rejected is not None:
+        return {'decoded': True, 'rejected': rejected, 'timings': timings}
+
+    start = time.perf_counter()
+    embedding = get_descriptor().describe(image.gray, box)
+    timings['embed'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query = embedding if _worker['projection'] is None else _worker['projection'].transform(embedding)
+    norm = np.linalg.norm(query)
+    query = (query / norm if norm > 0 else query).reshape(1, -1).astype(np.float32)
+    ids, scores = _worker['shared'].search(query, k)
+    timings['match'] = time.perf_counter() - start
+    return {'decoded': True, 'box': box, 'embedding': embedding, 'query': query,
+            'ids': ids, 'scores': scores, 'timings': timings}
+
+
+class RecognitionPool:
+    """Process pool doing detect/embed/search against a shared-memory copy of gallery.
+
+    A cascade can't be pickled, so the workers rebuild a FaceDetector
+    (default: the one configured from the environment) from its
+    DetectorConfig; other detectors are passed as is and must pickle.
+    """
+
+    def __init__(self, gallery, processes=None, detector=None, threshold=MATCH_THRESHOLD):
+        self.gallery = gallery
+        self.threshold = threshold
+        self.shared = SharedMatrix()
+        self.shared.publish(gallery)
+        # Spawned workers import this module through the parent's sys.path, which may hold it relative to a cwd
+        here = os.path.dirname(os.path.abspath(__file__))
+        if here not in sys.path:
+            sys.path.append(here)
+        detector = detector or get_detector()
+        self.context = upload_context(detector)
+        if isinstance(detector, FaceDetector):
+            # With the cascade path resolved as the parent did, whatever the workers' defaults
+            detector = dataclasses.replace(detector.config, cascade_path=os.path.abspath(detector.cascade_path))
+        # Spawned, not forked: the parent may be a threaded server holding locks
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(self.shared.name, gallery.projection, detector))
+        atexit.register(self.close)
+
+    def submit(self, data):
+        """Future of the worker result for one upload; publishes pending gallery changes first"""
+        self.shared.publish(self.gallery)
+        return self.executor.submit(_recognize, bytes(data), self.gallery.search_k)
+
+    def result(self, future, threshold=None):
+        """(box, embedding, match) from a submitted upload; raises ValueError if
+        it didn't decode and quality.FaceRejected if its faces failed the gate"""
+        result = future.result()
+        for stage, seconds in result['timings'].items():
+            METRICS.observe(stage, seconds)
+        if not result['decoded']:
+            raise ValueError("Could not decode image")
+        if 'rejected' in result:
+            METRICS.count('faces_detected')
+            METRICS.count('quality_rejects')
+            METRICS.count(f"quality_{result['rejected'].reason}")
+            raise FaceRejected(result['rejected'])
+        if result['embedding'] is None:
+            METRICS.count('no_face')
+            return result['box'], None, None
+        METRICS.count('faces_detected')
+
+        match = self.gallery.resolve_local_first(result['query'], result['ids'], result['scores'],
+                                                 self.threshold if threshold is None else threshold)[0]
+        METRICS.count('matches' if match else 'rejects')
+        return result['box'], result['embedding'], match
+
+    def recognize(self, data, threshold=None, cache=None):
+        """(box, embedding, match) for raw upload bytes; box and embedding are
+        None without a face. The box is in the reduced decode's coordinates.
+
+        With an upload_cache.UploadCache, bytes seen before are matched from
+        their cached embedding without a trip to the workers.
+        """
+        if cache is None:
+            return self.result(self.submit(data), threshold)
+        key = cache.key(data, self.context)
+        cached = cache.get(key)
+        METRICS.count('upload_cache_misses' if cached is None else 'upload_cache_hits')
+        if cached is not None:
+            box, embedding = cached
+            if embedding is None:
+                return box, None, None
+            return box, embedding, self.gallery.match(embedding, self.threshold if threshold is None else threshold)
+        box, embedding, match = self.result(self.submit(data), threshold)
+        cache.put(key, box, embedding)
+        return box, embedding, match
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            self.shared.close()
+        atexit.unregister(self.close)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark for micro-batched gallery matching under concurrent load
+
+Runs the same stream of match requests from many client threads twice:
+once with every thread calling Gallery.match directly, once through
+MatchBatcher. Reports throughput, latency percentiles and batch fill.
+
+Usage:
+    python benchmarks/bench_batching.py [--users 10000] [--dim 10000] [--clients 16] [--requests 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from gallery import Gallery
+from scheduler import MatchBatcher
+
+def run(match, queries, clients):
+    latencies = np.empty(len(queries))
+
+    def one(i):
+        start = time.perf_counter()
+        match(queries[i])
+        latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(len(queries))))
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, np.percentile(latencies * 1000, [50, 99])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched matching")
+    parser.add_argument('--users', type=int, default=10000, help="Gallery size")
+    parser.add_argument('--dim', type=int, default=10000, help="Embedding dimension")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent client threads")
+    parser.add_argument('--requests', type=int, default=2000, help="Total match requests")
+    parser.add_argument('--max-batch', type=int, default=32, help="Largest batch")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="Longest wait for a batch to fill")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((args.users, args.dim), dtype=np.float32)
+    gallery = Gallery(np.arange(1, args.users + 1), [f"User {i}" for i in range(args.users)], matrix)
+    queries = gallery.matrix[rng.integers(0, args.users, args.requests)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+    print(f"{args.users} users x {args.dim} dims, {args.clients} clients, {args.requests} requests")
+    rate, (p50, p99) = run(gallery.match, queries, args.clients)
+    print(f"{'direct':>8}: {rate:8.0f} req/s  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+
+    batcher = MatchBatcher(gallery, args.max_batch, args.max_wait_ms)
+    rate, (p50, p99) = run(batcher.match, queries, args.clients)
+    metrics = batcher.metrics()
+    batcher.close()
+    print(f"{'batched':>8}: {rate:8.0f} req/s  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  "
+          f"mean batch {metrics['mean_batch_size']:.1f} (fill {metrics['mean_batch_fill']:.0%}), "
+          f"max queue depth {metrics['max_queue_depth']}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
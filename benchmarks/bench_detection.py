@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark for face detection modes on high-resolution frames
+
+Compares full-resolution detection with the downscaled fast path and the
+ROI-first mode, reporting latency and detection-rate deltas.
+
+Usage:
+    python benchmarks/bench_detection.py [--frames DIR] [--max-side 640] [--roi-margin 0.5]
+
+Without --frames, a fixture sequence is built by upscaling the photos in
+user_images/ to 1080p and 4K and shifting them a few pixels per frame.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from detector import DetectorConfig, FaceDetector, default_cascade_path
+
+RESOLUTIONS = [(1920, 1080), (3840, 2160)]
+
+def load_frames(frames_dir):
+    """Return a list of sequences, each a list of grayscale frames"""
+    if frames_dir:
+        paths = sorted(glob.glob(os.path.join(frames_dir, '*')))
+        frames = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in paths]
+        return [[f for f in frames if f is not None]]
+
+    sources = sorted(glob.glob(os.path.join('user_images', '*.jpg')))
+    sequences = []
+    for path in sources:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            continue
+        for width, height in RESOLUTIONS:
+            frame = cv2.resize(image, (width, height), interpolation=cv2.INTER_CUBIC)
+            sequence = []
+            for step in range(8):
+                shift = np.float32([[1, 0, step * 4], [0, 1, step * 2]])
+                sequence.append(cv2.warpAffine(frame, shift, (width, height)))
+            sequences.append(sequence)
+    return sequences
+
+def run_mode(detector, sequences, use_roi):
+    latencies = []
+    detected = 0
+    for sequence in sequences:
+        last_box = None
+        for frame in sequence:
+            start = time.perf_counter()
+            faces = detector.detect(frame, last_box if use_roi else None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if len(faces):
+                detected += 1
+                last_box = faces[0]
+    latencies = np.array(latencies)
+    return {
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'detection_rate': detected / len(latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detection modes")
+    parser.add_argument('--frames', help="Directory of fixture frames (default: build from user_images/)")
+    parser.add_argument('--max-side', type=int, default=640, help="Longest side for the downscaled mode")
+    parser.add_argument('--roi-margin', type=float, default=0.5, help="Box expansion for the ROI mode")
+    args = parser.parse_args()
+
+    sequences = load_frames(args.frames)
+    total = sum(len(s) for s in sequences)
+    if total == 0:
+        print("❌ No fixture frames found")
+        return 1
+
+    cascade = default_cascade_path()
+    modes = [
+        ('full', FaceDetector(DetectorConfig(cascade_path=cascade)), False),
+        (f'downscaled@{args.max_side}', FaceDetector(DetectorConfig(cascade_path=cascade, max_side=args.max_side)), False),
+        (f'downscaled@{args.max_side}+roi', FaceDetector(DetectorConfig(cascade_path=cascade, max_side=args.max_side,
+                                                                         roi_margin=args.roi_margin)), True),
+    ]
+
+    print(f"Face detection benchmark: {total} frames in {len(sequences)} sequences")
+    print("=" * 78)
+    print(f"{'mode':<24}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'detect %':>10}{'speedup':>9}{'Δ detect':>9}")
+
+    baseline = None
+    for name, detector, use_roi in modes:
+        result = run_mode(detector, sequences, use_roi)
+        if baseline is None:
+            baseline = result
+        speedup = baseline['mean_ms'] / result['mean_ms']
+        delta = (result['detection_rate'] - baseline['detection_rate']) * 100
+        print(f"{name:<24}{result['mean_ms']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['detection_rate'] * 100:>10.1f}{speedup:>8.1f}x{delta:>+9.1f}")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the gallery search indexes on synthetic galleries
+
+Reports build time, recall@1 against exact search and per-query latency
+percentiles for the brute-force and IVF backends.
+
+Usage:
+    python benchmarks/bench_index.py [--sizes 10000 100000] [--dim 128] [--nprobe 8]
+
+Synthetic identities are drawn around random cluster centres, and each query
+is a noisy copy of an enrolled embedding, mimicking a new capture of a known
+person.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from search_index import BruteForceIndex, IVFIndex
+
+def normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def synthetic_gallery(n, dim, rng, clusters=256):
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    members = centres[rng.integers(0, clusters, n)]
+    matrix = normalize(members + 0.6 * rng.standard_normal((n, dim)).astype(np.float32))
+    return np.arange(1, n + 1, dtype=np.int64), matrix
+
+def time_queries(index, queries):
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(query, k=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0, 0])
+    return np.array(found), np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gallery search indexes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="Gallery sizes")
+    parser.add_argument('--dim', type=int, default=128, help="Embedding dimension")
+    parser.add_argument('--queries', type=int, default=500, help="Queries per gallery")
+    parser.add_argument('--nlist', type=int, default=None, help="IVF lists (default sqrt of the gallery size)")
+    parser.add_argument('--nprobe', type=int, default=8, help="IVF lists probed per query")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    print(f"Search index benchmark: dim={args.dim}, {args.queries} queries per gallery")
+    print("=" * 78)
+    print(f"{'users':>8}  {'index':<16}{'build s':>9}{'recall@1':>10}{'p50 ms':>9}{'p99 ms':>9}{'speedup':>9}")
+
+    for size in args.sizes:
+        ids, matrix = synthetic_gallery(size, args.dim, rng)
+        picks = rng.integers(0, size, args.queries)
+        queries = normalize(matrix[picks] + 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+
+        exact_ids = None
+        baseline_p50 = None
+        for name, index in [('brute', BruteForceIndex()),
+                            (f'ivf/nprobe={args.nprobe}', IVFIndex(nlist=args.nlist, nprobe=args.nprobe))]:
+            start = time.perf_counter()
+            index.build(ids, matrix)
+            build_time = time.perf_counter() - start
+
+            found, latencies = time_queries(index, queries)
+            if exact_ids is None:
+                exact_ids = found
+                baseline_p50 = np.percentile(latencies, 50)
+            recall = float(np.mean(found == exact_ids))
+            p50 = np.percentile(latencies, 50)
+            print(f"{size:>8}  {name:<16}{build_time:>9.2f}{recall:>10.3f}{p50:>9.3f}"
+                  f"{np.percentile(latencies, 99):>9.3f}{baseline_p50 / p50:>8.1f}x")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
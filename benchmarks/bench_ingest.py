@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark for upload ingestion: decode-and-convert cost per photo
+
+Compares the original path (read() and bytearray copies, full-resolution
+BGR decode, cvtColor to gray) with ingest.decode_image (zero-copy buffer,
+one reduced grayscale decode). Reports bytes copied into new buffers and
+milliseconds per photo.
+
+Usage:
+    python benchmarks/bench_ingest.py [--photos DIR] [--max-side 640] [--repeat 20]
+
+Without --photos, JPEG fixtures are built by upscaling the photos in
+user_images/ (or a synthetic gradient) to 720p, 1080p and 4K.
+"""
+
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from ingest import decode_image
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+
+def load_photos(photos_dir):
+    """(label, JPEG bytes) fixtures"""
+    if photos_dir:
+        paths = sorted(glob.glob(os.path.join(photos_dir, '*')))
+        return [(os.path.basename(p), open(p, 'rb').read()) for p in paths]
+
+    sources = [cv2.imread(p) for p in sorted(glob.glob(os.path.join('user_images', '*.jpg')))[:1]]
+    sources = [s for s in sources if s is not None]
+    if not sources:
+        y, x = np.mgrid[0:360, 0:640]
+        sources = [np.dstack([(x * 255 // 640), (y * 255 // 360), ((x + y) % 256)]).astype(np.uint8)]
+    photos = []
+    for width, height in RESOLUTIONS:
+        frame = cv2.resize(sources[0], (width, height), interpolation=cv2.INTER_CUBIC)
+        photos.append((f"{width}x{height}", cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()))
+    return photos
+
+def before(upload):
+    """The original app path; returns (gray, bytes copied)"""
+    upload.seek(0)
+    raw = upload.read()
+    file_bytes = np.asarray(bytearray(raw), dtype=np.uint8)
+    image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return gray, len(raw) + file_bytes.nbytes + image.nbytes + gray.nbytes
+
+def after(upload, max_side):
+    """decode_image on the upload's own buffer; returns (gray, bytes copied)"""
+    decoded = decode_image(upload.getbuffer(), max_side)
+    return decoded.gray, decoded.gray.nbytes
+
+def time_path(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload decoding")
+    parser.add_argument('--photos', help="Directory of JPEG photos (default: build fixtures)")
+    parser.add_argument('--max-side', type=int, default=640, help="Longest side kept by the reduced decode")
+    parser.add_argument('--repeat', type=int, default=20, help="Decodes per photo and path")
+    args = parser.parse_args()
+
+    photos = load_photos(args.photos)
+    if not photos:
+        print("❌ No photos found")
+        return 1
+
+    print(f"Ingestion benchmark (max side {args.max_side})")
+    print("=" * 86)
+    print(f"{'photo':<14}{'upload KB':>10}{'before ms':>11}{'before MB':>11}{'after ms':>10}{'after MB':>10}"
+          f"{'gray':>12}{'speedup':>8}")
+    for label, data in photos:
+        upload = io.BytesIO(data)
+        before_ms, (_, before_bytes) = time_path(lambda: before(upload), args.repeat)
+        after_ms, (gray, after_bytes) = time_path(lambda: after(upload, args.max_side), args.repeat)
+        print(f"{label:<14}{len(data) / 1024:>10.0f}{before_ms:>11.1f}{before_bytes / 1e6:>11.1f}"
+              f"{after_ms:>10.1f}{after_bytes / 1e6:>10.2f}{gray.shape[1]:>7}x{gray.shape[0]:<4}"
+              f"{before_ms / after_ms:>7.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
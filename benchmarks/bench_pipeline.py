@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the recognition pipeline: decode -> detect -> quality -> embed -> match -> record
+
+Builds a synthetic gallery of each size in a scratch database, loads it the
+way the app does (Gallery.from_db), then runs a fixture set of frames
+through the same functions the app's single-person attendance uses. Reports
+per-stage latency percentiles and throughput, frames per second end to end,
+gallery load time and peak traced memory (NumPy and Python allocations).
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes 1000 10000 100000] [--frames DIR] [--repeat 3]
+                                        [--output results.json] [--baseline baseline.json]
+
+Without --frames, a fixture set is built by scaling the photos in
+user_images/ to 480p, 720p and 1080p and shifting them a few pixels per
+frame. Gallery rows are random unit vectors of --dim values (128 by
+default, a typical projected size, see projection.py); the match stage
+queries them with noisy copies of enrolled rows, so every frame with a
+face is recognized and recorded.
+
+--output writes the results as JSON. --baseline compares against a saved
+JSON file and exits with status 1 if any stage's p50 or p95 got slower by
+more than --tolerance (default 25%), so it can guard a CI job.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from batch_attendance import record_attendance
+from db import close_pool, get_pool
+from descriptors import get_descriptor
+from detector import get_detector
+from embedding_codec import encode_embedding
+from gallery import Gallery
+from ingest import decode_image
+from quality import DEFAULT_CONFIG as QUALITY_CONFIG, FaceRejected, select_face
+from recognition import embed_face
+
+STAGES = ['decode', 'detect', 'quality', 'embed', 'match', 'record']
+RESOLUTIONS = [(854, 480), (1280, 720), (1920, 1080)]
+SHIFTS = [(0, 0), (6, 3), (-4, 5), (9, -6)]
+# Differences below this are timer noise, not regressions
+NOISE_FLOOR_MS = 0.05
+
+def load_frames(frames_dir):
+    """Fixture frames as (label, JPEG bytes)"""
+    if frames_dir:
+        return [(os.path.basename(p), open(p, 'rb').read()) for p in sorted(glob.glob(os.path.join(frames_dir, '*')))]
+
+    sources = [cv2.imread(p) for p in sorted(glob.glob(os.path.join('user_images', '*.jpg')))]
+    sources = [s for s in sources if s is not None]
+    if not sources:
+        y, x = np.mgrid[0:360, 0:640]
+        sources = [np.dstack([(x * 255 // 640), (y * 255 // 360), ((x + y) % 256)]).astype(np.uint8)]
+
+    frames = []
+    for i, source in enumerate(sources):
+        for width, height in RESOLUTIONS:
+            frame = cv2.resize(source, (width, height), interpolation=cv2.INTER_CUBIC)
+            for dx, dy in SHIFTS:
+                shifted = cv2.warpAffine(frame, np.float32([[1, 0, dx], [0, 1, dy]]), (width, height),
+                                         borderMode=cv2.BORDER_REPLICATE)
+                data = cv2.imencode('.jpg', shifted, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+                frames.append((f"{i}-{width}x{height}", data))
+    return frames
+
+def build_database(db_path, size, dim, rng, chunk=10000):
+    """Insert size users with random unit embeddings"""
+    pool = get_pool(db_path)
+    for start in range(0, size, chunk):
+        count = min(chunk, size - start)
+        matrix = rng.standard_normal((count, dim), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        pool.executemany("INSERT INTO users (id, name, image_path, embedding) VALUES (?, ?, ?, ?)",
+                         [(start + i + 1, f"User {start + i + 1}", '', encode_embedding(vector))
+                          for i, vector in enumerate(matrix)])
+
+def summarize(latencies_ms):
+    """Percentiles and throughput of one stage"""
+    if not latencies_ms:
+        return {'n': 0}
+    values = np.array(latencies_ms)
+    mean = float(values.mean())
+    return {
+        'n': len(values),
+        'mean_ms': round(mean, 4),
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p95_ms': round(float(np.percentile(values, 95)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'max_ms': round(float(values.max()), 4),
+        'per_s': round(1000 / mean, 1) if mean > 0 else None,
+    }
+
+def run_pipeline(frames, gallery, db_path, detector, descriptor, rng, repeat, noise=0.05):
+    """Per-stage latencies in ms over repeat passes of the fixture frames, plus wall time"""
+    latencies = {stage: [] for stage in STAGES}
+    matched = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, data in frames:
+            mark = time.perf_counter()
+            image = decode_image(data)
+            latencies['decode'].append((time.perf_counter() - mark) * 1000)
+            if image is None:
+                continue
+
+            mark = time.perf_counter()
+            faces = detector.detect(image.gray)
+            latencies['detect'].append((time.perf_counter() - mark) * 1000)
+            if len(faces) == 0:
+                continue
+
+            mark = time.perf_counter()
+            try:
+                box, _ = select_face(image.gray, faces, QUALITY_CONFIG)
+            except FaceRejected:
+                box = None
+            latencies['quality'].append((time.perf_counter() - mark) * 1000)
+            if box is None:
+                continue
+
+            mark = time.perf_counter()
+            embed_face(image.gray, box, descriptor)
+            latencies['embed'].append((time.perf_counter() - mark) * 1000)
+
+            # The synthetic gallery has its own dimension; query it with a new capture of an enrolled user
+            row = gallery.matrix[rng.integers(0, len(gallery))]
+            query = row + noise * rng.standard_normal(row.shape, dtype=np.float32)
+            mark = time.perf_counter()
+            match = gallery.match(query, threshold=0.5)
+            latencies['match'].append((time.perf_counter() - mark) * 1000)
+            if match is None:
+                continue
+            matched += 1
+
+            mark = time.perf_counter()
+            record_attendance(db_path, [match[0]])
+            latencies['record'].append((time.perf_counter() - mark) * 1000)
+    return latencies, time.perf_counter() - start, matched
+
+def bench_size(size, frames, args, detector, descriptor):
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        build_database(db_path, size, args.dim, rng)
+
+        tracemalloc.start()
+        mark = time.perf_counter()
+        gallery = Gallery.from_db(db_path)
+        load_s = time.perf_counter() - mark
+        _, load_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # Warm caches once, then time without tracing (it slows allocation-heavy code)
+        run_pipeline(frames[:1], gallery, db_path, detector, descriptor, rng, 1)
+        latencies, wall, matched = run_pipeline(frames, gallery, db_path, detector, descriptor, rng, args.repeat)
+
+        tracemalloc.start()
+        run_pipeline(frames, gallery, db_path, detector, descriptor, rng, 1)
+        _, run_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        close_pool(db_path)
+
+    processed = len(frames) * args.repeat
+    return {
+        'users': size,
+        'load_s': round(load_s, 4),
+        'frames': processed,
+        'recognized': matched,
+        'fps': round(processed / wall, 2),
+        'peak_load_mb': round(load_peak / 1e6, 2),
+        'peak_pipeline_mb': round(run_peak / 1e6, 2),
+        'stages': {stage: summarize(values) for stage, values in latencies.items()},
+    }
+
+def compare(results, baseline, tolerance):
+    """Print stage deltas against a baseline; returns the regressions"""
+    old = {str(r['users']): r for r in baseline['results']}
+    regressions = []
+    print()
+    print(f"Comparison with baseline ({baseline['meta'].get('timestamp', '?')}, tolerance {tolerance:.0%})")
+    print(f"{'users':>8}  {'stage':<8}{'old p50':>9}{'new p50':>9}{'old p95':>9}{'new p95':>9}  verdict")
+    for result in results:
+        before = old.get(str(result['users']))
+        if before is None:
+            print(f"{result['users']:>8}  not in baseline")
+            continue
+        for stage in STAGES:
+            new, prev = result['stages'][stage], before['stages'].get(stage, {'n': 0})
+            if not new['n'] or not prev['n']:
+                continue
+            slower = [metric for metric in ('p50_ms', 'p95_ms')
+                      if new[metric] > prev[metric] * (1 + tolerance) and new[metric] - prev[metric] > NOISE_FLOOR_MS]
+            if slower:
+                regressions.append((result['users'], stage, slower))
+            verdict = f"❌ slower ({', '.join(m[:3] for m in slower)})" if slower else "ok"
+            print(f"{result['users']:>8}  {stage:<8}{prev['p50_ms']:>9.3f}{new['p50_ms']:>9.3f}"
+                  f"{prev['p95_ms']:>9.3f}{new['p95_ms']:>9.3f}  {verdict}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detect, embed, match and record pipeline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Gallery sizes")
+    parser.add_argument('--dim', type=int, default=128, help="Gallery embedding dimension")
+    parser.add_argument('--frames', help="Directory of fixture frames (default: build from user_images/)")
+    parser.add_argument('--repeat', type=int, default=3, help="Passes over the fixture frames per gallery")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare with a JSON file written by --output")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before failing")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    if not frames:
+        print("❌ No frames found")
+        return 1
+    detector = get_detector()
+    descriptor = get_descriptor()
+
+    print(f"Pipeline benchmark: {len(frames)} frames x {args.repeat}, descriptor {descriptor.kind}, "
+          f"gallery dim {args.dim}")
+    print("=" * 86)
+    print(f"{'users':>8}  {'stage':<8}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'per s':>9}")
+
+    results = []
+    for size in args.sizes:
+        result = bench_size(size, frames, args, detector, descriptor)
+        results.append(result)
+        for stage, stats in result['stages'].items():
+            if stats['n']:
+                print(f"{size:>8}  {stage:<8}{stats['n']:>6}{stats['p50_ms']:>9.3f}{stats['p95_ms']:>9.3f}"
+                      f"{stats['p99_ms']:>9.3f}{stats['per_s']:>9.0f}")
+            else:
+                print(f"{size:>8}  {stage:<8}{0:>6}  (no frames reached this stage)")
+        print(f"{'':>8}  load {result['load_s']:.2f} s, {result['fps']:.1f} frames/s, "
+              f"{result['recognized']}/{result['frames']} recognized, peak {result['peak_load_mb']:.0f} MB loading, "
+              f"{result['peak_pipeline_mb']:.1f} MB per pass")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'descriptor': descriptor.kind,
+            'dim': args.dim,
+            'fixture_frames': len(frames),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            # ru_maxrss is in KB on Linux and bytes on macOS
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                                / (1e6 if sys.platform == 'darwin' else 1e3), 1),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} stage(s) regressed")
+            return 1
+        print("✓ No regressions")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
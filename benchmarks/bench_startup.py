@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark for startup cost: cold import and first-recognition latency
+
+Every measurement runs in a fresh interpreter, in an empty working
+directory, so module caches, the parsed cascade and the page cache of
+earlier runs in this process don't hide the cost. Reports the median and
+fastest of --repeat runs, which modules each import pulled in, and any
+files an import left behind (there should be none).
+
+Usage:
+    python benchmarks/bench_startup.py [--photo user_images/user_3.jpg] [--repeat 5]
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+HEAVY_MODULES = ['cv2', 'numpy', 'pandas', 'streamlit', 'starlette']
+
+# Each child prints a JSON dict of millisecond timings and the heavy modules it loaded
+PRELUDE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+timings = {{}}
+def lap(name):
+    timings[name] = (time.perf_counter() - start) * 1000
+"""
+
+EPILOGUE = """
+loaded = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'timings': timings, 'loaded': loaded}}))
+"""
+
+SCENARIOS = [
+    ("import backend", "import backend\nlap('import')"),
+    ("core (recognition)", "from backend import extract_face_embedding\nlap('import')"),
+    ("api module", "sys.path.insert(0, {backend!r})\nimport api\nlap('import')"),
+    ("app module", "import backend.app\nlap('import')"),
+    ("first recognition", """from backend import extract_face_embedding
+lap('import')
+import cv2
+image = cv2.imread({photo!r})
+lap('read')
+extract_face_embedding(image)
+lap('first')
+mark = time.perf_counter()
+extract_face_embedding(image)
+timings['warm'] = (time.perf_counter() - mark) * 1000
+"""),
+]
+
+def run_child(code, cwd):
+    result = subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "child failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run_scenario(body, photo, repeat):
+    """(per-run timings, loaded modules, files left in the working directory)"""
+    root = os.path.abspath(ROOT)
+    code = (PRELUDE.format(root=root)
+            + body.format(photo=photo, backend=os.path.join(root, 'backend'))
+            + EPILOGUE.format(heavy=HEAVY_MODULES))
+    runs, created = [], set()
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as cwd:
+            out = run_child(code, cwd)
+            created |= set(os.listdir(cwd))
+        runs.append(out['timings'])
+    return runs, out['loaded'], sorted(created)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import and first-recognition latency")
+    parser.add_argument('--photo', help="Photo for the first recognition (default: first of user_images/)")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per scenario")
+    args = parser.parse_args()
+
+    photo = args.photo or next(iter(sorted(glob.glob(os.path.join(ROOT, 'user_images', '*.jpg')))), None)
+    if not photo:
+        print("❌ No photo found, pass --photo")
+        return 1
+    photo = os.path.abspath(photo)
+
+    print(f"Startup benchmark ({args.repeat} fresh interpreters each, {sys.executable})")
+    print("=" * 86)
+    print(f"{'scenario':<22}{'stage':<8}{'median ms':>11}{'min ms':>9}  loaded")
+    for label, body in SCENARIOS:
+        try:
+            runs, loaded, created = run_scenario(body, photo, args.repeat)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(f"{label:<22}{'':<8}{'skipped':>11}  {e}")
+            continue
+        for i, stage in enumerate(runs[0]):
+            values = [run[stage] for run in runs]
+            modules = ", ".join(loaded) or "-" if i == 0 else ""
+            print(f"{label if i == 0 else '':<22}{stage:<8}{statistics.median(values):>11.1f}{min(values):>9.1f}"
+                  f"  {modules}")
+        if created:
+            print(f"{'':<22}⚠️  left files behind: {', '.join(created)}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark for multi-process recognition workers
+
+Recognizes the same stream of photos from many client threads, first in
+the threads themselves (embed_upload + Gallery.match, as the API does
+without --processes), then through RecognitionPool with 1, 2, 4, ... worker
+processes up to --processes. Reports throughput, p50/p99 latency and the
+speedup over the threaded run; on an N-core machine the pool should scale
+close to N times.
+
+Usage:
+    python benchmarks/bench_workers.py [--processes 4] [--users 2000] [--requests 200] [--clients 16]
+
+Photos are the ones in user_images/ scaled to 720p; the gallery holds them
+plus random users of the descriptor's dimension.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from gallery import Gallery
+from recognition import embed_upload
+from workers import RecognitionPool
+
+def load_photos():
+    photos = []
+    for path in sorted(glob.glob(os.path.join('user_images', '*.jpg'))):
+        image = cv2.imread(path)
+        if image is not None:
+            image = cv2.resize(image, (1280, 720), interpolation=cv2.INTER_CUBIC)
+            photos.append(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    return photos
+
+def build_gallery(photos, users, rng):
+    embeddings = [e for e in (embed_upload(p)[1] for p in photos) if e is not None]
+    dim = len(embeddings[0])
+    random_rows = rng.standard_normal((max(users - len(embeddings), 0), dim), dtype=np.float32)
+    matrix = np.vstack([np.stack(embeddings), random_rows])
+    return Gallery(np.arange(1, len(matrix) + 1), [f"User {i}" for i in range(len(matrix))], matrix)
+
+def run(recognize, requests, clients):
+    latencies = np.empty(len(requests))
+
+    def one(i):
+        start = time.perf_counter()
+        recognize(requests[i])
+        latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(len(requests))))
+    elapsed = time.perf_counter() - start
+    return len(requests) / elapsed, np.percentile(latencies * 1000, [50, 99])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-process recognition")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="Largest worker pool to try")
+    parser.add_argument('--users', type=int, default=2000, help="Gallery size")
+    parser.add_argument('--requests', type=int, default=200, help="Photos recognized per run")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent client threads")
+    args = parser.parse_args()
+
+    photos = load_photos()
+    if not photos:
+        print("❌ No photos found in user_images/")
+        return 1
+    rng = np.random.default_rng(0)
+    gallery = build_gallery(photos, args.users, rng)
+    requests = [photos[i % len(photos)] for i in range(args.requests)]
+
+    print(f"{len(gallery)} users x {gallery.dim} dims, {args.requests} requests from {args.clients} clients, "
+          f"{os.cpu_count()} CPUs")
+    print("=" * 70)
+    rate, (p50, p99) = run(lambda data: gallery.match(embed_upload(data)[1]), requests, args.clients)
+    baseline = rate
+    print(f"{'threads':>12}: {rate:7.1f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms")
+
+    counts = []
+    n = 1
+    while n < args.processes:
+        counts.append(n)
+        n *= 2
+    counts.append(args.processes)
+    for processes in counts:
+        pool = RecognitionPool(gallery, processes)
+        try:
+            # Start every worker (and its imports) before timing
+            for future in [pool.submit(photos[0]) for _ in range(processes * 2)]:
+                pool.result(future)
+            rate, (p50, p99) = run(pool.recognize, requests, args.clients)
+        finally:
+            pool.close()
+        label = f"{processes} process{'es' if processes > 1 else ''}"
+        print(f"{label:>12}: {rate:7.1f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  {rate / baseline:5.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
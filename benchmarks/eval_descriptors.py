@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of face descriptors: accuracy and per-face latency
+
+Every photo is detected once (largest face); each descriptor then embeds
+the same boxes. The first --enroll photos of each person are the gallery
+templates, the rest are probes matched against them by cosine similarity.
+Reported per descriptor:
+
+    dims      embedding length
+    ms/face   mean and p95 time to crop, align and describe one face
+    rank-1    probes whose best-matching person is correct
+    TAR/FAR   probes correctly accepted / accepted as someone else at the
+              descriptor's threshold (or --threshold)
+    EER       equal error rate between genuine and impostor scores, and the
+              threshold where it occurs (a starting point for FACE_MATCH_THRESHOLD)
+
+Usage:
+    python benchmarks/eval_descriptors.py DATASET [--descriptors pixels lbp dnn] [--align] [--enroll 1]
+
+DATASET holds one folder per person (DATASET/alice/1.jpg, ...), e.g. LFW or
+photos exported from a site. Without it, a fixture is built from
+user_images/: each photo is one person and the probes are that photo
+under lighting, contrast, tilt, shift and blur changes. The dnn descriptor
+is evaluated when FACE_DNN_MODEL (or --dnn-model) points to a model file.
+"""
+
+import argparse
+import dataclasses
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from descriptors import DESCRIPTORS, DescriptorConfig
+from detector import get_detector
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def _gamma(gray, gamma):
+    lut = (np.linspace(0, 1, 256) ** gamma * 255).astype(np.uint8)
+    return lut[gray]
+
+def _rotate(gray, angle):
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+
+def _shift(gray, dx, dy):
+    height, width = gray.shape
+    return cv2.warpAffine(gray, np.float32([[1, 0, dx], [0, 1, dy]]), (width, height),
+                          borderMode=cv2.BORDER_REPLICATE)
+
+VARIANTS = [
+    ('darker', lambda g: _gamma(g, 1.8)),
+    ('brighter', lambda g: _gamma(g, 0.55)),
+    ('low contrast', lambda g: cv2.convertScaleAbs(g, alpha=0.5, beta=60)),
+    ('tilt left', lambda g: _rotate(g, 10)),
+    ('tilt right', lambda g: _rotate(g, -10)),
+    ('shifted', lambda g: _shift(g, g.shape[1] // 40, g.shape[0] // 40)),
+    ('blurred', lambda g: cv2.GaussianBlur(g, (5, 5), 0)),
+]
+
+def load_dataset(dataset_dir):
+    """(label, grayscale image) pairs, in enrollment order per label"""
+    samples = []
+    if dataset_dir:
+        for person in sorted(os.listdir(dataset_dir)):
+            for path in sorted(glob.glob(os.path.join(dataset_dir, person, '*'))):
+                if path.lower().endswith(IMAGE_EXTENSIONS):
+                    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                    if gray is not None:
+                        samples.append((person, gray))
+        return samples
+
+    for path in sorted(glob.glob(os.path.join('user_images', '*.jpg'))):
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            continue
+        person = os.path.splitext(os.path.basename(path))[0]
+        samples.append((person, gray))
+        samples.extend((person, variant(gray)) for _, variant in VARIANTS)
+    return samples
+
+def detect_faces(samples, detector):
+    """(label, gray, largest box) for every sample with a face"""
+    faces = []
+    for label, gray in samples:
+        boxes = detector.detect(gray)
+        if len(boxes):
+            faces.append((label, gray, max(boxes, key=lambda b: b[2] * b[3])))
+    return faces
+
+def equal_error_rate(genuine, impostor):
+    """(EER, threshold) where false rejects and false accepts are closest"""
+    best = (1.0, 0.0)
+    gap = 2.0
+    for threshold in np.unique(np.concatenate([genuine, impostor])):
+        frr = float(np.mean(genuine < threshold))
+        far = float(np.mean(impostor >= threshold))
+        if abs(frr - far) < gap:
+            gap = abs(frr - far)
+            best = ((frr + far) / 2, float(threshold))
+    return best
+
+def evaluate(descriptor, faces, enroll, threshold):
+    latencies = []
+    embeddings = []
+    for _, gray, box in faces:
+        start = time.perf_counter()
+        embeddings.append(descriptor.describe(gray, box))
+        latencies.append((time.perf_counter() - start) * 1000)
+    embeddings = np.stack(embeddings)
+    labels = np.array([label for label, _, _ in faces])
+
+    seen = {}
+    is_template = np.zeros(len(faces), dtype=bool)
+    for row, label in enumerate(labels):
+        seen[label] = seen.get(label, 0) + 1
+        is_template[row] = seen[label] <= enroll
+
+    people = sorted(set(labels[is_template]))
+    probes = np.flatnonzero(~is_template & np.isin(labels, people))
+    scores = embeddings[probes] @ embeddings[is_template].T
+    template_labels = labels[is_template]
+    # Best score per person for every probe
+    per_person = np.stack([scores[:, template_labels == person].max(axis=1) for person in people], axis=1)
+
+    truth = np.array([people.index(label) for label in labels[probes]])
+    rows = np.arange(len(probes))
+    genuine = per_person[rows, truth]
+    others = per_person.copy()
+    others[rows, truth] = -np.inf
+    impostor = others.max(axis=1)
+    best = per_person.argmax(axis=1)
+    best_score = per_person.max(axis=1)
+    eer, eer_threshold = equal_error_rate(genuine, impostor)
+
+    latencies = np.array(latencies)
+    return {
+        'dims': embeddings.shape[1],
+        'probes': len(probes),
+        'mean_ms': float(latencies.mean()),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'rank1': float(np.mean(best == truth)),
+        'tar': float(np.mean((best == truth) & (best_score >= threshold))),
+        'far': float(np.mean((best != truth) & (best_score >= threshold))),
+        'eer': eer,
+        'eer_threshold': eer_threshold,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate face descriptors on a labeled dataset")
+    parser.add_argument('dataset', nargs='?', help="Folder with one subfolder of photos per person "
+                                                   "(default: fixture built from user_images/)")
+    parser.add_argument('--descriptors', nargs='+', choices=list(DESCRIPTORS), help="Descriptors to compare")
+    parser.add_argument('--align', action='store_true', help="Also evaluate each descriptor with eye alignment")
+    parser.add_argument('--enroll', type=int, default=1, help="Templates per person; the rest are probes")
+    parser.add_argument('--threshold', type=float, help="Threshold for TAR/FAR (default: each descriptor's)")
+    parser.add_argument('--dnn-model', help="Model file for the dnn descriptor (default: FACE_DNN_MODEL)")
+    parser.add_argument('--dnn-config', help="Network description for the dnn model")
+    args = parser.parse_args()
+
+    base = DescriptorConfig.from_env()
+    if args.dnn_model:
+        base = dataclasses.replace(base, dnn_model=args.dnn_model, dnn_config=args.dnn_config)
+    kinds = args.descriptors or [k for k in DESCRIPTORS if k != 'dnn' or base.dnn_model]
+
+    faces = detect_faces(load_dataset(args.dataset), get_detector())
+    people = {label for label, _, _ in faces}
+    if len(people) < 2:
+        print("❌ Need faces of at least two people")
+        return 1
+
+    print(f"Descriptor evaluation: {len(faces)} faces of {len(people)} people, {args.enroll} template(s) each")
+    print("=" * 96)
+    print(f"{'descriptor':<16}{'dims':>7}{'ms/face':>9}{'p95 ms':>8}{'rank-1 %':>10}{'thresh':>8}"
+          f"{'TAR %':>8}{'FAR %':>8}{'EER %':>8}{'@thresh':>9}")
+
+    for kind in kinds:
+        for align in ([False, True] if args.align else [base.align]):
+            descriptor = DESCRIPTORS[kind](dataclasses.replace(base, kind=kind, align=align))
+            threshold = args.threshold if args.threshold is not None else descriptor.threshold
+            result = evaluate(descriptor, faces, args.enroll, threshold)
+            name = kind + ('+align' if align else '')
+            print(f"{name:<16}{result['dims']:>7}{result['mean_ms']:>9.2f}{result['p95_ms']:>8.2f}"
+                  f"{result['rank1'] * 100:>10.1f}{threshold:>8.2f}{result['tar'] * 100:>8.1f}"
+                  f"{result['far'] * 100:>8.1f}{result['eer'] * 100:>8.1f}{result['eer_threshold']:>9.3f}")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
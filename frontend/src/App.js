@@ -4,14 +4,14 @@ import Register from './Register';
 import Attendance from './Attendance';
 
 function App() {
-  const [loggedIn, setLoggedIn] = useState(false);
+  const [credentials, setCredentials] = useState(null);
 
-  if (!loggedIn) return <Login onLogin={setLoggedIn} />;
+  if (!credentials) return <Login onLogin={setCredentials} />;
 
   return (
     <div>
       <h1>Face Recognition Attendance System</h1>
-      <Register />
+      <Register credentials={credentials} />
       <Attendance />
       <p>Made with ❤️ from Sohel</p>
     </div>
@@ -11,7 +11,7 @@ function Login({ onLogin }) {
       body: JSON.stringify({ username, password })
     });
     const data = await res.json();
-    if (data.success) onLogin(true);
+    if (data.success) onLogin({ username, password });
     else alert('Invalid Credentials');
   };
 
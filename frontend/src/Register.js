@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import Camera from './Camera';
 
-function Register() {
+function Register({ credentials }) {
   const [name, setName] = useState('');
   const [image, setImage] = useState(null);
 
@@ -12,6 +12,7 @@ function Register() {
 
     await fetch('http://localhost:5000/register', {
       method: 'POST',
+      headers: { Authorization: 'Basic ' + btoa(`${credentials.username}:${credentials.password}`) },
       body: formData
     });
     alert('User Registered');
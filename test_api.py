@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Test script for the HTTP recognition API
+Runs the ASGI app under uvicorn and exercises the React frontend's contract
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+import requests
+
+# Add backend directory to path
+sys.path.append('backend')
+
+# Enrollment endpoints take the admin's credentials as HTTP Basic auth
+ADMIN = ('admin', 'admin123')
+
+class FixedDetector:
+    """Stand-in detector that always finds one face"""
+
+    def detect(self, gray, last_box=None):
+        return np.array([[10, 10, 80, 80]], dtype=np.int32)
+
+def photo(seed):
+    image = np.random.default_rng(seed).integers(0, 255, (120, 120, 3), dtype=np.uint8)
+    if seed % 2 == 0:
+        # Dark left half, so even and odd photos never match each other
+        image[:, :60] = 0
+    return cv2.imencode('.png', image)[1].tobytes()
+
+def blurred_photo(seed):
+    image = cv2.GaussianBlur(np.random.default_rng(seed).integers(0, 255, (120, 120, 3), dtype=np.uint8), (0, 0), 8)
+    return cv2.imencode('.png', image)[1].tobytes()
+
+class Server:
+    """uvicorn running an app on a free local port in a background thread"""
+
+    def __init__(self, app):
+        import uvicorn
+
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=self.port, log_level='warning'))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            assert time.time() < deadline, "Server did not start"
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+def test_register_and_attendance():
+    """Test the /register and /attendance endpoints end to end"""
+    print("Testing register and attendance endpoints...")
+
+    from api import create_app
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            db_path = os.path.join(tmp, 'attendance.db')
+            with Server(create_app(db_path, workers=2, detector=FixedDetector())) as url:
+                res = requests.post(f"{url}/register", auth=ADMIN, data={'name': "Alice"},
+                                    files={'image': ('alice.png', photo(1), 'image/png')})
+                assert res.status_code == 201, f"Register failed: {res.status_code} {res.text}"
+                user_id = res.json()['user_id']
+                assert os.path.exists(f"user_images/user_{user_id}.jpg"), "Photo should be stored"
+
+                res = requests.post(f"{url}/attendance", files={'image': ('a.png', photo(1), 'image/png')})
+                body = res.json()
+                assert res.status_code == 200 and body['recorded'], f"Attendance failed: {body}"
+                assert body['message'] == "Attendance marked for Alice", f"Unexpected message {body['message']}"
+
+                # Same person again within the cooldown window
+                body = requests.post(f"{url}/attendance", files={'image': ('a.png', photo(1), 'image/png')}).json()
+                assert body['recognized'] and not body['recorded'], f"Repeat mark should be suppressed: {body}"
+
+                body = requests.post(f"{url}/attendance", files={'image': ('b.png', photo(2), 'image/png')}).json()
+                assert body == {"message": "Face not recognized", "recognized": False, "recorded": False}
+
+                res = requests.post(f"{url}/attendance", files={'image': ('c.png', b"not an image", 'image/png')})
+                assert res.status_code == 422 and 'message' in res.json()
+                res = requests.post(f"{url}/register", auth=ADMIN, files={'image': ('d.png', photo(3), 'image/png')})
+                assert res.status_code == 400, "Registration without a name should be rejected"
+                res = requests.post(f"{url}/register", auth=ADMIN, data={'name': "Blurry"},
+                                    files={'image': ('b.png', blurred_photo(6), 'image/png')})
+                assert res.status_code == 422 and res.json()['reason'] == 'blurry', f"Unexpected {res.text}"
+
+                health = requests.get(f"{url}/health").json()
+                assert health['users'] == 1
+                # Alice's photo was embedded once, then served from the upload cache
+                assert health['upload_cache']['hits'] == 2, f"Unexpected cache stats {health['upload_cache']}"
+
+                # More enrollment photos become templates of the same user
+                res = requests.post(f"{url}/users/{user_id}/templates", auth=ADMIN,
+                                    files=[('image', ('e.png', photo(4), 'image/png')),
+                                           ('image', ('f.png', photo(5), 'image/png'))])
+                assert res.status_code == 201 and res.json()['templates'] == 3, f"Unexpected {res.json()}"
+                res = requests.post(f"{url}/users/999/templates", auth=ADMIN, files={'image': ('g.png', photo(4), 'image/png')})
+                assert res.status_code == 404, "Unknown users should be rejected"
+
+                for auth in [None, ('admin', 'wrong')]:
+                    res = requests.post(f"{url}/register", auth=auth, data={'name': "Mallory"},
+                                        files={'image': ('m.png', photo(7), 'image/png')})
+                    assert res.status_code == 401, f"Enrollment without the admin login should be rejected: {res.text}"
+                    res = requests.post(f"{url}/users/{user_id}/templates", auth=auth,
+                                        files={'image': ('m.png', photo(7), 'image/png')})
+                    assert res.status_code == 401
+                assert requests.get(f"{url}/health").json()['users'] == 1
+        finally:
+            os.chdir(cwd)
+
+    print("✓ Register and attendance endpoints working")
+
+def test_login():
+    """Test the frontend's admin login"""
+    print("Testing login endpoint...")
+
+    from api import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with Server(create_app(os.path.join(tmp, 'attendance.db'), workers=1, detector=FixedDetector())) as url:
+            res = requests.post(f"{url}/login", json={'username': 'admin', 'password': 'admin123'})
+            assert res.status_code == 200 and res.json() == {"success": True}, f"Login failed: {res.text}"
+            res = requests.post(f"{url}/login", json={'username': 'admin', 'password': 'wrong'})
+            assert res.status_code == 200 and res.json()['success'] is False
+            res = requests.post(f"{url}/login", data="not json", headers={'Content-Type': 'application/json'})
+            assert res.status_code == 400 and res.json()['success'] is False
+
+    print("✓ Login endpoint working")
+
+def test_upload_errors():
+    """Test that malformed uploads are rejected as client errors"""
+    print("Testing upload errors...")
+
+    import asyncio
+    import api
+
+    class FakeRequest:
+        def __init__(self, length, chunks=()):
+            self.headers = {} if length is None else {'content-length': length}
+            self.chunks = chunks
+            self.read = 0
+
+        async def stream(self):
+            for chunk in self.chunks:
+                self.read += 1
+                yield chunk
+
+    for length, status in [('abc', 400), ('-', 400), (str(api.MAX_UPLOAD_BYTES + 1), 413)]:
+        _, _, error = asyncio.run(api._read_upload(FakeRequest(length)))
+        assert error is not None and error.status_code == status, f"Expected {status} for {length!r}"
+
+    # A chunked body without Content-Length is cut off once it passes the limit
+    chunk = b'x' * (api.MAX_UPLOAD_BYTES // 4 + 1)
+    request = FakeRequest(None, [chunk] * 8)
+    _, _, error = asyncio.run(api._read_upload(request))
+    assert error is not None and error.status_code == 413, "Chunked uploads should be limited too"
+    assert request.read == 4, f"Reading should stop at the limit, read {request.read} chunks"
+
+    print("✓ Upload errors working")
+
+def test_server_error():
+    """Test that unexpected errors are logged but not shown to the client"""
+    print("Testing server errors...")
+
+    import asyncio
+    import json
+    import logging
+    import api
+
+    class FakeRequest:
+        method = 'POST'
+
+        class url:
+            path = '/attendance'
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            logged.append(record)
+
+    logged = []
+    handler = Collect()
+    api.logger.addHandler(handler)
+    try:
+        response = asyncio.run(api.server_error(FakeRequest(), RuntimeError("no such table: /srv/secret.db")))
+    finally:
+        api.logger.removeHandler(handler)
+    assert response.status_code == 500 and json.loads(response.body) == {"message": "Server error"}
+    assert logged and "secret.db" in logged[0].getMessage(), "The error should be logged"
+
+    print("✓ Server errors working")
+
+def test_backpressure():
+    """Test that a saturated server answers 503 instead of queueing"""
+    print("Testing backpressure...")
+
+    from api import create_app
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            app = create_app(os.path.join(tmp, 'attendance.db'), workers=1, max_pending=0, detector=FixedDetector())
+            with Server(app) as url:
+                res = requests.post(f"{url}/attendance", files={'image': ('a.png', photo(1), 'image/png')})
+                assert res.status_code == 503, f"Expected 503, got {res.status_code}"
+                assert res.headers.get('Retry-After') == "1"
+                assert 'message' in res.json()
+        finally:
+            os.chdir(cwd)
+
+    print("✓ Backpressure working")
+
+def test_worker_processes():
+    """Test recognition in worker processes, including users registered after startup"""
+    print("Testing worker processes...")
+
+    from api import create_app
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            app = create_app(os.path.join(tmp, 'attendance.db'), workers=2, detector=FixedDetector(), processes=2)
+            with Server(app) as url:
+                for name, seed in [("Alice", 1), ("Bob", 2)]:
+                    requests.post(f"{url}/register", auth=ADMIN, data={'name': name},
+                                  files={'image': (f'{name}.png', photo(seed), 'image/png')})
+                    body = requests.post(f"{url}/attendance", files={'image': ('a.png', photo(seed), 'image/png')}).json()
+                    assert body['recorded'] and body['name'] == name, f"Expected {name}, got {body}"
+                res = requests.post(f"{url}/attendance", files={'image': ('c.png', b"not an image", 'image/png')})
+                assert res.status_code == 422, f"Got {res.status_code} {res.text}"
+                res = requests.post(f"{url}/attendance", files={'image': ('b.png', blurred_photo(6), 'image/png')})
+                assert res.status_code == 422 and res.json()['reason'] == 'blurry', f"Got {res.status_code} {res.text}"
+        finally:
+            os.chdir(cwd)
+
+    print("✓ Worker processes working")
+
+def test_metrics_and_profiling():
+    """Test the Prometheus endpoint and profiling a single request on demand"""
+    print("Testing metrics endpoint...")
+
+    import api
+    from metrics import METRICS
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        METRICS.reset()
+        api.PROFILE_ENABLED = True
+        try:
+            with Server(api.create_app(os.path.join(tmp, 'attendance.db'), workers=1, detector=FixedDetector())) as url:
+                requests.post(f"{url}/register", auth=ADMIN, data={'name': "Alice"}, files={'image': ('a.png', photo(1), 'image/png')})
+                requests.post(f"{url}/attendance", files={'image': ('b.png', photo(2), 'image/png')})
+
+                res = requests.get(f"{url}/metrics")
+                assert res.status_code == 200 and res.headers['content-type'].startswith('text/plain')
+                text = res.text
+                for line in ['face_stage_seconds_count{stage="detect"} 2', 'face_stage_seconds_count{stage="register"} 1',
+                             'face_faces_detected_total 2', 'face_rejects_total 1', 'face_registrations_total 1',
+                             'face_gallery_users 1']:
+                    assert line in text, f"Missing {line!r} in metrics"
+
+                res = requests.post(f"{url}/attendance?profile=1", files={'image': ('a.png', photo(1), 'image/png')})
+                assert res.status_code == 200 and res.json()['recorded'], f"Profiled request failed: {res.text}"
+                assert os.path.exists(res.headers['X-Profile']), "Profile should be written"
+                res = requests.post(f"{url}/attendance", files={'image': ('a.png', photo(1), 'image/png')})
+                assert 'X-Profile' not in res.headers, "Only requested profiles are captured"
+        finally:
+            api.PROFILE_ENABLED = False
+            os.chdir(cwd)
+
+    print("✓ Metrics endpoint working")
+
+def main():
+    """Run all API tests"""
+    print("Starting API Tests")
+    print("=" * 50)
+
+    try:
+        test_register_and_attendance()
+        test_login()
+        test_upload_errors()
+        test_server_error()
+        test_backpressure()
+        test_worker_processes()
+        test_metrics_and_profiling()
+
+        print("=" * 50)
+        print("🎉 All API tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
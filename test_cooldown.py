@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test script for the attendance cooldown window
+Checks window parsing, duplicate suppression and the database fallback
+"""
+
+import sqlite3
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# Add backend directory to path
+sys.path.append('backend')
+
+NOON = datetime(2024, 1, 1, 12, 0, 0)
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM attendance")
+    count = c.fetchone()[0]
+    conn.close()
+    return count
+
+def test_parse_window():
+    """Test the FACE_ATTENDANCE_COOLDOWN formats"""
+    print("Testing cooldown window parsing...")
+
+    from cooldown import parse_window
+
+    assert parse_window("5m") == timedelta(minutes=5)
+    assert parse_window("90s") == timedelta(seconds=90)
+    assert parse_window("2h") == timedelta(hours=2)
+    assert parse_window("10") == timedelta(minutes=10), "Bare numbers should be minutes"
+    assert parse_window("day") == "day"
+    assert parse_window("session") == "session"
+    assert parse_window("off") is None and parse_window("0") is None
+    try:
+        parse_window("soon")
+        assert False, "Invalid windows should be rejected"
+    except ValueError:
+        pass
+
+    print("✓ Cooldown window parsing working")
+
+def test_duration_window():
+    """Test that repeat marks are dropped until the window has passed"""
+    print("Testing duration cooldown...")
+
+    from batch_attendance import record_attendance
+    from cooldown import AttendanceCooldown
+    from db import init_db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        init_db(db_path)
+        cooldown = AttendanceCooldown(db_path, "5m")
+
+        stamp = lambda offset: (NOON + timedelta(minutes=offset)).strftime('%Y-%m-%d %H:%M:%S')
+        assert record_attendance(db_path, [1, 2], stamp(0), cooldown) == [1, 2]
+        assert record_attendance(db_path, [1, 2, 3], stamp(2), cooldown) == [3], "Users 1 and 2 are cooling down"
+        assert record_attendance(db_path, [1], stamp(6), cooldown) == [1], "Window should have expired"
+        assert count_rows(db_path) == 4, f"Expected 4 rows, got {count_rows(db_path)}"
+
+        # Without a cooldown every mark is kept
+        assert record_attendance(db_path, [1], stamp(6)) == [1]
+        assert count_rows(db_path) == 5
+
+    print("✓ Duration cooldown working")
+
+def test_day_and_session_windows():
+    """Test per-day and per-process windows"""
+    print("Testing day and session cooldowns...")
+
+    from cooldown import AttendanceCooldown
+    from db import init_db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        init_db(db_path)
+
+        day = AttendanceCooldown(db_path, "day")
+        assert day.claim([1], NOON) == [1]
+        assert day.claim([1], NOON + timedelta(hours=11)) == [], "Same day should be blocked"
+        assert day.claim([1], NOON + timedelta(hours=12)) == [1], "Next day should be allowed"
+
+        session = AttendanceCooldown(db_path, "session")
+        assert session.claim([1], NOON) == [1]
+        assert session.claim([1], NOON + timedelta(days=30)) == [], "Session marks never expire"
+
+        off = AttendanceCooldown(db_path, "off")
+        assert off.claim([1, 1], NOON) == [1, 1], "Disabled cooldown should allow everything"
+
+    print("✓ Day and session cooldowns working")
+
+def test_database_fallback():
+    """Test that marks written by another process are seen on a cache miss"""
+    print("Testing cooldown database fallback...")
+
+    from batch_attendance import record_attendance
+    from cooldown import AttendanceCooldown
+    from db import init_db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        init_db(db_path)
+
+        # Another kiosk marked user 7 a minute ago
+        record_attendance(db_path, [7], (NOON - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S'))
+        cooldown = AttendanceCooldown(db_path, "5m")
+        assert cooldown.claim([7, 8], NOON) == [8], "User 7 was marked elsewhere"
+
+        # That stored mark is cached, so user 7 is not looked up again within the window
+        queries = []
+        lookup = cooldown._last_from_db
+
+        def counted_lookup(user_ids):
+            queries.append(list(user_ids))
+            return lookup(user_ids)
+
+        cooldown._last_from_db = counted_lookup
+        assert cooldown.claim([7], NOON + timedelta(minutes=2)) == []
+        assert queries == [[]], f"Expected no lookup for user 7, got {queries}"
+        assert cooldown.claim([7], NOON + timedelta(minutes=5)) == [7], "The stored mark's window has passed"
+        cooldown._last_from_db = lookup
+
+        # A slow lookup for one user doesn't hold up claims for others
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_lookup(user_ids):
+            started.set()
+            finish.wait(5)
+            return lookup(user_ids)
+
+        cooldown._last_from_db = slow_lookup
+        results = []
+        slow = threading.Thread(target=lambda: results.append(cooldown.claim([9], NOON)))
+        slow.start()
+        assert started.wait(5)
+        cooldown._last_from_db = lookup
+        assert cooldown.claim([10], NOON) == [10], "Claims should not wait for another user's lookup"
+        assert cooldown.claim([9], NOON) == [9]
+        finish.set()
+        slow.join()
+        assert results == [[]], "A user claimed during the lookup should not be claimed twice"
+
+        # A failed insert gives the claim back
+        cooldown.release([8])
+        assert cooldown.claim([8], NOON) == [8]
+
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute("EXPLAIN QUERY PLAN SELECT MAX(timestamp) FROM attendance WHERE user_id = 7")
+        plan = " ".join(str(row) for row in c.fetchall())
+        conn.close()
+        assert "idx_attendance_user_timestamp" in plan, f"Lookup should use the index: {plan}"
+
+    print("✓ Cooldown database fallback working")
+
+def main():
+    """Run all cooldown tests"""
+    print("Starting Attendance Cooldown Tests")
+    print("=" * 50)
+
+    try:
+        test_parse_window()
+        test_duration_window()
+        test_day_and_session_windows()
+        test_database_fallback()
+
+        print("=" * 50)
+        print("🎉 All cooldown tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
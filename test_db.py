@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite data-access layer
+Checks schema migrations, WAL mode, pooled concurrent writes and reopening
+"""
+
+import sqlite3
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def test_migrate_legacy_db():
+    """Test that a database created before versioning is upgraded in place"""
+    print("Testing schema migrations...")
+
+    from db import SCHEMA_VERSION, close_pool, get_pool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL, image_path TEXT NOT NULL, embedding TEXT NOT NULL)")
+        conn.execute("CREATE TABLE attendance (id INTEGER PRIMARY KEY, user_id INTEGER, timestamp TEXT)")
+        conn.execute("INSERT INTO users (name, image_path, embedding) VALUES ('Alice', 'a.jpg', '0.1,0.2')")
+        conn.commit()
+        conn.close()
+
+        pool = get_pool(db_path)
+        conn = sqlite3.connect(db_path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        conn.close()
+
+        assert version == SCHEMA_VERSION, f"Expected version {SCHEMA_VERSION}, got {version}"
+        assert {'projected_embedding', 'projection_version'} <= columns, f"Missing columns in {columns}"
+        assert {'idx_attendance_user_timestamp', 'idx_attendance_timestamp'} <= indexes, f"Missing indexes in {indexes}"
+        assert journal == 'wal', f"Expected WAL journal, got {journal}"
+        assert pool.query("SELECT name FROM users") == [('Alice',)], "Existing rows should be kept"
+        assert pool.query("SELECT user_id, source FROM user_embeddings") == [(1, 'enroll')], \
+            "Existing embeddings should become templates"
+        pool.execute("UPDATE users SET embedding = '0.3,0.4' WHERE id = 1")
+        pool.execute("UPDATE users SET name = 'Alicia' WHERE id = 1")
+        assert pool.query("SELECT user_id FROM user_changes") == [(1,)], "Embedding changes should be logged"
+        close_pool(db_path)
+
+    print("✓ Schema migrations working")
+
+def test_concurrent_writes():
+    """Test that many threads can write and read through one pool"""
+    print("Testing pooled concurrent writes...")
+
+    from db import close_pool, get_pool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        pool = get_pool(db_path)
+
+        def mark(user_id):
+            pool.executemany("INSERT INTO attendance (user_id, timestamp) VALUES (?, ?)",
+                             [(user_id, f"2024-01-01 09:00:{i:02d}") for i in range(10)])
+            return pool.query("SELECT COUNT(*) FROM attendance WHERE user_id = ?", (user_id,))[0][0]
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            counts = list(executor.map(mark, range(100)))
+
+        assert counts == [10] * 100, "Every writer should see its own rows"
+        assert pool.query("SELECT COUNT(*) FROM attendance")[0][0] == 1000
+        assert pool._opened <= pool.size, "Pool should not open more than its size"
+
+        # A failed transaction leaves nothing behind
+        try:
+            with pool.transaction() as conn:
+                conn.execute("INSERT INTO attendance (user_id, timestamp) VALUES (1, 'x')")
+                raise RuntimeError("abort")
+        except RuntimeError:
+            pass
+        assert pool.query("SELECT COUNT(*) FROM attendance")[0][0] == 1000, "Aborted insert should roll back"
+        close_pool(db_path)
+
+    print("✓ Pooled concurrent writes working")
+
+def test_recreated_db():
+    """Test that a deleted and recreated database gets a fresh pool"""
+    print("Testing database recreation...")
+
+    from db import close_pool, get_pool, init_db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        init_db(db_path)
+        get_pool(db_path).execute("INSERT INTO attendance (user_id, timestamp) VALUES (1, '2024-01-01 09:00:00')")
+
+        os.remove(db_path)
+        init_db(db_path)
+        assert get_pool(db_path).query("SELECT COUNT(*) FROM attendance")[0][0] == 0, "New database should be empty"
+        close_pool(db_path)
+
+    print("✓ Database recreation working")
+
+def main():
+    """Run all data-access tests"""
+    print("Starting Database Tests")
+    print("=" * 50)
+
+    try:
+        test_migrate_legacy_db()
+        test_concurrent_writes()
+        test_recreated_db()
+
+        print("=" * 50)
+        print("🎉 All database tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Test script for the pluggable face descriptors
+Checks the pixel and LBP descriptors, eye alignment, the DNN loader and re-embedding
+"""
+
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+BOX = (20, 20, 120, 120)
+
+# Smallest Caffe net without weights: average pooling of a 32x32 input down to 3x4x4
+POOLING_PROTOTXT = """name: "pool"
+input: "data"
+input_shape { dim: 1 dim: 3 dim: 32 dim: 32 }
+layer { name: "pool" type: "Pooling" bottom: "data" top: "pool" pooling_param { pool: AVE kernel_size: 8 stride: 8 } }
+"""
+
+def make_face(seed=0):
+    gray = np.random.default_rng(seed).integers(40, 200, (160, 160), dtype=np.uint8)
+    return cv2.GaussianBlur(gray, (5, 5), 0)
+
+def test_pixel_descriptor():
+    """Test that the default descriptor is the original flattened-pixel embedding"""
+    print("Testing pixel descriptor...")
+
+    from descriptors import DescriptorConfig, PixelDescriptor, get_descriptor
+    from recognition import embed_face
+
+    gray = make_face()
+    x, y, w, h = BOX
+    expected = cv2.resize(gray[y:y+h, x:x+w], (100, 100)).flatten().astype(np.float32)
+    expected /= np.linalg.norm(expected)
+
+    descriptor = get_descriptor(DescriptorConfig())
+    assert isinstance(descriptor, PixelDescriptor)
+    assert np.allclose(descriptor.describe(gray, BOX), expected)
+    assert np.allclose(embed_face(gray, BOX, descriptor), expected)
+    assert descriptor.describe_many(gray, []).shape == (0, 10000)
+
+    print("✓ Pixel descriptor working")
+
+def test_lbp_descriptor():
+    """Test LBP histogram size, normalization and lighting invariance"""
+    print("Testing LBP descriptor...")
+
+    from descriptors import DescriptorConfig, get_descriptor
+
+    descriptor = get_descriptor(DescriptorConfig(kind='lbp'))
+    gray = make_face()
+    embedding = descriptor.describe(gray, BOX)
+    assert embedding.shape == (descriptor.dim,) and descriptor.dim < 3000, f"Got {embedding.shape}"
+    assert embedding.dtype == np.float32 and abs(np.linalg.norm(embedding) - 1) < 1e-5
+
+    # A brighter, lower-contrast copy keeps nearly all its LBP codes; another face does not
+    relit = cv2.convertScaleAbs(gray, alpha=0.6, beta=50)
+    assert embedding @ descriptor.describe(relit, BOX) > 0.95
+    assert embedding @ descriptor.describe(make_face(1), BOX) < 0.92
+
+    many = descriptor.describe_many(gray, np.array([BOX, (0, 0, 80, 80)]))
+    assert many.shape == (2, descriptor.dim) and np.allclose(many[0], embedding)
+
+    print("✓ LBP descriptor working")
+
+def test_eye_alignment():
+    """Test that alignment levels a tilted eye pair"""
+    print("Testing eye alignment...")
+
+    from descriptors import EyeAligner
+
+    def eye_heights(face):
+        dark = face < 60
+        half = face.shape[1] // 2
+        return [np.argwhere(part)[:, 0].mean() for part in (dark[:, :half], dark[:, half:])]
+
+    gray = np.full((200, 200), 220, dtype=np.uint8)
+    cv2.circle(gray, (70, 80), 6, 0, -1)
+    cv2.circle(gray, (130, 100), 6, 0, -1)
+    box = (40, 40, 120, 120)
+    eyes = ((30.0, 40.0), (90.0, 60.0))
+
+    aligner = EyeAligner()
+    left, right = eye_heights(aligner.crop(gray, box))
+    assert abs(left - right) > 15, "Without detected eyes the crop should be unchanged"
+    left, right = eye_heights(aligner.crop(gray, box, eyes))
+    assert abs(left - right) < 1.5, f"Eyes should be level after alignment, got {left:.1f} and {right:.1f}"
+    assert aligner.crop(gray, box, eyes).shape == (120, 120)
+
+    print("✓ Eye alignment working")
+
+def test_dnn_descriptor():
+    """Test loading a DNN model from a local file"""
+    print("Testing DNN descriptor...")
+
+    from descriptors import DNNDescriptor, DescriptorConfig, get_descriptor, match_threshold
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = os.path.join(tmp, 'pool.prototxt')
+        with open(model, 'w') as f:
+            f.write(POOLING_PROTOTXT)
+
+        descriptor = DNNDescriptor(DescriptorConfig(kind='dnn', dnn_model=model, dnn_input_size=32))
+        assert descriptor.dim == 48, f"Expected 3x4x4 outputs, got {descriptor.dim}"
+        gray = make_face()
+        boxes = np.array([BOX, (10, 30, 90, 90)])
+        many = descriptor.describe_many(gray, boxes)
+        single = np.stack([descriptor.describe(gray, box) for box in boxes])
+        assert many.shape == (2, 48) and np.allclose(many, single, atol=1e-5)
+
+    for config, error in [(DescriptorConfig(kind='dnn'), ValueError),
+                          (DescriptorConfig(kind='dnn', dnn_model='missing.onnx'), IOError),
+                          (DescriptorConfig(kind='sift'), ValueError)]:
+        try:
+            get_descriptor(config)
+        except error:
+            pass
+        else:
+            raise AssertionError(f"{config} should raise {error.__name__}")
+
+    assert match_threshold(DescriptorConfig(kind='lbp')) == 0.85
+    os.environ['FACE_MATCH_THRESHOLD'] = '0.7'
+    try:
+        assert match_threshold(DescriptorConfig(kind='lbp')) == 0.7
+    finally:
+        del os.environ['FACE_MATCH_THRESHOLD']
+
+    print("✓ DNN descriptor working")
+
+def test_reembed():
+    """Test recomputing stored embeddings with another descriptor"""
+    print("Testing re-embedding...")
+
+    from db import close_pool, get_pool
+    from descriptors import DescriptorConfig, get_descriptor, reembed
+    from embedding_codec import decode_embedding, encode_embedding
+
+    class FixedDetector:
+        def detect(self, gray, last_box=None):
+            return np.array([BOX], dtype=np.int32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        image_path = os.path.join(tmp, 'user_1.jpg')
+        cv2.imwrite(image_path, make_face())
+        projection = os.path.join(tmp, 'attendance.projection.npz')
+        open(projection, 'wb').close()
+
+        pool = get_pool(db_path)
+        pool.executemany("INSERT INTO users (name, image_path, embedding, projected_embedding, projection_version) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         [("Alice", image_path, encode_embedding(np.ones(10000)), b'x', 1),
+                          ("Bob", os.path.join(tmp, 'missing.jpg'), encode_embedding(np.ones(10000)), None, None)])
+
+        lbp = get_descriptor(DescriptorConfig(kind='lbp'))
+        updated, failed = reembed(db_path, lbp, FixedDetector())
+        assert (updated, failed) == ([1], [2]), f"Got {updated}, {failed}"
+
+        rows = pool.query("SELECT embedding, projected_embedding, projection_version FROM users ORDER BY id")
+        assert len(decode_embedding(rows[0][0])) == lbp.dim and rows[0][1:] == (None, None)
+        assert len(decode_embedding(rows[1][0])) == 10000, "Failed rows keep their old embedding"
+        assert not os.path.exists(projection), "The old projection should be removed"
+        close_pool(db_path)
+
+    print("✓ Re-embedding working")
+
+def main():
+    """Run all descriptor tests"""
+    print("Starting Descriptor Tests")
+    print("=" * 50)
+
+    try:
+        test_pixel_descriptor()
+        test_lbp_descriptor()
+        test_eye_alignment()
+        test_dnn_descriptor()
+        test_reembed()
+
+        print("=" * 50)
+        print("🎉 All descriptor tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
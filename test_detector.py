@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the face detector registry
+Checks that cascades are loaded once and parameters come from config
+"""
+
+import numpy as np
+import os
+import sys
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def test_detector_registry():
+    """Test that detectors and cascades are shared per process"""
+    print("Testing detector registry...")
+
+    from detector import get_detector, load_cascade, default_cascade_path
+
+    first = get_detector()
+    second = get_detector()
+    assert first is second, "Detector should be created once per configuration"
+    assert load_cascade(default_cascade_path()) is load_cascade(first.cascade_path), "Cascade should be loaded once"
+
+    faces = first.detect(np.full((200, 200), 128, dtype=np.uint8))
+    assert faces.shape == (0, 4), f"Expected no faces in a flat image, got {faces.shape}"
+
+    # Concurrent detections borrow separate cascades; a new thread reuses a returned one
+    import threading
+    from detector import borrow_cascade
+    with borrow_cascade(first.cascade_path) as outer, borrow_cascade(first.cascade_path) as inner:
+        assert outer is not inner, "Cascades in use should not be shared"
+    borrowed = []
+
+    def borrow():
+        with borrow_cascade(first.cascade_path) as classifier:
+            borrowed.append(classifier)
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    thread.join()
+    assert borrowed[0] in (outer, inner), "A new thread should reuse a parsed cascade"
+
+    print("✓ Detector registry working")
+
+def test_detector_config_from_env():
+    """Test tuning detector parameters through the environment"""
+    print("Testing detector config...")
+
+    from detector import DetectorConfig
+
+    saved = {k: os.environ.get(k) for k in ('FACE_DETECT_SCALE_FACTOR', 'FACE_DETECT_MIN_NEIGHBORS', 'FACE_DETECT_MIN_SIZE')}
+    try:
+        os.environ['FACE_DETECT_SCALE_FACTOR'] = '1.2'
+        os.environ['FACE_DETECT_MIN_NEIGHBORS'] = '6'
+        os.environ['FACE_DETECT_MIN_SIZE'] = '40x50'
+        config = DetectorConfig.from_env()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    assert config.scale_factor == 1.2, f"Expected scale factor 1.2, got {config.scale_factor}"
+    assert config.min_neighbors == 6, f"Expected 6 neighbors, got {config.min_neighbors}"
+    assert config.min_size == (40, 50), f"Expected min size (40, 50), got {config.min_size}"
+
+    defaults = DetectorConfig.from_env()
+    assert (defaults.scale_factor, defaults.min_neighbors, defaults.min_size) == (1.1, 4, (0, 0)), "Unexpected defaults"
+
+    print("✓ Detector config working")
+
+def test_missing_cascade():
+    """Test that a missing cascade file fails loudly"""
+    print("Testing missing cascade...")
+
+    from detector import load_cascade
+
+    try:
+        load_cascade('does_not_exist.xml')
+        assert False, "Loading a missing cascade should raise"
+    except IOError:
+        pass
+
+    print("✓ Missing cascade handling working")
+
+def test_downscaled_and_roi_detection():
+    """Test that boxes found on a downscaled copy or ROI map back to the full frame"""
+    print("Testing downscaled and ROI detection...")
+
+    from detector import DetectorConfig, FaceDetector, default_cascade_path
+
+    detector = FaceDetector(DetectorConfig(cascade_path=default_cascade_path(), max_side=480, roi_margin=0.5))
+    calls = []
+
+    def fake_detect(gray, min_size):
+        calls.append((gray.shape, min_size))
+        return np.array([[100, 50, 60, 60]], dtype=np.int32)
+
+    detector._detect = fake_detect
+    frame = np.zeros((1080, 1920), dtype=np.uint8)
+
+    faces = detector.detect(frame)
+    assert calls[-1][0] == (270, 480), f"Expected detection on a 480px copy, got {calls[-1][0]}"
+    assert faces.tolist() == [[400, 200, 240, 240]], f"Boxes should be scaled back, got {faces.tolist()}"
+
+    faces = detector.detect(frame, last_box=(400, 200, 240, 240))
+    assert calls[-1][0] == (480, 480), f"Expected detection on the expanded ROI, got {calls[-1][0]}"
+    assert calls[-1][1] == (120, 120), f"ROI should search for faces near the last size, got {calls[-1][1]}"
+    assert faces.tolist() == [[280 + 100, 80 + 50, 60, 60]], f"ROI boxes should be offset, got {faces.tolist()}"
+
+    print("✓ Downscaled and ROI detection working")
+
+def main():
+    """Run all detector tests"""
+    print("Starting Detector Tests")
+    print("=" * 50)
+
+    try:
+        test_detector_registry()
+        test_detector_config_from_env()
+        test_missing_cascade()
+        test_downscaled_and_roi_detection()
+
+        print("=" * 50)
+        print("🎉 All detector tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary embedding storage format
+Checks round-trips, legacy TEXT compatibility and in-place migration
+"""
+
+import sqlite3
+import numpy as np
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def test_round_trip():
+    """Test encoding and decoding in every supported precision"""
+    print("Testing embedding round-trip...")
+
+    from embedding_codec import encode_embedding, decode_embedding
+
+    rng = np.random.default_rng(0)
+    embedding = rng.random(10000, dtype=np.float32)
+    embedding /= np.linalg.norm(embedding)
+
+    blob = encode_embedding(embedding)
+    decoded = decode_embedding(blob)
+    assert decoded.dtype == np.float32, "Decoded embedding should be float32"
+    assert np.array_equal(decoded, embedding), "float32 round-trip should be lossless"
+    assert len(blob) == 4 + 4 * 10000, f"Unexpected float32 blob size {len(blob)}"
+
+    decoded16 = decode_embedding(encode_embedding(embedding, 'float16'))
+    assert np.allclose(decoded16, embedding, atol=1e-3), "float16 round-trip drifted too far"
+
+    blob8 = encode_embedding(embedding, 'int8')
+    decoded8 = decode_embedding(blob8)
+    assert len(blob8) == 8 + 10000, f"Unexpected int8 blob size {len(blob8)}"
+    similarity = np.dot(decoded8, embedding) / (np.linalg.norm(decoded8) * np.linalg.norm(embedding))
+    assert similarity > 0.999, f"int8 quantization lost too much, similarity {similarity}"
+
+    # Legacy comma-separated text still decodes
+    legacy = ','.join(map(str, embedding.tolist()))
+    assert np.array_equal(decode_embedding(legacy), embedding), "Legacy text should decode losslessly"
+
+    print("✓ Embedding round-trip working")
+
+def test_migration():
+    """Test in-place migration of legacy TEXT rows"""
+    print("Testing embedding migration...")
+
+    from embedding_codec import migrate_embeddings, decode_embedding, is_binary
+
+    rng = np.random.default_rng(1)
+    embeddings = rng.random((3, 100), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL, image_path TEXT NOT NULL, embedding TEXT NOT NULL)")
+        for i, e in enumerate(embeddings):
+            c.execute("INSERT INTO users (name, image_path, embedding) VALUES (?, ?, ?)",
+                      (f"User {i}", "x.jpg", ','.join(map(str, e.tolist()))))
+        c.execute("INSERT INTO users (name, image_path, embedding) VALUES (?, ?, ?)",
+                  ("Broken", "x.jpg", "test_embedding"))
+        conn.commit()
+        conn.close()
+
+        converted, skipped = migrate_embeddings(db_path)
+        assert converted == 3, f"Expected 3 converted rows, got {converted}"
+        assert len(skipped) == 1, f"Expected 1 skipped row, got {len(skipped)}"
+
+        # Running again is a no-op
+        converted, _ = migrate_embeddings(db_path)
+        assert converted == 0, f"Second migration should convert nothing, got {converted}"
+
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute("SELECT embedding, typeof(embedding) FROM users ORDER BY id LIMIT 3")
+        rows = c.fetchall()
+        conn.close()
+
+    for (value, kind), expected in zip(rows, embeddings):
+        assert kind == 'blob', f"Expected blob storage, got {kind}"
+        assert is_binary(value), "Migrated row should carry the binary header"
+        assert np.array_equal(decode_embedding(value), expected), "Migration should be lossless"
+
+    print("✓ Embedding migration working")
+
+def main():
+    """Run all embedding codec tests"""
+    print("Starting Embedding Codec Tests")
+    print("=" * 50)
+
+    try:
+        test_round_trip()
+        test_migration()
+
+        print("=" * 50)
+        print("🎉 All embedding codec tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
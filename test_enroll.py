@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk enrollment
+Checks batched inserts, photo storage, the failure log, resuming from a checkpoint
+and cleaning up photos of a rolled back batch
+"""
+
+import csv
+import sqlite3
+import cv2
+import numpy as np
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def fake_upload(data):
+    """Stand-in for embed_upload: the same reduced decode, but dark images have no face"""
+    from ingest import decode_image
+
+    image = decode_image(data)
+    if image is None:
+        raise ValueError("Could not decode image")
+    if image.gray.mean() < 10:
+        return None, None
+    embedding = cv2.resize(image.gray, (10, 10)).flatten().astype(np.float32)
+    return None, embedding / np.linalg.norm(embedding)
+
+def write_photos(folder, count, start=0):
+    rng = np.random.default_rng(start)
+    for i in range(start, start + count):
+        image = rng.integers(50, 255, (60, 60, 3), dtype=np.uint8)
+        cv2.imwrite(os.path.join(folder, f"person_{i}.jpg"), image)
+
+def test_enroll_folder():
+    """Test enrolling a folder with a failing photo, then resuming"""
+    print("Testing bulk enrollment...")
+
+    import enroll
+
+    original = enroll.embed_upload
+    enroll.embed_upload = fake_upload
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            photos = os.path.join(tmp, 'photos')
+            images_dir = os.path.join(tmp, 'user_images')
+            db_path = os.path.join(tmp, 'attendance.db')
+            os.makedirs(photos)
+            write_photos(photos, 7)
+            cv2.imwrite(os.path.join(photos, 'nobody.png'), np.zeros((60, 60, 3), dtype=np.uint8))
+            with open(os.path.join(photos, 'broken.jpg'), 'wb') as f:
+                f.write(b'not an image')
+
+            enrolled, failed, skipped = enroll.enroll(photos, db_path, images_dir, workers=0, batch_size=3,
+                                                      log=lambda message: None)
+            assert (enrolled, failed, skipped) == (7, 2, 0), f"Unexpected counts {(enrolled, failed, skipped)}"
+
+            conn = sqlite3.connect(db_path)
+            c = conn.cursor()
+            c.execute("SELECT id, name, image_path FROM users ORDER BY id")
+            users = c.fetchall()
+            conn.close()
+            assert len(users) == 7, f"Expected 7 users, got {len(users)}"
+            assert users[0][1] == "person 0", f"Expected name from file stem, got {users[0][1]}"
+            for user_id, _, image_path in users:
+                assert image_path.endswith(f"user_{user_id}.jpg"), f"Unexpected image path {image_path}"
+                assert os.path.exists(image_path), f"Photo not written for user {user_id}"
+
+            with open(os.path.join(tmp, 'attendance.enroll-failures.csv')) as f:
+                reasons = {os.path.basename(row['path']): row['reason'] for row in csv.DictReader(f)}
+            assert reasons == {'broken.jpg': 'not a decodable image', 'nobody.png': 'no face detected'}, f"Unexpected failures {reasons}"
+
+            # A second run only processes new photos
+            write_photos(photos, 2, start=7)
+            enrolled, failed, skipped = enroll.enroll(photos, db_path, images_dir, workers=0, batch_size=3,
+                                                      log=lambda message: None)
+            assert (enrolled, skipped) == (2, 7), f"Resume should only enroll new photos, got {(enrolled, skipped)}"
+
+            # A batch that rolls back leaves no photos behind
+            from concurrent.futures import ThreadPoolExecutor
+            insert_templates = enroll.insert_templates
+
+            def failing_insert(conn, user_id, embeddings):
+                raise RuntimeError("disk full")
+
+            enroll.insert_templates = failing_insert
+            batch = [("Late", "late.jpg", np.ones((1, 100), dtype=np.float32), b'photo', None)]
+            try:
+                with ThreadPoolExecutor(1) as writer:
+                    enroll.insert_batch(db_path, batch, images_dir, writer, None)
+                raise AssertionError("Expected RuntimeError")
+            except RuntimeError:
+                pass
+            finally:
+                enroll.insert_templates = insert_templates
+            assert not os.path.exists(os.path.join(images_dir, "user_10.jpg")), "Rolled back photos should be deleted"
+    finally:
+        enroll.embed_upload = original
+
+    print("✓ Bulk enrollment working")
+
+def test_manifest():
+    """Test reading a CSV manifest"""
+    print("Testing enrollment manifest...")
+
+    from enroll import list_jobs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = os.path.join(tmp, 'staff.csv')
+        with open(manifest, 'w') as f:
+            f.write("name,path\nJane Doe,photos/jane.jpg\nJohn Roe,/abs/john.png\n")
+        jobs = list_jobs(manifest)
+
+    assert jobs[0] == ("Jane Doe", os.path.join(tmp, 'photos', 'jane.jpg')), f"Unexpected job {jobs[0]}"
+    assert jobs[1] == ("John Roe", "/abs/john.png"), f"Unexpected job {jobs[1]}"
+
+    print("✓ Enrollment manifest working")
+
+def main():
+    """Run all enrollment tests"""
+    print("Starting Enrollment Tests")
+    print("=" * 50)
+
+    try:
+        test_enroll_folder()
+        test_manifest()
+
+        print("=" * 50)
+        print("🎉 All enrollment tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-memory embedding gallery
+Checks vectorized matching against the original per-user cosine loop and
+that rows of another descriptor's dimension are skipped
+"""
+
+import sqlite3
+import numpy as np
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE users (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    image_path TEXT NOT NULL,
+                    embedding TEXT NOT NULL
+                )''')
+    for name, embedding_str in rows:
+        c.execute("INSERT INTO users (name, image_path, embedding) VALUES (?, ?, ?)",
+                  (name, f"{name}.jpg", embedding_str))
+    conn.commit()
+    conn.close()
+
+def test_gallery_load_and_match():
+    """Test loading from the users table and matching the best user"""
+    print("Testing gallery load and match...")
+
+    from gallery import Gallery
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.random((5, 64), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        rows = [(f"User {i}", ','.join(map(str, e.tolist()))) for i, e in enumerate(embeddings)]
+        rows.append(("Broken", "test_embedding"))
+        make_db(db_path, rows)
+
+        gallery = Gallery.from_db(db_path, dim=64)
+
+    assert len(gallery) == 5, f"Expected 5 users, got {len(gallery)}"
+    assert gallery.matrix.dtype == np.float32, "Gallery matrix should be float32"
+    assert gallery.matrix.flags['C_CONTIGUOUS'], "Gallery matrix should be contiguous"
+
+    # Compare with the original per-user loop
+    query = embeddings[3] + rng.random(64, dtype=np.float32) * 0.01
+    best_id, best_similarity = None, 0.0
+    for user_id, stored in zip(gallery.ids, embeddings):
+        similarity = np.dot(query, stored) / (np.linalg.norm(query) * np.linalg.norm(stored))
+        if similarity > 0.8 and similarity > best_similarity:
+            best_id, best_similarity = user_id, similarity
+
+    result = gallery.match(query)
+    assert result is not None, "Expected a match"
+    assert result[0] == best_id, f"Expected user {best_id}, got {result[0]}"
+    assert result[1] == "User 3", f"Expected 'User 3', got {result[1]}"
+    assert abs(result[2] - best_similarity) < 1e-5, "Similarity should match the loop"
+
+    print("✓ Gallery load and match working")
+
+def test_gallery_add_remove():
+    """Test patching the gallery on register and delete"""
+    print("Testing gallery add/remove...")
+
+    from gallery import Gallery
+
+    gallery = Gallery()
+    assert gallery.match(np.ones(4)) is None, "Empty gallery should not match"
+
+    gallery.add(1, "Alice", np.array([1.0, 0.0, 0.0, 0.0]))
+    gallery.add(2, "Bob", np.array([0.0, 1.0, 0.0, 0.0]))
+    assert len(gallery) == 2, f"Expected 2 users, got {len(gallery)}"
+
+    result = gallery.match(np.array([0.1, 0.9, 0.0, 0.0]))
+    assert result[:2] == (2, "Bob"), f"Expected Bob, got {result}"
+
+    # Below the threshold nobody is recognized
+    assert gallery.match(np.array([0.0, 0.0, 1.0, 0.0])) is None, "Orthogonal face should not match"
+
+    assert gallery.remove(2), "Bob should have been removed"
+    assert not gallery.remove(2), "Bob is already gone"
+    assert gallery.match(np.array([0.1, 0.9, 0.0, 0.0])) is None, "Removed user should not match"
+
+    print("✓ Gallery add/remove working")
+
+def test_mixed_dimensions():
+    """Test that rows of another dimension don't outvote the descriptor's"""
+    print("Testing mixed-dimension databases...")
+
+    from descriptors import get_descriptor
+    from gallery import Gallery
+
+    dim = get_descriptor().dim
+    rng = np.random.default_rng(1)
+    real = rng.random((2, dim), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        # Like the shipped attendance.db: two 3-dim test rows and two real users
+        make_db(db_path, [("Test 1", "0.1,0.2,0.3"), ("Test 2", "0.3,0.2,0.1")] +
+                [(f"Real {i}", ','.join(map(str, e.tolist()))) for i, e in enumerate(real)])
+
+        for use_file in (False, True):
+            gallery = Gallery.from_db(db_path, use_file=use_file)
+            assert list(gallery.names) == ["Real 0", "Real 1"] and gallery.dim == dim, \
+                f"Expected the {dim}-dim users, got {list(gallery.names)} ({gallery.dim} dims)"
+            assert gallery.match(real[1])[1] == "Real 1"
+            gallery.add(99, "New", rng.random(dim, dtype=np.float32))
+            assert len(gallery) == 3
+
+    print("✓ Mixed-dimension databases working")
+
+def main():
+    """Run all gallery tests"""
+    print("Starting Gallery Tests")
+    print("=" * 50)
+
+    try:
+        test_gallery_load_and_match()
+        test_gallery_add_remove()
+        test_mixed_dimensions()
+
+        print("=" * 50)
+        print("🎉 All gallery tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test script for the memory-mapped gallery file
+Checks loading from the file, catching up with the users table, appends, tombstones and compaction
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+DIM = 32
+
+def unit_rows(rng, n):
+    matrix = rng.standard_normal((n, DIM)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def insert_users(db_path, first_id, matrix):
+    from db import get_pool
+    from embedding_codec import encode_embedding
+
+    get_pool(db_path).executemany("INSERT INTO users (id, name, image_path, embedding) VALUES (?, ?, ?, ?)",
+                                  [(first_id + i, f"User {first_id + i}", '', encode_embedding(v))
+                                   for i, v in enumerate(matrix)])
+
+def test_load_and_catch_up():
+    """Test that galleries map the file and pick up changes made by others"""
+    print("Testing gallery file load and catch-up...")
+
+    from db import close_pool, get_pool
+    from embedding_codec import encode_embedding
+    from gallery import Gallery
+    from gallery_file import GalleryFile, gallery_file_path
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        matrix = unit_rows(rng, 50)
+        insert_users(db_path, 1, matrix)
+
+        from_table = Gallery.from_db(db_path, use_file=False, dim=DIM)
+        gallery = Gallery.from_db(db_path, dim=DIM)
+        gallery_file = GalleryFile(gallery_file_path(db_path), dim=DIM)
+        assert os.path.exists(gallery_file.path), "Loading should write the gallery file"
+        assert not gallery.matrix.flags.writeable, "The matrix should be mapped read-only from the file"
+        assert np.array_equal(gallery.ids, from_table.ids) and np.allclose(gallery.matrix, from_table.matrix)
+        assert list(gallery.names) == list(from_table.names)
+        assert gallery.match(matrix[7])[:2] == (8, "User 8")
+
+        # Another process adds, updates and deletes users directly
+        insert_users(db_path, 51, unit_rows(rng, 2))
+        replacement = unit_rows(rng, 1)[0]
+        get_pool(db_path).execute("UPDATE users SET embedding = ? WHERE id = 8", (encode_embedding(replacement),))
+        get_pool(db_path).execute("DELETE FROM users WHERE id = 3")
+        assert gallery_file.sync(db_path, None) == 'updated'
+        header = gallery_file.read_header()
+        assert (header['rows'], header['tombstones']) == (53, 2), f"Unexpected header {header}"
+
+        reloaded = Gallery.from_db(db_path, dim=DIM)
+        header = gallery_file.read_header()
+        assert header['tombstones'] == 0 and header['rows'] == 51, "Loading should compact tombstones"
+        assert len(reloaded) == 51 and 3 not in reloaded and 52 in reloaded
+        assert reloaded.match(replacement)[0] == 8 and reloaded.match(matrix[7]) is None
+        close_pool(db_path)
+
+    print("✓ Gallery file load and catch-up working")
+
+def test_append_on_register():
+    """Test that adding a user appends them to the file in place"""
+    print("Testing gallery file appends...")
+
+    from db import close_pool
+    from gallery import Gallery
+    from gallery_file import MIN_CAPACITY, GalleryFile, gallery_file_path
+
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        insert_users(db_path, 1, unit_rows(rng, 10))
+        gallery = Gallery.from_db(db_path, dim=DIM)
+        gallery_file = GalleryFile(gallery_file_path(db_path), dim=DIM)
+        inode = os.stat(gallery_file.path).st_ino
+
+        vector = unit_rows(rng, 1)
+        insert_users(db_path, 11, vector)
+        gallery.add(11, "User 11", vector[0])
+        header = gallery_file.read_header()
+        assert header['rows'] == 11 and os.stat(gallery_file.path).st_ino == inode, "Expected an in-place append"
+        ids, matrix = gallery_file.arrays()
+        assert ids[-1] == 11 and np.allclose(matrix[-1], vector[0])
+
+        # Past the capacity the file is rewritten with room to grow
+        extra = unit_rows(rng, MIN_CAPACITY)
+        insert_users(db_path, 12, extra)
+        gallery.add(12, "User 12", extra[0])
+        header = gallery_file.read_header()
+        assert header['rows'] == 11 + MIN_CAPACITY and header['capacity'] >= 2 * header['rows']
+        assert len(Gallery.from_db(db_path, dim=DIM)) == 11 + MIN_CAPACITY
+        close_pool(db_path)
+
+    print("✓ Gallery file appends working")
+
+def test_rebuild_and_compaction():
+    """Test that stale or foreign files are rebuilt and tombstones compacted"""
+    print("Testing gallery file rebuilds...")
+
+    from db import close_pool, get_pool
+    from gallery import Gallery
+    from gallery_file import GalleryFile, gallery_file_path, open_gallery_file
+
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        matrix = unit_rows(rng, 20)
+        insert_users(db_path, 1, matrix)
+        gallery_file = GalleryFile(gallery_file_path(db_path), dim=DIM)
+        with gallery_file.locked():
+            assert gallery_file.sync(db_path, None) == 'rebuilt'
+            assert gallery_file.sync(db_path, None) == 'current'
+
+        # Deleting more than a quarter of the rows compacts during the sync
+        get_pool(db_path).executemany("DELETE FROM users WHERE id = ?", [(i,) for i in range(1, 7)])
+        assert gallery_file.sync(db_path, None) == 'compacted'
+        assert gallery_file.read_header()['rows'] == 14
+
+        # A corrupt file is rebuilt rather than trusted
+        with open(gallery_file.path, 'r+b') as f:
+            f.write(b'XXXX')
+        assert gallery_file.read_header() is None
+        assert len(Gallery.from_db(db_path, dim=DIM)) == 14
+
+        # A half-size file converts to float32 when loaded
+        half = GalleryFile(gallery_file.path, 'float16', DIM)
+        assert half.sync(db_path, None) == 'rebuilt' and half.read_header()['dtype'] == 'float16'
+        _, ids, loaded = open_gallery_file(db_path, None, 'float16', DIM)
+        assert loaded.dtype == np.float32 and np.allclose(loaded, matrix[6:], atol=1e-3)
+        close_pool(db_path)
+
+    print("✓ Gallery file rebuilds working")
+
+def main():
+    """Run all gallery file tests"""
+    print("Starting Gallery File Tests")
+    print("=" * 50)
+
+    try:
+        test_load_and_catch_up()
+        test_append_on_register()
+        test_rebuild_and_compaction()
+
+        print("=" * 50)
+        print("🎉 All gallery file tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for decode-once upload ingestion
+Checks header parsing, reduced grayscale decoding and full-resolution colour decoding
+"""
+
+import io
+import sys
+
+import cv2
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def make_photo(width, height, ext='.jpg'):
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.dstack([x * 255 // width, y * 255 // height, (x + y) % 256]).astype(np.uint8)
+    return image, cv2.imencode(ext, image)[1].tobytes()
+
+def test_image_size():
+    """Test reading dimensions from JPEG and PNG headers"""
+    print("Testing header parsing...")
+
+    from ingest import image_size
+
+    assert image_size(make_photo(1920, 1080)[1]) == (1920, 1080)
+    assert image_size(make_photo(333, 222, '.png')[1]) == (333, 222)
+    assert image_size(make_photo(64, 48, '.bmp')[1]) is None, "Unparsed formats should give None"
+    assert image_size(b"not an image") is None
+
+    print("✓ Header parsing working")
+
+def test_reduced_decode():
+    """Test that large photos are decoded once to reduced grayscale"""
+    print("Testing reduced grayscale decoding...")
+
+    from ingest import decode_image
+
+    image, data = make_photo(3840, 2160)
+    upload = io.BytesIO(data)
+    decoded = decode_image(upload.getbuffer(), max_side=640)
+    assert decoded.gray.shape == (540, 960), f"Got {decoded.gray.shape}"
+
+    # Small photos and max_side=0 are decoded at full size
+    assert decode_image(make_photo(640, 480)[1], max_side=640).gray.shape == (480, 640)
+    assert decode_image(data, max_side=0).gray.shape == (2160, 3840)
+
+    # Formats without a parsed header are shrunk after decoding
+    bmp = decode_image(make_photo(1600, 1200, '.bmp')[1], max_side=640)
+    assert bmp.gray.shape == (600, 800), f"Got {bmp.gray.shape}"
+
+    assert decode_image(b"not an image") is None
+    assert decode_image(b"") is None
+
+    print("✓ Reduced grayscale decoding working")
+
+def test_color_and_recognition():
+    """Test the full-resolution colour decode and DecodedImage recognition"""
+    print("Testing colour decoding and recognition input...")
+
+    from ingest import decode_color, decode_image
+    from recognition import extract_face_embedding
+
+    image, data = make_photo(1920, 1080, '.png')
+    decoded = decode_image(data, max_side=640)
+    assert np.array_equal(decode_color(data), image), "Colour should be the lossless full-resolution image"
+
+    class FixedDetector:
+        def __init__(self):
+            self.seen = None
+
+        def detect(self, gray, last_box=None):
+            self.seen = gray.shape
+            return np.array([[10, 10, 100, 100]], dtype=np.int32)
+
+    detector = FixedDetector()
+    embedding = extract_face_embedding(decoded, detector)
+    assert detector.seen == decoded.gray.shape, "Detection should run on the reduced gray image"
+    assert embedding.shape == (10000,) and abs(np.linalg.norm(embedding) - 1) < 1e-5
+
+    print("✓ Colour decoding and recognition input working")
+
+def main():
+    """Run all ingestion tests"""
+    print("Starting Ingestion Tests")
+    print("=" * 50)
+
+    try:
+        test_image_size()
+        test_reduced_decode()
+        test_color_and_recognition()
+
+        print("=" * 50)
+        print("🎉 All ingestion tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
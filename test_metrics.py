@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for hot-path metrics
+Checks stage timers, counters, Prometheus output and on-demand profiling
+"""
+
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+class FixedDetector:
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detect(self, gray, last_box=None):
+        return np.array(self.faces, dtype=np.int32).reshape(-1, 4)
+
+def test_timers_and_counters():
+    """Test histograms, rolling quantiles and counters"""
+    print("Testing timers and counters...")
+
+    from metrics import BUCKETS, Metrics
+
+    metrics = Metrics(window=4)
+    for seconds in [0.0002, 0.003, 0.003, 0.2, 10.0]:
+        metrics.observe('detect', seconds)
+    with metrics.stage('match'):
+        time.sleep(0.001)
+    metrics.count('matches', 3)
+    metrics.count('rejects', 0)
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'matches': 3}
+    detect = snapshot['stages']['detect']
+    assert detect['count'] == 5 and abs(detect['p50_ms'] - 200) < 1e-6, "Quantiles cover the last 4 calls"
+    assert snapshot['stages']['match']['mean_ms'] >= 1
+
+    text = metrics.render([('gallery_users', 'gauge', "Users", 7)])
+    assert '# TYPE face_stage_seconds histogram' in text
+    assert 'face_stage_seconds_bucket{stage="detect",le="0.0005"} 1' in text
+    assert 'face_stage_seconds_bucket{stage="detect",le="0.005"} 3' in text
+    assert f'face_stage_seconds_bucket{{stage="detect",le="{BUCKETS[-1]!r}"}} 4' in text
+    assert 'face_stage_seconds_bucket{stage="detect",le="+Inf"} 5' in text
+    assert 'face_stage_seconds_count{stage="detect"} 5' in text
+    assert 'face_stage_recent_seconds_count{stage="detect"} 4' in text
+    assert 'face_matches_total 3' in text and 'face_no_face_total 0' in text
+    assert 'face_gallery_users 7' in text and text.endswith('\n')
+
+    disabled = Metrics(enabled=False)
+    with disabled.stage('detect'):
+        pass
+    disabled.count('matches')
+    assert disabled.snapshot() == {'stages': {}, 'counters': {}}
+
+    print("✓ Timers and counters working")
+
+def test_recognition_is_instrumented():
+    """Test that the shared recognition path feeds the process-wide metrics"""
+    print("Testing recognition instrumentation...")
+
+    from gallery import Gallery
+    from metrics import METRICS
+    from recognition import embed_upload, extract_face_embeddings
+    from upload_cache import UploadCache
+
+    METRICS.reset()
+    data = cv2.imencode('.png', np.random.default_rng(0).integers(0, 255, (120, 120), dtype=np.uint8))[1].tobytes()
+    cache = UploadCache()
+    detector = FixedDetector([[10, 10, 80, 80]])
+    _, embedding = embed_upload(data, detector, cache=cache)
+    embed_upload(data, detector, cache=cache)
+    embed_upload(data, FixedDetector([]))
+    extract_face_embeddings(np.zeros((120, 120), dtype=np.uint8), FixedDetector([[0, 0, 50, 50], [60, 60, 50, 50]]))
+
+    gallery = Gallery([1], ["Alice"], embedding[None, :])
+    gallery.match_many(np.stack([embedding, -embedding]))
+
+    snapshot = METRICS.snapshot()
+    counters = snapshot['counters']
+    assert counters == {'upload_cache_misses': 1, 'upload_cache_hits': 1, 'faces_detected': 3, 'no_face': 1,
+                        'matches': 1, 'rejects': 1}, f"Unexpected counters {counters}"
+    counts = {name: stats['count'] for name, stats in snapshot['stages'].items()}
+    assert counts == {'decode': 2, 'detect': 3, 'quality': 1, 'embed': 2, 'match': 1}, f"Unexpected stage counts {counts}"
+
+    print("✓ Recognition instrumentation working")
+
+def test_profile_and_server():
+    """Test on-demand profiling and the standalone /metrics server"""
+    print("Testing profiling and metrics server...")
+
+    import pstats
+    from metrics import Metrics, profile, serve
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with profile('attendance', directory=tmp) as captured:
+            sorted(np.random.default_rng(0).random(1000))
+        assert captured['path'].endswith('-attendance.prof') and os.path.dirname(captured['path']) == tmp
+        assert pstats.Stats(captured['path']).total_calls > 0
+
+    metrics = Metrics()
+    metrics.count('registrations')
+    server = serve(0, metrics=metrics)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as res:
+            assert res.headers['Content-Type'].startswith('text/plain')
+            assert 'face_registrations_total 1' in res.read().decode()
+        try:
+            urllib.request.urlopen(f"{url}/other")
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+        else:
+            raise AssertionError("Only /metrics should be served")
+    finally:
+        server.shutdown()
+
+    print("✓ Profiling and metrics server working")
+
+def main():
+    """Run all metrics tests"""
+    print("Starting Metrics Tests")
+    print("=" * 50)
+
+    try:
+        test_timers_and_counters()
+        test_recognition_is_instrumented()
+        test_profile_and_server()
+
+        print("=" * 50)
+        print("🎉 All metrics tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for the PCA/LDA embedding projection
+Checks fitting, persistence, re-projection on refit, projected-only storage and
+projected matching
+"""
+
+import sqlite3
+import numpy as np
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def synthetic_embeddings(n, dim, seed=0):
+    """Low-rank raw embeddings plus noise, like aligned face crops"""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((40, dim)).astype(np.float32)
+    matrix = rng.standard_normal((n, 40)).astype(np.float32) @ basis
+    matrix += 0.1 * rng.standard_normal((n, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def make_db(path, matrix):
+    from embedding_codec import encode_embedding
+
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL, image_path TEXT NOT NULL, embedding TEXT NOT NULL)")
+    for i, e in enumerate(matrix):
+        c.execute("INSERT INTO users (name, image_path, embedding) VALUES (?, ?, ?)",
+                  (f"User {i + 1}", "x.jpg", encode_embedding(e)))
+    conn.commit()
+    conn.close()
+
+def test_fit_and_transform():
+    """Test PCA and LDA fitting and the projected output"""
+    print("Testing projection fit...")
+
+    from projection import Projection
+
+    matrix = synthetic_embeddings(150, 1000)
+    projection = Projection.fit(matrix, dims=64)
+    projected = projection.transform(matrix)
+    assert projected.shape == (150, 64), f"Expected (150, 64), got {projected.shape}"
+    assert np.allclose(np.linalg.norm(projected, axis=1), 1.0, atol=1e-5), "Projected rows should be normalized"
+    assert projection.transform(matrix[0]).shape == (64,), "Single embeddings should stay 1-D"
+
+    # LDA needs repeated identities
+    try:
+        Projection.fit(matrix, dims=64, kind='lda', labels=list(range(150)))
+        assert False, "LDA with one sample per user should be rejected"
+    except ValueError:
+        pass
+    labels = [i // 2 for i in range(150)]
+    lda = Projection.fit(matrix, dims=64, kind='lda', labels=labels)
+    assert lda.dims == 64, f"Expected 64 LDA dims, got {lda.dims}"
+
+    print("✓ Projection fit working")
+
+def test_refit_and_gallery():
+    """Test the versioned model, stored projections and projected matching"""
+    print("Testing projection refit...")
+
+    from gallery import Gallery
+    from projection import refit_projection, load_projection, remove_projection
+
+    matrix = synthetic_embeddings(120, 1000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        make_db(db_path, matrix)
+
+        raw_gallery = Gallery.from_db(db_path, dim=1000)
+        assert raw_gallery.dim == 1000, "Without a model the gallery holds raw embeddings"
+
+        first = refit_projection(db_path, dims=64)
+        assert first.version == 1, f"Expected version 1, got {first.version}"
+        second = refit_projection(db_path, dims=96)
+        assert second.version == 2, f"Expected version 2, got {second.version}"
+        assert load_projection(db_path).dims == 96, "The latest model should be active"
+
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM users WHERE projection_version = 2")
+        assert c.fetchone()[0] == 120, "Every row should be re-projected by the refit"
+        # Simulate a row written before the refit
+        c.execute("UPDATE users SET projection_version = 1 WHERE id = 5")
+        conn.commit()
+        conn.close()
+
+        gallery = Gallery.from_db(db_path)
+        assert gallery.dim == 96, f"Expected a 96-dim gallery, got {gallery.dim}"
+        assert len(gallery) == 120, f"Expected 120 users, got {len(gallery)}"
+
+        noisy = matrix[4] + 0.01 * np.random.default_rng(1).standard_normal(1000).astype(np.float32)
+        result = gallery.match(noisy)
+        assert result is not None and result[0] == 5, f"Expected user 5, got {result}"
+
+        gallery.add(999, "New User", matrix[10])
+        assert gallery.match(matrix[10], threshold=0.99)[0] in (11, 999), "Raw embeddings are projected on add"
+
+        # LDA is fitted on the users' templates, several per person
+        from db import get_pool
+        from templates import insert_templates
+        rng = np.random.default_rng(2)
+        with get_pool(db_path).transaction() as conn:
+            for user_id, e in enumerate(matrix, start=1):
+                insert_templates(conn, user_id, e + 0.05 * rng.standard_normal((2, 1000)).astype(np.float32))
+        lda = refit_projection(db_path, dims=64, kind='lda')
+        assert lda.kind == 'lda' and lda.dims == 64 and lda.version == 3, f"Unexpected model {lda.kind} {lda.dims}"
+        result = Gallery.from_db(db_path).match(noisy)
+        assert result is not None and result[0] == 5, f"Expected user 5 after the LDA refit, got {result}"
+
+        # Users keep only the projected vector; the raw one comes back from the templates
+        pool = get_pool(db_path)
+        raw_bytes, projected_bytes = pool.query("SELECT SUM(length(embedding)), SUM(length(projected_embedding)) "
+                                                "FROM users")[0]
+        assert raw_bytes == 0 and 0 < projected_bytes < 1000 * 4 * 120 / 10, f"Got {raw_bytes}, {projected_bytes}"
+        remove_projection(db_path)
+        assert load_projection(db_path) is None
+        result = Gallery.from_db(db_path, dim=1000).match(noisy)
+        assert result is not None and result[0] == 5, f"Expected user 5 after removing the model, got {result}"
+
+    print("✓ Projection refit working")
+
+def main():
+    """Run all projection tests"""
+    print("Starting Projection Tests")
+    print("=" * 50)
+
+    try:
+        test_fit_and_transform()
+        test_refit_and_gallery()
+
+        print("=" * 50)
+        print("🎉 All projection tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
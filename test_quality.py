@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the face quality gate
+Checks the size, blur, exposure and pose checks, best-face selection and rejection reasons
+"""
+
+import pickle
+import sys
+
+import cv2
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+class FixedDetector:
+    """Stand-in detector returning fixed boxes"""
+
+    def __init__(self, boxes):
+        self.boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+    def detect(self, gray, last_box=None):
+        return self.boxes
+
+def textured(seed, size=200):
+    """Sharp, mid-gray, left/right symmetric test image"""
+    half = np.random.default_rng(seed).integers(40, 220, (size, size // 2), dtype=np.uint8)
+    return np.hstack([half, half[:, ::-1]])
+
+def test_checks():
+    """Test each check and the reason it reports"""
+    print("Testing quality checks...")
+
+    from quality import QualityConfig, assess
+
+    gray = textured(0)
+    quality = assess(gray, (0, 0, 200, 200))
+    assert quality.passed and quality.size == 200 and quality.symmetry > 0.99, f"Expected a pass, got {quality}"
+
+    cases = [
+        ('too_small', gray, (0, 0, 30, 30)),
+        ('blurry', cv2.GaussianBlur(gray, (0, 0), 6), (0, 0, 200, 200)),
+        ('too_dark', (gray // 8).astype(np.uint8), (0, 0, 200, 200)),
+        ('too_bright', np.clip(gray.astype(np.int32) + 150, 0, 255).astype(np.uint8), (0, 0, 200, 200)),
+        ('low_contrast', np.full_like(gray, 128) + (gray > 128).astype(np.uint8) * 10, (0, 0, 200, 200)),
+    ]
+    for reason, image, box in cases:
+        quality = assess(image, box)
+        assert quality.reason == reason, f"Expected {reason}, got {quality.reason} ({quality})"
+        assert quality.message and not quality.passed
+
+    # Pose is only checked when a minimum symmetry is configured
+    lopsided = np.random.default_rng(1).integers(40, 220, (200, 200), dtype=np.uint8)
+    assert assess(lopsided, (0, 0, 200, 200)).passed
+    strict = QualityConfig(min_symmetry=0.3)
+    assert assess(lopsided, (0, 0, 200, 200), strict).reason == 'not_frontal'
+    assert assess(gray, (0, 0, 200, 200), strict).passed
+
+    print("✓ Quality checks working")
+
+def test_select_face():
+    """Test that the largest passing face is chosen and rejections carry a reason"""
+    print("Testing face selection...")
+
+    from metrics import METRICS
+    from quality import FaceRejected, QualityConfig, select_face
+    from recognition import detect_face
+
+    gray = np.zeros((400, 400), dtype=np.uint8)
+    gray[:200, :200] = textured(2)
+    gray[200:, 200:] = cv2.GaussianBlur(textured(3), (0, 0), 6)
+
+    # The bigger face is blurred, so the smaller sharp one wins over the detector's order
+    boxes = [(10, 10, 60, 60), (200, 200, 200, 200), (0, 0, 200, 200)]
+    box, quality = select_face(gray, boxes)
+    assert box == (0, 0, 200, 200) and quality.passed, f"Unexpected choice {box}"
+    assert select_face(gray, boxes, QualityConfig(enabled=False)) == ((200, 200, 200, 200), None)
+
+    METRICS.reset()
+    session = {}
+    try:
+        detect_face(gray, FixedDetector([(200, 200, 200, 200), (10, 10, 20, 20)]), session)
+        raise AssertionError("Expected FaceRejected")
+    except FaceRejected as e:
+        assert e.reason == 'blurry' and "blurry" in str(e), f"Expected the largest face's reason, got {e}"
+        copy = pickle.loads(pickle.dumps(e))
+        assert copy.reason == 'blurry' and str(copy) == str(e), "Rejections should cross process boundaries"
+    assert 'last_face_box' not in session
+    counters = METRICS.snapshot()['counters']
+    assert counters.get('quality_rejects') == 1 and counters.get('quality_blurry') == 1, f"Got {counters}"
+    assert METRICS.snapshot()['stages']['quality']['count'] == 1
+
+    assert detect_face(gray, FixedDetector(boxes), session) == (0, 0, 200, 200)
+    assert session['last_face_box'] == (0, 0, 200, 200)
+
+    print("✓ Face selection working")
+
+def main():
+    """Run all quality gate tests"""
+    print("Starting Quality Gate Tests")
+    print("=" * 50)
+
+    try:
+        test_checks()
+        test_select_face()
+
+        print("=" * 50)
+        print("🎉 All quality gate tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for the Records page queries
+Checks SQL filtering, pagination, aggregations and chunked exports
+"""
+
+import csv
+import io
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def make_db(tmp):
+    """Three users; Alice every day, Bob on two days, Carol never"""
+    from db import get_pool, init_db
+
+    db_path = os.path.join(tmp, 'attendance.db')
+    init_db(db_path)
+    pool = get_pool(db_path)
+    pool.executemany("INSERT INTO users (id, name, image_path, embedding) VALUES (?, ?, '', '')",
+                     [(1, "Alice"), (2, "Bob"), (3, "Carol")])
+    rows = []
+    for day in range(1, 5):
+        rows.append((1, f"2024-01-0{day} 09:00:00", "lab"))
+        rows.append((1, f"2024-01-0{day} 17:30:00", "lab"))
+    rows += [(2, "2024-01-02 10:00:00", "office"), (2, "2024-01-03 11:00:00", "office")]
+    pool.executemany("INSERT INTO attendance (user_id, timestamp, site) VALUES (?, ?, ?)", rows)
+    return db_path
+
+def test_filters_and_pages():
+    """Test date, user and site filters with pagination"""
+    print("Testing filtered pagination...")
+
+    from records import RecordFilter, count_records, fetch_records, list_sites
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_db(tmp)
+        everything = RecordFilter()
+        assert count_records(db_path, everything) == 10
+
+        jan2_3 = RecordFilter("2024-01-02", "2024-01-03")
+        assert count_records(db_path, jan2_3) == 6, "End date should be inclusive"
+        assert count_records(db_path, RecordFilter(user_id=2)) == 2
+        assert count_records(db_path, RecordFilter(site="lab")) == 8
+        assert list_sites(db_path) == ["lab", "office"]
+
+        first = fetch_records(db_path, everything, limit=4, offset=0)
+        second = fetch_records(db_path, everything, limit=4, offset=4)
+        assert first[0] == ("Alice", "2024-01-04 17:30:00", "lab"), f"Newest record should come first, got {first[0]}"
+        assert len(first) == 4 and len(second) == 4 and not set(first) & set(second), "Pages should not overlap"
+
+    print("✓ Filtered pagination working")
+
+def test_aggregations():
+    """Test daily counts, first-in/last-out and attendance percentage"""
+    print("Testing aggregations...")
+
+    from records import RecordFilter, attendance_rates, daily_counts, first_last
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_db(tmp)
+
+        daily = daily_counts(db_path, RecordFilter())
+        assert daily[1] == ("2024-01-02", 3, 2), f"Unexpected daily row {daily[1]}"
+
+        rows = first_last(db_path, RecordFilter(user_id=1), limit=10)
+        assert rows[0] == ("2024-01-04", "Alice", "2024-01-04 09:00:00", "2024-01-04 17:30:00", 2), f"Got {rows[0]}"
+
+        rates = {row[0]: row[1:] for row in attendance_rates(db_path, RecordFilter())}
+        assert rates["Alice"] == (4, 4, 100.0), f"Alice: {rates['Alice']}"
+        assert rates["Bob"] == (2, 4, 50.0), f"Bob: {rates['Bob']}"
+        assert rates["Carol"] == (0, 4, 0.0), "Users who never attended should be listed at 0%"
+
+        # A user filter narrows the rows, not the working days
+        only_bob = attendance_rates(db_path, RecordFilter(user_id=2))
+        assert only_bob == [("Bob", 2, 4, 50.0)], f"Got {only_bob}"
+
+    print("✓ Aggregations working")
+
+def test_stamp_and_exports():
+    """Test cache invalidation stamp and chunked CSV/Parquet exports"""
+    print("Testing data stamp and exports...")
+
+    from batch_attendance import record_attendance
+    from records import RecordFilter, data_stamp, parquet_available, write_csv, write_parquet
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = make_db(tmp)
+        stamp = data_stamp(db_path)
+        assert data_stamp(db_path) == stamp, "Stamp should be stable without writes"
+        record_attendance(db_path, [3], "2024-01-05 08:00:00")
+        assert data_stamp(db_path) != stamp, "An insert should change the stamp"
+
+        out = io.StringIO()
+        assert write_csv(db_path, RecordFilter(site="lab"), out, chunk_size=3) == 8
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        assert rows[0] == ["name", "timestamp", "site"] and len(rows) == 9, f"Unexpected CSV: {rows[:2]}"
+        assert rows[1] == ["Alice", "2024-01-01 09:00:00", "lab"], "Export should be in timestamp order"
+
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            assert not parquet_available(), "The Records page should not offer Parquet"
+            print("  (pyarrow not installed, skipping Parquet export)")
+        else:
+            assert parquet_available()
+            path = os.path.join(tmp, 'export.parquet')
+            assert write_parquet(db_path, RecordFilter(), path, chunk_size=4) == 11
+            parquet = pq.ParquetFile(path)
+            assert parquet.metadata.num_rows == 11
+            assert parquet.metadata.num_row_groups == 3, "Each chunk should be its own row group"
+
+    print("✓ Data stamp and exports working")
+
+def main():
+    """Run all records tests"""
+    print("Starting Records Tests")
+    print("=" * 50)
+
+    try:
+        test_filters_and_pages()
+        test_aggregations()
+        test_stamp_and_exports()
+
+        print("=" * 50)
+        print("🎉 All records tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for the micro-batching match scheduler
+Checks result fan-out, batch coalescing, limits and error propagation
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def make_gallery(n=50, dim=64):
+    from gallery import Gallery
+
+    matrix = np.random.default_rng(0).standard_normal((n, dim)).astype(np.float32)
+    return Gallery(list(range(1, n + 1)), [f"User {i}" for i in range(1, n + 1)], matrix)
+
+class CountingGallery:
+    """Wraps a gallery and records the size of every match_many call"""
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+        self.calls = []
+
+    def match_many(self, embeddings, threshold):
+        self.calls.append(len(embeddings))
+        return self.gallery.match_many(embeddings, threshold)
+
+def test_results_fan_out():
+    """Test that every caller gets the same answer as a direct match"""
+    print("Testing batched results...")
+
+    from scheduler import MatchBatcher
+
+    gallery = make_gallery()
+    queries = np.vstack([gallery.matrix[:40], np.random.default_rng(1).standard_normal((10, 64))]).astype(np.float32)
+    batcher = MatchBatcher(gallery, max_batch=8, max_wait_ms=5)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(batcher.match, queries))
+    batcher.close()
+
+    for result, direct in zip(results, [gallery.match(q) for q in queries]):
+        # Matrix-matrix and matrix-vector products may differ in the last bits
+        assert (result is None) == (direct is None), "Batched results should match direct matching"
+        if result is not None:
+            assert result[:2] == direct[:2] and abs(result[2] - direct[2]) < 1e-5, f"{result} != {direct}"
+    assert [r[0] for r in results[:40]] == list(range(1, 41)), "Enrolled faces should find themselves"
+
+    print("✓ Batched results working")
+
+def test_coalescing_and_limits():
+    """Test that concurrent requests share searches without exceeding max_batch"""
+    print("Testing batch coalescing...")
+
+    from scheduler import MatchBatcher
+
+    gallery = CountingGallery(make_gallery())
+    batcher = MatchBatcher(gallery, max_batch=4, max_wait_ms=50)
+    start = threading.Barrier(12)
+
+    def request(i):
+        start.wait()
+        return batcher.match(gallery.gallery.matrix[i])
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        list(pool.map(request, range(12)))
+    metrics = batcher.metrics()
+    batcher.close()
+
+    assert sum(gallery.calls) == 12, f"Every request should be searched once, got {gallery.calls}"
+    assert max(gallery.calls) <= 4, f"Batches should respect max_batch, got {gallery.calls}"
+    assert len(gallery.calls) < 12, f"Simultaneous requests should be coalesced, got {gallery.calls}"
+    assert metrics['requests'] == 12 and metrics['batches'] == len(gallery.calls)
+    assert 0 < metrics['mean_batch_fill'] <= 1.0
+    assert metrics['max_queue_depth'] >= 1 and metrics['queue_depth'] == 0
+
+    print("✓ Batch coalescing working")
+
+def test_errors_and_close():
+    """Test that a failing search reaches every caller in the batch"""
+    print("Testing error propagation...")
+
+    from scheduler import MatchBatcher
+
+    class BrokenGallery:
+        def match_many(self, embeddings, threshold):
+            raise RuntimeError("index unavailable")
+
+    batcher = MatchBatcher(BrokenGallery(), max_batch=4, max_wait_ms=1)
+    try:
+        batcher.match(np.ones(8))
+        assert False, "The search error should be raised to the caller"
+    except RuntimeError as e:
+        assert "index unavailable" in str(e)
+    batcher.close()
+
+    try:
+        batcher.submit(np.ones(8))
+        assert False, "A closed batcher should refuse new requests"
+    except RuntimeError:
+        pass
+
+    print("✓ Error propagation working")
+
+def main():
+    """Run all scheduler tests"""
+    print("Starting Scheduler Tests")
+    print("=" * 50)
+
+    try:
+        test_results_fan_out()
+        test_coalescing_and_limits()
+        test_errors_and_close()
+
+        print("=" * 50)
+        print("🎉 All scheduler tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for the gallery search indexes
+Checks exact and approximate search, incremental updates and persistence
+"""
+
+import numpy as np
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+sys.path.append('backend')
+
+def make_gallery(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((n, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.arange(1, n + 1, dtype=np.int64), matrix
+
+def test_brute_force_index():
+    """Test exact top-k search"""
+    print("Testing brute-force index...")
+
+    from search_index import BruteForceIndex
+
+    ids, matrix = make_gallery(200, 32)
+    index = BruteForceIndex()
+    index.build(ids, matrix)
+
+    found, scores = index.search(matrix[:5], k=3)
+    assert found.shape == (5, 3), f"Expected (5, 3) results, got {found.shape}"
+    assert found[:, 0].tolist() == ids[:5].tolist(), "Each vector should find itself first"
+    assert np.all(np.diff(scores, axis=1) <= 0), "Scores should be sorted best first"
+
+    index.remove([1])
+    found, _ = index.search(matrix[0], k=1)
+    assert found[0, 0] != 1, "Removed id should not be returned"
+
+    found, scores = BruteForceIndex().search(matrix[0], k=1)
+    assert found[0, 0] == -1 and scores[0, 0] == -np.inf, "Empty index should return no match"
+
+    print("✓ Brute-force index working")
+
+def test_ivf_index():
+    """Test approximate search, incremental add and exhaustive probing"""
+    print("Testing IVF index...")
+
+    from search_index import BruteForceIndex, IVFIndex
+
+    ids, matrix = make_gallery(1000, 32)
+    index = IVFIndex(nlist=16, nprobe=16)
+    index.build(ids[:900], matrix[:900])
+    index.add(ids[900:], matrix[900:])
+    assert len(index) == 1000, f"Expected 1000 entries, got {len(index)}"
+
+    # Probing every list is exact
+    exact = BruteForceIndex()
+    exact.build(ids, matrix)
+    queries = matrix[::50] + 0.05 * np.random.default_rng(1).standard_normal((20, 32)).astype(np.float32)
+    assert np.array_equal(index.search(queries)[0], exact.search(queries)[0]), "Full probe should equal brute force"
+
+    # Retraining kicks in once the index outgrows its quantizer
+    small = IVFIndex(nprobe=4)
+    small.build(ids[:10], matrix[:10])
+    small.add(ids[10:], matrix[10:])
+    assert len(small.centroids) > 3, f"Index should have retrained, has {len(small.centroids)} lists"
+
+    print("✓ IVF index working")
+
+def test_index_persistence():
+    """Test saving, loading and incremental sync through the gallery"""
+    print("Testing index persistence...")
+
+    import sqlite3
+    from embedding_codec import encode_embedding
+    from gallery import Gallery
+    from search_index import IVFIndex, index_path
+
+    ids, matrix = make_gallery(300, 16)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL, image_path TEXT NOT NULL, embedding TEXT NOT NULL)")
+        for user_id, e in zip(ids[:250], matrix[:250]):
+            c.execute("INSERT INTO users (id, name, image_path, embedding) VALUES (?, ?, ?, ?)",
+                      (int(user_id), f"User {user_id}", "x.jpg", encode_embedding(e)))
+        conn.commit()
+
+        gallery = Gallery.from_db(db_path, index_kind='ivf', dim=16)
+        path = index_path(db_path, 'ivf')
+        assert os.path.exists(path), "IVF index should be persisted next to the database"
+        centroids = gallery.index.centroids.copy()
+
+        # New rows are added incrementally on the next load, without retraining
+        for user_id, e in zip(ids[250:], matrix[250:]):
+            c.execute("INSERT INTO users (id, name, image_path, embedding) VALUES (?, ?, ?, ?)",
+                      (int(user_id), f"User {user_id}", "x.jpg", encode_embedding(e)))
+        conn.commit()
+        conn.close()
+
+        gallery = Gallery.from_db(db_path, index_kind='ivf', dim=16)
+        assert len(gallery.index) == 300, f"Expected 300 indexed users, got {len(gallery.index)}"
+        assert np.array_equal(gallery.index.centroids, centroids), "Quantizer should be reused, not retrained"
+
+        reloaded = IVFIndex.load(path)
+        assert sorted(reloaded.ids.tolist()) == ids.tolist(), "Persisted index should contain every user"
+
+        result = gallery.match(matrix[260])
+        assert result is not None and result[0] == 261, f"Expected user 261, got {result}"
+
+        # A user whose embedding changed in place is re-indexed, not matched on the old vector
+        replacement = make_gallery(1, 16, seed=7)[1][0]
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE users SET embedding = ? WHERE id = 261", (encode_embedding(replacement),))
+        conn.commit()
+        conn.close()
+        gallery = Gallery.from_db(db_path, index_kind='ivf', dim=16)
+        assert gallery.index.seq == IVFIndex.load(path).seq > 0, "The index should record the changes it reflects"
+        assert gallery.match(replacement)[0] == 261 and gallery.match(matrix[260]) is None
+        assert np.array_equal(gallery.index.centroids, centroids)
+
+        # Registrations save the index in the background once changes settle, not under the lock
+        import time
+        import gallery as gallery_module
+        delay, gallery_module.INDEX_SAVE_DELAY = gallery_module.INDEX_SAVE_DELAY, 0.2
+        try:
+            extra = make_gallery(2, 16, seed=8)[1]
+            gallery.add(301, "User 301", extra[0])
+            gallery.add(302, "User 302", extra[1])
+            assert 301 not in IVFIndex.load(path).ids, "The index should not be written on every change"
+            deadline = time.time() + 5
+            while 302 not in IVFIndex.load(path).ids and time.time() < deadline:
+                time.sleep(0.05)
+            assert {301, 302} <= set(IVFIndex.load(path).ids.tolist()), "Pending changes should be saved"
+            assert not os.path.exists(f"{path}.tmp")
+        finally:
+            gallery_module.INDEX_SAVE_DELAY = delay
+
+    print("✓ Index persistence working")
+
+def main():
+    """Run all search index tests"""
+    print("Starting Search Index Tests")
+    print("=" * 50)
+
+    try:
+        test_brute_force_index()
+        test_ivf_index()
+        test_index_persistence()
+
+        print("=" * 50)
+        print("🎉 All search index tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
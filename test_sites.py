@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-site deployments
+Checks local-shard-first matching with global fallback and replication between site databases
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+DIM = 16
+THRESHOLD = 0.6
+
+def basis(i):
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+def unit(vector):
+    return vector / np.linalg.norm(vector)
+
+def test_shard_first():
+    """Test that the site's users are searched first and others found by fallback"""
+    print("Testing shard-first matching...")
+
+    from gallery import Gallery
+    from metrics import METRICS
+
+    names = ["Local A", "Local B", "Remote C", "Remote D"]
+    gallery = Gallery([1, 2, 3, 4], names, np.stack([basis(i) for i in range(4)]))
+    gallery.set_shard('north', [1, 2])
+    assert list(gallery.shard_ids) == [1, 2] and len(gallery.shard) == 2
+
+    # A local user above the threshold wins over a closer remote one
+    METRICS.reset()
+    assert gallery.match(unit(0.8 * basis(0) + 0.9 * basis(2)), THRESHOLD)[0] == 1
+    assert gallery.match(basis(2) + 0.01 * basis(0), THRESHOLD)[0] == 3, "Misses should fall back to everyone"
+    assert gallery.match(basis(5), THRESHOLD) is None
+    counters = METRICS.snapshot()['counters']
+    assert counters.get('shard_hits') == 1 and counters.get('shard_misses') == 2, f"Got {counters}"
+    assert 3 in gallery.shard_ids and 4 not in gallery.shard_ids, "Fallback matches should join the shard"
+
+    results = gallery.match_many(np.stack([basis(0), basis(3), basis(1)]), THRESHOLD)
+    assert [r[0] for r in results] == [1, 4, 2]
+
+    # New users join the shard, removed ones leave it
+    gallery.add(5, "New E", basis(6))
+    gallery.remove(1)
+    assert list(gallery.shard_ids) == [2, 3, 4, 5] and len(gallery.shard) == 4
+    assert gallery.match(basis(6), THRESHOLD)[0] == 5 and gallery.match(basis(0), THRESHOLD) is None
+
+    print("✓ Shard-first matching working")
+
+def add_user(db_path, name, embedding, site):
+    from db import get_pool
+    from embedding_codec import encode_embedding
+    from templates import insert_templates
+
+    with get_pool(db_path).transaction() as conn:
+        user_id = conn.execute("INSERT INTO users (name, image_path, embedding, site) VALUES (?, '', ?, ?)",
+                               (name, encode_embedding(embedding), site)).lastrowid
+        insert_templates(conn, user_id, embedding)
+    return user_id
+
+def mark(db_path, user_id, site, timestamp='2026-01-05 09:00:00'):
+    from db import get_pool
+
+    get_pool(db_path).execute("INSERT INTO attendance (user_id, timestamp, site) VALUES (?, ?, ?)",
+                              (user_id, timestamp, site))
+
+def test_site_gallery():
+    """Test that from_db puts users enrolled or seen at the site in its shard"""
+    print("Testing site galleries...")
+
+    from db import close_pool
+    from gallery import Gallery
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'attendance.db')
+        north = add_user(db_path, "North A", basis(0), 'north')
+        south = add_user(db_path, "South B", basis(1), 'south')
+        add_user(db_path, "South C", basis(2), 'south')
+        mark(db_path, south, 'north')
+
+        gallery = Gallery.from_db(db_path, site='north', dim=DIM)
+        assert gallery.site == 'north' and sorted(gallery.shard_ids) == [north, south]
+        assert gallery.match(basis(2), THRESHOLD)[1] == "South C"
+        assert Gallery.from_db(db_path, site=None, dim=DIM).shard is None
+        close_pool(db_path)
+
+    print("✓ Site galleries working")
+
+def test_sync():
+    """Test that sites and the hub converge and repeated syncs copy nothing"""
+    print("Testing site sync...")
+
+    from db import close_pool, get_pool
+    from gallery import Gallery
+    from site_sync import pull, sync
+    from templates import add_templates
+
+    with tempfile.TemporaryDirectory() as tmp:
+        hub, north, south = (os.path.join(tmp, f"{name}.db") for name in ('hub', 'north', 'south'))
+        get_pool(hub)
+        alice = add_user(north, "Alice", basis(0), 'north')
+        bob = add_user(south, "Bob", basis(1), 'south')
+        mark(north, alice, 'north')
+        mark(south, bob, 'south')
+        mark(south, bob, 'south', '2026-01-06 09:00:00')
+
+        results = sync(hub, north, south)
+        assert results[north, hub] == (1, 1) and results[south, hub] == (1, 2)
+        assert results[hub, north] == (1, 2) and results[hub, south] == (1, 1), f"Got {results}"
+
+        def state(db_path):
+            return sorted(get_pool(db_path).query(
+                "SELECT u.uid, u.name, u.site, a.uid, a.timestamp, a.site FROM users u "
+                "LEFT JOIN attendance a ON a.user_id = u.id"))
+        assert state(hub) == state(north) == state(south) and len(state(hub)) == 3
+        assert sync(hub, north, south) == {key: (0, 0) for key in results}, "A second sync should copy nothing"
+
+        # Bob shows up at the north site: found by fallback, then kept in its shard
+        gallery = Gallery.from_db(north, site='north', dim=DIM)
+        assert list(gallery.shard_ids) == [alice]
+        user_id, name, _ = gallery.match(basis(1), THRESHOLD)
+        assert name == "Bob" and user_id in gallery.shard_ids
+        mark(north, user_id, 'north', '2026-01-07 09:00:00')
+        assert user_id in Gallery.from_db(north, site='north', dim=DIM).shard_ids
+
+        # Template updates travel with the user
+        add_templates(south, bob, basis(1) + basis(2))
+        assert pull(south, hub) == (1, 0) and pull(hub, north) == (1, 0)
+        templates = get_pool(north).query("SELECT COUNT(*) FROM user_embeddings e JOIN users u ON u.id = e.user_id "
+                                          "WHERE u.name = 'Bob'")[0][0]
+        assert templates == 2, f"Expected Bob's two templates, got {templates}"
+        assert pull(north, hub) == (0, 1), "Copied users should not bounce back"
+
+        try:
+            pull(hub, hub)
+            raise AssertionError("Expected ValueError")
+        except ValueError:
+            pass
+        for db_path in (hub, north, south):
+            close_pool(db_path)
+
+    print("✓ Site sync working")
+
+def main():
+    """Run all multi-site tests"""
+    print("Starting Multi-Site Tests")
+    print("=" * 50)
+
+    try:
+        test_shard_first()
+        test_site_gallery()
+        test_sync()
+
+        print("=" * 50)
+        print("🎉 All multi-site tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
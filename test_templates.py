@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-template enrollment
+Checks centroid-then-template matching, multi-photo registration and template capture
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+DIM = 64
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def random_unit(rng):
+    return unit(rng.standard_normal(DIM))
+
+def blend(a, b, weight):
+    return unit((1 - weight) * a + weight * b)
+
+def test_template_rescoring():
+    """Test that candidates found by centroid are re-scored on their templates"""
+    print("Testing template re-scoring...")
+
+    from gallery import Gallery
+    from templates import centroid
+
+    rng = np.random.default_rng(0)
+    # Alice was enrolled under two rather different conditions; Bob from one photo
+    alice = np.stack([random_unit(rng), random_unit(rng)])
+    bob = random_unit(rng)
+    gallery = Gallery([1, 2], ["Alice", "Bob"], np.stack([centroid(alice), bob]), templates={1: alice})
+
+    # A query close to one of Alice's photos is far from her centroid
+    query = blend(alice[1], random_unit(rng), 0.1)
+    assert query @ centroid(alice) < 0.8, "The centroid alone should not pass the threshold"
+    user_id, name, similarity = gallery.match(query, threshold=0.8)
+    assert (user_id, name) == (1, "Alice") and abs(similarity - query @ alice[1]) < 1e-5, \
+        f"Expected Alice at her closest template, got {(user_id, name, similarity)}"
+
+    # Single-template users are matched on their one embedding as before
+    assert gallery.match(blend(bob, random_unit(rng), 0.1), threshold=0.8)[0] == 2
+
+    # Batched queries give the same answers as one at a time
+    queries = np.stack([query, blend(bob, random_unit(rng), 0.1), random_unit(rng)])
+    assert [m and m[0] for m in gallery.match_many(queries, 0.8)] == [1, 2, None]
+
+    # Updating templates replaces them; dropping to one removes the re-scoring
+    gallery.update_templates(1, alice[0], alice[:1])
+    assert 1 not in gallery.templates and gallery.match(query, threshold=0.8) is None
+    assert gallery._names_by_id[1] == "Alice"
+
+    print("✓ Template re-scoring working")
+
+def test_register_and_reload():
+    """Test registering from several photos and loading templates from the database"""
+    print("Testing multi-photo registration...")
+
+    from db import close_pool, get_pool
+    from gallery import Gallery
+    from recognition import register_user
+
+    rng = np.random.default_rng(1)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs('user_images')
+            db_path = os.path.join(tmp, 'attendance.db')
+            gallery = Gallery.from_db(db_path, dim=DIM)
+            photos = np.stack([random_unit(rng) for _ in range(3)])
+            photo = np.zeros((20, 20, 3), dtype=np.uint8)
+            alice = register_user(db_path, "Alice", photo, photos, gallery)
+            bob = register_user(db_path, "Bob", photo, random_unit(rng), gallery)
+
+            pool = get_pool(db_path)
+            counts = dict(pool.query("SELECT user_id, COUNT(*) FROM user_embeddings GROUP BY user_id"))
+            assert counts == {alice: 3, bob: 1}, f"Unexpected template counts {counts}"
+
+            reloaded = Gallery.from_db(db_path, dim=DIM)
+            assert set(reloaded.templates) == {alice} and reloaded.templates[alice].shape == (3, DIM)
+            query = blend(photos[2], random_unit(rng), 0.1)
+            assert gallery.match(query, 0.8)[0] == reloaded.match(query, 0.8)[0] == alice
+            close_pool(db_path)
+        finally:
+            os.chdir(cwd)
+
+    print("✓ Multi-photo registration working")
+
+def test_capture_templates():
+    """Test adding confident captures as templates, evicting the oldest"""
+    print("Testing template capture...")
+
+    from db import close_pool, get_pool
+    from gallery import Gallery
+    from recognition import register_user
+    from templates import capture_template
+
+    rng = np.random.default_rng(2)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs('user_images')
+            db_path = os.path.join(tmp, 'attendance.db')
+            gallery = Gallery.from_db(db_path, dim=DIM)
+            enrolled = random_unit(rng)
+            user_id = register_user(db_path, "Alice", np.zeros((20, 20, 3), dtype=np.uint8), enrolled, gallery)
+
+            assert not capture_template(db_path, gallery, user_id, enrolled, 0.99, min_similarity=0.9, max_captures=0), \
+                "Capturing should be off by default"
+            assert not capture_template(db_path, gallery, user_id, enrolled, 0.85, min_similarity=0.9, max_captures=2), \
+                "Marginal matches should not be captured"
+
+            captures = [blend(enrolled, random_unit(rng), 0.2) for _ in range(3)]
+            for capture in captures:
+                assert capture_template(db_path, gallery, user_id, capture, 0.95, min_similarity=0.9, max_captures=2)
+
+            pool = get_pool(db_path)
+            rows = pool.query("SELECT source FROM user_embeddings WHERE user_id = ? ORDER BY id", (user_id,))
+            assert [r[0] for r in rows] == ['enroll', 'capture', 'capture'], f"Unexpected templates {rows}"
+            assert gallery.templates[user_id].shape == (3, DIM)
+            assert np.allclose(gallery.templates[user_id][1:], np.stack(captures[1:]), atol=1e-5), \
+                "The oldest capture should be evicted"
+
+            # The stored centroid follows the templates
+            reloaded = Gallery.from_db(db_path, dim=DIM)
+            assert np.allclose(reloaded.matrix, gallery.matrix, atol=1e-5)
+            close_pool(db_path)
+        finally:
+            os.chdir(cwd)
+
+    print("✓ Template capture working")
+
+def main():
+    """Run all template tests"""
+    print("Starting Template Tests")
+    print("=" * 50)
+
+    try:
+        test_template_rescoring()
+        test_register_and_reload()
+        test_capture_templates()
+
+        print("=" * 50)
+        print("🎉 All template tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
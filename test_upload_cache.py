@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test script for the upload result cache
+Checks LRU and TTL eviction, hit/miss counters and cached recognition of repeated uploads
+"""
+
+import sys
+
+import cv2
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class CountingDetector:
+    """Stand-in detector that finds one face in bright images and counts its calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def detect(self, gray, last_box=None):
+        self.calls += 1
+        if gray.mean() < 10:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.array([[10, 10, 80, 80]], dtype=np.int32)
+
+def photo(seed, dark=False):
+    image = np.random.default_rng(seed).integers(0, 255, (120, 120, 3), dtype=np.uint8)
+    if dark:
+        image[:] = 0
+    return cv2.imencode('.png', image)[1].tobytes()
+
+def test_eviction():
+    """Test size-bounded LRU eviction and TTL expiry"""
+    print("Testing cache eviction...")
+
+    from upload_cache import UploadCache
+
+    clock = FakeClock()
+    cache = UploadCache(max_entries=2, ttl=60, clock=clock)
+    keys = [cache.key(photo(seed)) for seed in range(3)]
+    assert cache.key(photo(0)) == keys[0] and len(set(keys)) == 3, "Keys should depend only on the bytes"
+    assert cache.key(photo(0), 'lbp') != keys[0], "Context should be part of the key"
+
+    cache.put(keys[0], (1, 2, 3, 4), np.ones(4, dtype=np.float32))
+    cache.put(keys[1], None, None)
+    assert cache.get(keys[0])[0] == (1, 2, 3, 4)   # keys[0] is now most recently used
+    cache.put(keys[2], (5, 6, 7, 8), np.zeros(4, dtype=np.float32))
+    assert cache.get(keys[1]) is None, "The least recently used entry should be evicted"
+    assert cache.get(keys[0]) is not None and len(cache) == 2
+
+    clock.now = 61
+    assert cache.get(keys[0]) is None, "Entries should expire after the TTL"
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations'], stats['size']) == (2, 2, 1, 1, 1), \
+        f"Unexpected stats {stats}"
+
+    disabled = UploadCache(max_entries=0)
+    disabled.put(keys[0], None, None)
+    assert disabled.get(keys[0]) is None and len(disabled) == 0
+
+    print("✓ Cache eviction working")
+
+def test_cached_recognition():
+    """Test that a repeated upload skips decoding and detection"""
+    print("Testing cached recognition...")
+
+    from recognition import embed_upload
+    from upload_cache import UploadCache
+
+    cache = UploadCache()
+    detector = CountingDetector()
+    data = photo(1)
+
+    box, embedding = embed_upload(data, detector, cache=cache)
+    assert box == (10, 10, 80, 80) and embedding.shape == (10000,)
+    session = {}
+    again = embed_upload(bytearray(data), detector, session, cache)
+    assert detector.calls == 1, "A repeated upload should not run detection"
+    assert again[1] is embedding and session['last_face_box'] == box
+    assert not embedding.flags.writeable, "Cached embeddings are shared and must be read-only"
+
+    # Photos without a face are cached too
+    assert embed_upload(photo(2, dark=True), detector, cache=cache) == (None, None)
+    assert embed_upload(photo(2, dark=True), detector, cache=cache) == (None, None)
+    assert detector.calls == 2 and cache.stats()['hits'] == 2
+
+    # Results are cached per detector, descriptor and quality gate settings
+    from detector import DetectorConfig, FaceDetector
+    from quality import QualityConfig
+    from recognition import upload_context
+    other = CountingDetector()
+    embed_upload(data, other, cache=cache)
+    assert other.calls == 1, "Another detector should not reuse cached results"
+    assert upload_context(FaceDetector()) != upload_context(FaceDetector(DetectorConfig(min_neighbors=8)))
+    assert upload_context(detector) != upload_context(detector, quality=QualityConfig(min_size=80))
+
+    try:
+        embed_upload(b"not an image", detector, cache=cache)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Undecodable uploads should raise ValueError")
+
+    print("✓ Cached recognition working")
+
+def main():
+    """Run all upload cache tests"""
+    print("Starting Upload Cache Tests")
+    print("=" * 50)
+
+    try:
+        test_eviction()
+        test_cached_recognition()
+
+        print("=" * 50)
+        print("🎉 All upload cache tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-process recognition workers
+Checks the shared-memory gallery copy and recognition through a process pool
+"""
+
+import sys
+
+import cv2
+import numpy as np
+
+# Add backend directory to path
+sys.path.append('backend')
+
+class FixedDetector:
+    """Stand-in detector that always finds one face; picklable for the workers"""
+
+    def detect(self, gray, last_box=None):
+        return np.array([[10, 10, 80, 80]], dtype=np.int32)
+
+def photo(seed):
+    image = np.random.default_rng(seed).integers(0, 255, (120, 120, 3), dtype=np.uint8)
+    if seed % 2 == 0:
+        # Dark left half, so even and odd photos never match each other
+        image[:, :60] = 0
+    return cv2.imencode('.png', image)[1].tobytes()
+
+def random_rows(n, dim, seed):
+    rows = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+def test_shared_matrix():
+    """Test publishing a gallery and reading it from another handle"""
+    print("Testing shared gallery matrix...")
+
+    from gallery import Gallery
+    from workers import SharedMatrix
+
+    rows = random_rows(3, 16, 0)
+    gallery = Gallery([1, 2, 3], ["A", "B", "C"], rows)
+    writer = SharedMatrix()
+    reader = SharedMatrix(writer.name)
+    try:
+        assert writer.publish(gallery) and not writer.publish(gallery), "Unchanged galleries are not republished"
+        ids, scores = reader.search(rows[1:2], k=2)
+        assert ids[0, 0] == 2 and abs(scores[0, 0] - 1) < 1e-5
+        first = writer.generation
+        assert first % 2 == 0
+
+        # An append writes in place; a replacement rewrites; both move the generation
+        segment = writer.data.name
+        gallery.add(4, "D", random_rows(1, 16, 1)[0])
+        writer.publish(gallery)
+        assert writer.data.name == segment and writer.generation == first + 2
+        assert reader.search(gallery.matrix[-1:], k=1)[0][0, 0] == 4
+        gallery.remove(1)
+        writer.publish(gallery)
+        assert reader.search(rows[:1], k=1)[0][0, 0] != 1, "Removed users should not be found"
+
+        # Outgrowing the segment moves to a bigger one, which readers follow
+        for user_id in range(5, 1100):
+            gallery.add(user_id, f"U{user_id}", random_rows(1, 16, user_id)[0])
+        writer.publish(gallery)
+        assert writer.data.name != segment and writer.capacity >= 1100
+        assert reader.search(gallery.matrix[-1:], k=1)[0][0, 0] == 1099
+    finally:
+        reader.close()
+        writer.close()
+
+    print("✓ Shared gallery matrix working")
+
+def test_recognition_pool():
+    """Test recognizing through worker processes, including users registered later"""
+    print("Testing recognition pool...")
+
+    from descriptors import get_descriptor
+    from gallery import Gallery
+    from ingest import decode_image
+    from workers import RecognitionPool
+
+    detector = FixedDetector()
+    descriptor = get_descriptor()
+
+    def embedding_of(seed):
+        gray = decode_image(photo(seed)).gray
+        return descriptor.describe(gray, detector.detect(gray)[0])
+
+    gallery = Gallery([1], ["Alice"], embedding_of(1)[None, :])
+    pool = RecognitionPool(gallery, processes=2, detector=detector)
+    try:
+        box, embedding, match = pool.recognize(photo(1))
+        assert box == (10, 10, 80, 80) and np.allclose(embedding, embedding_of(1), atol=1e-5)
+        assert match[:2] == (1, "Alice") and match[2] > 0.99, f"Expected Alice, got {match}"
+        assert pool.recognize(photo(2))[2] is None, "Unknown faces should not match"
+
+        # Registered after the workers started: picked up on the next task
+        gallery.add(2, "Bob", embedding_of(2))
+        futures = [pool.submit(photo(seed)) for seed in (1, 2, 2, 1)]
+        assert [pool.result(f)[2][0] for f in futures] == [1, 2, 2, 1]
+
+        # At a multi-site deployment a close local user wins over an exact remote one
+        from metrics import METRICS
+        alice = embedding_of(1)
+        noise = random_rows(1, len(alice), 3)[0] * np.linalg.norm(alice)
+        gallery.add(3, "Local twin", alice + 0.2 * noise)
+        gallery.add(5, "Remote Carol", embedding_of(5))
+        gallery.set_shard('north', [2, 3])
+        METRICS.reset()
+        # Random photos of the same parity score about 0.92, so use a stricter threshold
+        assert pool.recognize(photo(1), threshold=0.96)[2][0] == 3, "The site's users should be matched first"
+        assert pool.recognize(photo(5), threshold=0.96)[2][0] == 5, "Misses should fall back to everyone"
+        assert 5 in gallery.shard_ids, "Fallback matches should join the shard"
+        counters = METRICS.snapshot()['counters']
+        assert counters.get('shard_hits') == 1 and counters.get('shard_misses') == 1, f"Got {counters}"
+
+        try:
+            pool.recognize(b"not an image")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Undecodable uploads should raise ValueError")
+    finally:
+        pool.close()
+
+    # A real detector's cascade doesn't pickle; the workers rebuild it from its config
+    from detector import DetectorConfig, FaceDetector
+    pool = RecognitionPool(Gallery(), processes=1, detector=FaceDetector(DetectorConfig(min_neighbors=6)))
+    try:
+        assert pool.recognize(photo(1))[1] is None, "Noise should have no face"
+    finally:
+        pool.close()
+
+    print("✓ Recognition pool working")
+
+def main():
+    """Run all worker tests"""
+    print("Starting Worker Tests")
+    print("=" * 50)
+
+    try:
+        test_shared_matrix()
+        test_recognition_pool()
+
+        print("=" * 50)
+        print("🎉 All worker tests passed!")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())